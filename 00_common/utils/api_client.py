@@ -0,0 +1,127 @@
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FOREVER = float("inf")
+
+class CachedClient:
+    """requests.Session with keep-alive plus an on-disk JSON response cache.
+
+    Entries are keyed by URL + params. Fresh entries (age < ttl) are served without
+    touching the network; stale ones are revalidated with ETag / Last-Modified and a
+    304 refreshes them in place. The cache is trimmed to max_bytes, least recently
+    used first (file mtime = last use).
+    """
+
+    def __init__(self, cache_dir: Path, ttl: float = 3600, max_bytes: int = 50 * 2**20,
+                 timeout: float = 20, pool_maxsize: int = 10):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0}
+        self._lock = threading.Lock()
+
+    def _path(self, url: str, params: dict | None) -> Path:
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return self.cache_dir / f"{hashlib.sha256(raw.encode()).hexdigest()}.json"
+
+    def _count(self, what: str):
+        with self._lock:
+            self.stats[what] += 1
+
+    def _store(self, path: Path, entry: dict):
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp, path)
+        self.evict()
+
+    def _read(self, path: Path) -> dict | None:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None  # missing, corrupt or concurrently evicted: refetch
+
+    def is_fresh(self, url: str, params: dict | None = None, ttl: float | None = None) -> bool:
+        """True if get_json would be served from the cache without any request."""
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._read(self._path(url, params))
+        return entry is not None and time.time() - entry["fetched_at"] < ttl
+
+    def get_json(self, url: str, params: dict | None = None, ttl: float | None = None):
+        """GET url and return the decoded JSON body; ttl=None -> client default, FOREVER -> never stale."""
+        ttl = self.ttl if ttl is None else ttl
+        path = self._path(url, params)
+        entry = self._read(path)
+        if entry is not None and time.time() - entry["fetched_at"] < ttl:
+            self._count("hits")
+            try:
+                os.utime(path)  # mark as recently used for LRU
+            except FileNotFoundError:
+                pass
+            return entry["body"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        r = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        if r.status_code == 304 and entry is not None:
+            self._count("revalidated")
+            entry["fetched_at"] = time.time()
+            self._store(path, entry)
+            return entry["body"]
+        r.raise_for_status()
+        self._count("misses")
+        body = r.json()
+        self._store(path, {
+            "url": url,
+            "params": params,
+            "fetched_at": time.time(),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "body": body,
+        })
+        return body
+
+    def evict(self):
+        files = []
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                files.append((p, p.stat()))
+            except FileNotFoundError:
+                pass
+        total = sum(st.st_size for _, st in files)
+        if total <= self.max_bytes:
+            return
+        for p, st in sorted(files, key=lambda x: x[1].st_mtime):
+            p.unlink(missing_ok=True)
+            total -= st.st_size
+            if total <= self.max_bytes:
+                break
+
+    def stats_line(self) -> str:
+        s = self.stats
+        return f"HTTP cache: hits={s['hits']}, misses={s['misses']}, revalidated={s['revalidated']}"
+
+    def close(self):
+        self.session.close()
+
+@lru_cache(maxsize=None)
+def get_client(cache_dir: str, ttl: float = 3600, max_bytes: int = 50 * 2**20) -> CachedClient:
+    # one client (session + keep-alive pool) per cache dir for the whole process
+    return CachedClient(Path(cache_dir), ttl=ttl, max_bytes=max_bytes)
@@ -0,0 +1,222 @@
+"""Arrow IPC results for Prefect tasks that pass DataFrames / Arrow tables around.
+
+    from utils.arrow_results import ARROW_TASK
+
+    @task(**ARROW_TASK)
+    def transform(df: pd.DataFrame) -> pd.DataFrame: ...
+
+    @task(**ARROW_SINK_TASK)
+    def load(df: pd.DataFrame, ...) -> None: ...
+
+ARROW_TASK sets two things, both only when results are persisted (PREFECT_RESULTS_PERSIST_BY_DEFAULT,
+read at import). Otherwise it is persist_result=False + NO_CACHE: Prefect 3 turns persistence on
+for any task with a serializer or cache policy, which would write a copy of every frame per run.
+- result_serializer=ArrowSerializer(): every DataFrame / pyarrow Table inside the result
+  (also inside tuples, lists, dicts) is streamed batch by batch into an uncompressed Arrow
+  IPC file under ETL_ARROW_RESULTS_DIR; the result record only keeps a small pickled
+  reference. Loading memory-maps the file, so the table is zero-copy and its pages are
+  shared with the OS cache instead of being unpickled into fresh memory.
+- cache_policy: Prefect's default (inputs + task source + run id), except that DataFrame /
+  Table inputs are keyed by a hash of their column buffers (fingerprint()) instead of being
+  cloudpickled on every call, i.e. a full pickle copy of each argument just to compute a key.
+
+Persisted IPC files are never reused across runs (run id in the cache key): flows call
+prune_results() at the end to bound the directory by age / size.
+
+ARROW_SINK_TASK is for tasks that take frames and write them somewhere: no input hashing and
+no caching (NO_CACHE), so a retried flow run never skips a load.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+import base64
+import hashlib
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pydantic import Field
+
+from prefect.cache_policies import NO_CACHE, RUN_ID, TASK_SOURCE, Inputs
+from prefect.serializers import Serializer
+from prefect.settings import PREFECT_RESULTS_PERSIST_BY_DEFAULT
+
+BATCH_ROWS = 256_000
+SUFFIX = ".arrow"
+
+def results_dir() -> Path:
+    return Path(os.environ.get("ETL_ARROW_RESULTS_DIR", ".prefect_results/arrow"))
+
+@dataclass(frozen=True)
+class ArrowRef:
+    """Pointer to one table written by ArrowSerializer; kind is "pandas" or "arrow"."""
+    path: str
+    kind: str
+    rows: int
+
+def write_ipc(obj: pd.DataFrame | pa.Table, path: Path, compression: str | None = None,
+              batch_rows: int = BATCH_ROWS) -> int:
+    """Write a DataFrame / Table as an Arrow IPC file, converting batch_rows rows at a time.
+
+    A DataFrame is never converted as a whole, so the extra memory is one batch, not a copy
+    of the frame. compression=None keeps the file memory-mappable without decoding.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    if isinstance(obj, pd.DataFrame):
+        # a default RangeIndex is implied on read; any other index is stored as columns
+        idx = obj.index
+        preserve = not (isinstance(idx, pd.RangeIndex) and idx.start == 0 and idx.step == 1 and idx.name is None)
+        first = pa.Table.from_pandas(obj.iloc[:batch_rows], preserve_index=preserve)
+        if len(obj) > batch_rows and any(pa.types.is_null(f.type) for f in first.schema):
+            # a column that is all-null in the first batch: infer its type from the whole frame
+            first = pa.Table.from_pandas(obj, preserve_index=preserve)
+        schema = first.schema
+        parts = (first if start == 0 else
+                 pa.Table.from_pandas(obj.iloc[start:start + batch_rows], schema=schema, preserve_index=preserve)
+                 for start in range(0, len(obj), batch_rows) if start == 0 or start >= first.num_rows)
+    else:
+        schema = obj.schema
+        parts = (obj.slice(start, batch_rows) for start in range(0, len(obj), batch_rows))
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+        for part in parts:
+            writer.write_table(part)
+    os.replace(tmp, path)
+    return len(obj)
+
+def read_ipc(path: Path | str) -> pa.Table:
+    """Memory-mapped, zero-copy read (for uncompressed files) of an Arrow IPC file."""
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+def _externalize(obj: Any, directory: Path, compression: str | None) -> Any:
+    if isinstance(obj, (pd.DataFrame, pa.Table)):
+        path = directory / f"{uuid.uuid4().hex}{SUFFIX}"
+        rows = write_ipc(obj, path, compression)
+        return ArrowRef(str(path.resolve()), "pandas" if isinstance(obj, pd.DataFrame) else "arrow", rows)
+    if isinstance(obj, (list, tuple)) and not hasattr(obj, "_fields"):
+        return type(obj)(_externalize(v, directory, compression) for v in obj)
+    if isinstance(obj, dict):
+        return {k: _externalize(v, directory, compression) for k, v in obj.items()}
+    return obj
+
+def _internalize(obj: Any, zero_copy: bool = True) -> Any:
+    if isinstance(obj, ArrowRef):
+        table = read_ipc(obj.path)
+        if obj.kind == "arrow":
+            return table
+        # split_blocks: no consolidation into 2-D blocks, so null-free numeric columns stay
+        # read-only views of the mapped file (replacing a column is fine, .loc edits in place are not)
+        return table.to_pandas(split_blocks=True) if zero_copy else table.to_pandas()
+    if isinstance(obj, (list, tuple)) and not hasattr(obj, "_fields"):
+        return type(obj)(_internalize(v, zero_copy) for v in obj)
+    if isinstance(obj, dict):
+        return {k: _internalize(v, zero_copy) for k, v in obj.items()}
+    return obj
+
+class ArrowSerializer(Serializer):
+    """Prefect serializer: tables go to Arrow IPC files, everything else is cloudpickled."""
+
+    type: str = Field(default="arrow-ipc", frozen=True)
+    directory: str | None = None       # default: results_dir()
+    compression: str | None = None     # "zstd" / "lz4": smaller files, but reads decode into memory
+    zero_copy: bool = True             # False: loaded DataFrames get their own writable memory
+
+    def dumps(self, obj: Any) -> bytes:
+        import cloudpickle
+
+        directory = Path(self.directory) if self.directory else results_dir()
+        return base64.b64encode(cloudpickle.dumps(_externalize(obj, directory, self.compression)))
+
+    def loads(self, blob: bytes) -> Any:
+        import cloudpickle
+
+        return _internalize(cloudpickle.loads(base64.b64decode(blob)), self.zero_copy)
+
+def prune_results(directory: Path | None = None, max_age_s: float = 7 * 86400,
+                  max_bytes: int | None = 1 << 30) -> int:
+    """Delete IPC result files older than max_age_s, then the oldest ones until the rest fit in
+    max_bytes (None: no size limit); returns how many were removed."""
+    directory = directory or results_dir()
+    files = sorted(((f.stat(), f) for f in directory.glob(f"*{SUFFIX}")) if directory.is_dir() else [],
+                   key=lambda sf: sf[0].st_mtime, reverse=True)
+    cutoff = time.time() - max_age_s
+    removed, total = 0, 0
+    for st, f in files:  # newest first
+        total += st.st_size
+        if st.st_mtime < cutoff or (max_bytes is not None and total > max_bytes):
+            f.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+def _dictionaries(arr: pa.Array):
+    """Dictionaries of arr and of its children: buffers() covers child arrays, not dictionaries."""
+    t = arr.type
+    if pa.types.is_dictionary(t):
+        yield arr.dictionary
+        yield from _dictionaries(arr.dictionary)
+    elif pa.types.is_struct(t):
+        for i in range(t.num_fields):
+            yield from _dictionaries(arr.field(i))
+    elif pa.types.is_map(t):
+        yield from _dictionaries(arr.keys)
+        yield from _dictionaries(arr.items)
+    elif pa.types.is_list(t) or pa.types.is_large_list(t) or pa.types.is_fixed_size_list(t):
+        yield from _dictionaries(arr.values)
+
+def _hash_arrow(h, arr: pa.Array | pa.ChunkedArray):
+    chunks = arr.chunks if isinstance(arr, pa.ChunkedArray) else [arr]
+    for chunk in chunks:
+        h.update(f"{chunk.type}|{chunk.offset}|{len(chunk)}".encode())
+        for buf in chunk.buffers():
+            if buf is not None:
+                h.update(memoryview(buf))
+        # dictionary columns (compact()'s categories): the indices alone say nothing about the values
+        for d in _dictionaries(chunk):
+            _hash_arrow(h, d)
+
+def _hash_pandas(h, values):
+    arrow = getattr(values, "_pa_array", None)  # pyarrow-backed (pandas "str", ArrowDtype)
+    if arrow is not None:
+        _hash_arrow(h, arrow)
+        return
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biufcmM":
+        h.update(str(arr.dtype).encode())
+        h.update(memoryview(np.ascontiguousarray(arr)).cast("B"))
+    else:  # object columns (dates, mixed): pandas' vectorized row hash
+        h.update(pd.util.hash_array(arr.astype(object)).tobytes())
+
+def fingerprint(obj: pd.DataFrame | pa.Table) -> str:
+    """Content hash of a DataFrame / Table, reading column memory in place (no serialization)."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, pa.Table):
+        h.update(str(obj.schema).encode())
+        for col in obj.columns:
+            _hash_arrow(h, col)
+        return h.hexdigest()
+    h.update(repr((obj.shape, [str(c) for c in obj.columns], [str(t) for t in obj.dtypes])).encode())
+    if isinstance(obj.index, pd.RangeIndex):
+        h.update(repr(obj.index).encode())
+    else:
+        _hash_pandas(h, obj.index.array)
+    for i in range(obj.shape[1]):
+        _hash_pandas(h, obj.iloc[:, i].array)
+    return h.hexdigest()
+
+@dataclass
+class FrameInputs(Inputs):
+    """Inputs policy that keys DataFrame / Table arguments by fingerprint() instead of pickling them."""
+
+    def compute_key(self, task_ctx, inputs: dict[str, Any], flow_parameters: dict[str, Any], **kwargs) -> str | None:
+        inputs = {k: fingerprint(v) if isinstance(v, (pd.DataFrame, pa.Table)) else v
+                  for k, v in (inputs or {}).items()}
+        return super().compute_key(task_ctx, inputs, flow_parameters, **kwargs)
+
+ARROW_TASK = ({"result_serializer": ArrowSerializer(), "cache_policy": FrameInputs() + TASK_SOURCE + RUN_ID}
+              if PREFECT_RESULTS_PERSIST_BY_DEFAULT.value() else
+              {"persist_result": False, "cache_policy": NO_CACHE})
+ARROW_SINK_TASK = {"cache_policy": NO_CACHE}
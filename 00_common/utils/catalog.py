@@ -0,0 +1,221 @@
+"""Local catalog of Parquet files: row count, schema and min/max per column, for pruning.
+
+    cat = Catalog(silver_dir / CATALOG_FILE)
+    cat.register(path, "rates")                             # right after the file is written
+    files = cat.files("rates", date=("2025-01-01", "2025-01-07"))
+    con.sql(f"SELECT ... FROM {read_parquet_sql(files)}")   # or read_pandas("rates", date=...)
+
+Stats come from the Parquet footer (row-group statistics), so registering never reads data.
+A predicate is column=(lo, hi) (inclusive, None = open end) or column=value; a file is
+returned unless its stats prove it has no row in range. Files without stats for the column
+are kept. Numbers compare as numbers, everything else (dates, timestamps, text) as ISO text,
+so string-typed and date32 date columns mix. A date upper bound covers the whole day of a
+timestamp column.
+
+The catalog is a SQLite file (WAL, one transaction per call; safe across threads and processes).
+sync() registers files written before the catalog existed and forgets files that are gone.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+import json
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CATALOG_FILE = "_catalog.sqlite"
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+@dataclass
+class FileEntry:
+    path: str
+    dataset: str
+    size: int
+    mtime_ns: int
+    num_rows: int | None
+    schema: list[tuple[str, str]]
+
+def _value(v) -> tuple[float | None, str | None]:
+    """Stat or bound -> (number, text); exactly one is set."""
+    if isinstance(v, bool):
+        return float(v), None
+    if isinstance(v, (int, float)):
+        return float(v), None
+    if isinstance(v, datetime):
+        return None, v.isoformat(sep=" ")
+    if isinstance(v, date):
+        return None, v.isoformat()
+    if isinstance(v, bytes):
+        return None, v.decode("utf-8", errors="replace")
+    return None, str(v)
+
+def _column_stats(md: pq.FileMetaData) -> dict[str, tuple]:
+    """Top-level column -> (min, max, null_count) over all row groups.
+
+    A column is left out when a row group with non-null values has no min/max (not prunable).
+    """
+    acc, unknown = {}, set()
+    for i in range(md.num_row_groups):
+        rg = md.row_group(i)
+        for j in range(rg.num_columns):
+            col = rg.column(j)
+            name, st = col.path_in_schema.split(".")[0], col.statistics
+            lo, hi, nulls = acc.get(name, (None, None, 0))
+            if st is None or not st.has_null_count:
+                nulls = None
+            elif nulls is not None:
+                nulls += st.null_count
+            if st is not None and st.has_min_max:
+                lo = st.min if lo is None or st.min < lo else lo
+                hi = st.max if hi is None or st.max > hi else hi
+            elif rg.num_rows and not (st is not None and st.has_null_count and st.null_count == rg.num_rows):
+                unknown.add(name)
+            acc[name] = (lo, hi, nulls)
+    return {k: v for k, v in acc.items() if k not in unknown}
+
+def _read_footer(path: Path, dataset: str) -> tuple[FileEntry, list[tuple]]:
+    st = path.stat()
+    try:
+        md = pq.ParquetFile(path).metadata
+    except pa.ArrowInvalid:
+        # unreadable footer (empty / partly written file): no stats, so it is never pruned
+        return FileEntry(path.as_posix(), dataset, st.st_size, st.st_mtime_ns, None, []), []
+    entry = FileEntry(path.as_posix(), dataset, st.st_size, st.st_mtime_ns, md.num_rows,
+                      [(f.name, str(f.type)) for f in md.schema.to_arrow_schema()])
+    stats = []
+    for name, (lo, hi, nulls) in _column_stats(md).items():
+        (lo_n, lo_t), (hi_n, hi_t) = _value(lo), _value(hi)
+        stats.append((entry.path, name, lo_n, hi_n, lo_t, hi_t, nulls))
+    return entry, stats
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS parquet_files (
+  path TEXT PRIMARY KEY,
+  dataset TEXT NOT NULL,
+  size INTEGER,
+  mtime_ns INTEGER,
+  num_rows INTEGER,
+  schema TEXT,
+  registered_at TEXT
+);
+CREATE TABLE IF NOT EXISTS parquet_stats (
+  path TEXT REFERENCES parquet_files(path) ON DELETE CASCADE,
+  "column" TEXT,
+  min_num REAL, max_num REAL,
+  min_text TEXT, max_text TEXT,
+  null_count INTEGER,
+  PRIMARY KEY (path, "column")
+);
+CREATE INDEX IF NOT EXISTS ix_parquet_files_dataset ON parquet_files (dataset);
+"""
+
+_local = threading.local()
+
+def _connection(path: Path) -> sqlite3.Connection:
+    # one connection per catalog file and thread for the life of the process: writers run once
+    # per written file, and opening / closing (schema check, WAL checkpoint) would cost more
+    cons = _local.__dict__.setdefault("cons", {})
+    key = str(path)
+    if key not in cons:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")  # WAL: durable enough for an index sync() can rebuild
+        con.execute("PRAGMA foreign_keys=ON")
+        con.executescript(SCHEMA_SQL)
+        cons[key] = con
+    return cons[key]
+
+class Catalog:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = _connection(self.path)
+        with con:  # one transaction per call
+            yield con
+
+    def register(self, path: Path, dataset: str) -> FileEntry:
+        """Record (or refresh) one Parquet file from its footer."""
+        return self.register_many([path], dataset)[0]
+
+    def register_many(self, paths: list[Path], dataset: str) -> list[FileEntry]:
+        entries = [_read_footer(Path(p), dataset) for p in paths]
+        with self._connect() as con:
+            for entry, stats in entries:
+                con.execute("DELETE FROM parquet_files WHERE path = ?", [entry.path])
+                con.execute("INSERT INTO parquet_files VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+                            [entry.path, dataset, entry.size, entry.mtime_ns, entry.num_rows,
+                             json.dumps(entry.schema)])
+                con.executemany("INSERT INTO parquet_stats VALUES (?, ?, ?, ?, ?, ?, ?)", stats)
+        return [e for e, _ in entries]
+
+    def unregister(self, paths: list[Path]):
+        with self._connect() as con:
+            con.executemany("DELETE FROM parquet_files WHERE path = ?", [[Path(p).as_posix()] for p in paths])
+
+    def sync(self, dataset: str, files: list[Path]) -> int:
+        """Make the dataset's entries match `files`: new or rewritten files (size / mtime) are
+        registered, entries of other files dropped. Returns how many footers were read."""
+        with self._connect() as con:
+            known = {p: (s, m) for p, s, m in con.execute(
+                "SELECT path, size, mtime_ns FROM parquet_files WHERE dataset = ?", [dataset])}
+        current = {Path(f).as_posix(): Path(f) for f in files}
+        stale = [p for p in known if p not in current]
+        if stale:
+            self.unregister(stale)
+        todo = [f for key, f in current.items()
+                if known.get(key) != ((st := f.stat()).st_size, st.st_mtime_ns)]
+        if todo:
+            self.register_many(todo, dataset)
+        return len(todo)
+
+    def files(self, dataset: str, **where) -> list[Path]:
+        """Files of the dataset that may hold rows matching every predicate, in path order."""
+        sql = "SELECT path FROM parquet_files f WHERE dataset = ?"
+        params: list = [dataset]
+        for column, bound in where.items():
+            lo, hi = bound if isinstance(bound, tuple) else (bound, bound)
+            for op, side, v in (("<", "max", lo), (">", "min", hi)):
+                if v is None:
+                    continue
+                num, text = _value(v)
+                if op == ">" and text is not None and DATE_RE.match(text):
+                    text += "~"  # sorts after "YYYY-MM-DD hh:mm:ss": the whole day
+                kind = "num" if num is not None else "text"
+                sql += f"""
+                    AND NOT EXISTS (SELECT 1 FROM parquet_stats s WHERE s.path = f.path
+                                    AND s."column" = ? AND s.{side}_{kind} {op} ?)"""
+                params += [column, num if num is not None else text]
+        with self._connect() as con:
+            rows = con.execute(sql + " ORDER BY path", params).fetchall()
+        return [Path(r[0]) for r in rows]
+
+    def entries(self, dataset: str) -> list[FileEntry]:
+        with self._connect() as con:
+            rows = con.execute("SELECT path, dataset, size, mtime_ns, num_rows, schema FROM parquet_files "
+                               "WHERE dataset = ? ORDER BY path", [dataset]).fetchall()
+        return [FileEntry(*r[:5], [tuple(c) for c in json.loads(r[5])]) for r in rows]
+
+    def read_pandas(self, dataset: str, columns: list[str] | None = None, **where) -> pd.DataFrame:
+        """Rows of the matching files only (file-level pruning: rows of a file that overlaps the
+        range are not filtered). Files are read one by one: old and new ones may differ in types."""
+        tables = [pq.read_table(f, columns=columns) for f in self.files(dataset, **where)]
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+def read_parquet_sql(files: list[Path], **options) -> str:
+    """DuckDB read_parquet([...]) over exactly these files (e.g. Catalog.files(...))."""
+    if not files:
+        raise ValueError("No files to read")
+    lst = ", ".join("'" + Path(f).as_posix().replace("'", "''") + "'" for f in files)
+    opts = "".join(f", {k} = {str(v).lower() if isinstance(v, bool) else v}" for k, v in options.items())
+    return f"read_parquet([{lst}]{opts})"
@@ -0,0 +1,152 @@
+"""Memory-compact dtypes for freshly extracted DataFrames.
+
+    df = compact(df, {"currency": "category", "amount": "number", "date": "date"})
+
+Kinds (schema values):
+    "category"  low-cardinality text -> pandas Categorical (dictionary-encoded: int codes + one
+                copy of each distinct value)
+    "string"    text -> pyarrow-backed string dtype (one buffer instead of a Python object per cell)
+    "date"      strings / datetimes / date objects -> date32 (pyarrow); a value with a time of
+                day raises instead of being truncated
+    "number"    integer-valued without missing values -> smallest int8..int64 that holds
+                min..max; otherwise float32 when every value survives the round trip, else float64
+    "int32", "float32", ... explicit dtype for frames written as multi-file datasets (Parquet
+                parts must agree on a schema). The conversion has to be exact: values out of
+                range or with a fraction raise ValueError; missing values give the nullable IntNN
+    "keep"      leave as is
+
+Columns not in the schema are inferred when auto=True: numerics as "number", text as
+"category" when it has few distinct values (CATEGORY_MAX_RATIO) and "string" otherwise,
+datetimes / date objects as "date" when every value is a midnight. Schema keys match column names
+case-insensitively, ignoring surrounding spaces.
+
+Every call records a metrics stage ("dtypes" by default) with bytes before / after and the
+bytes saved per column.
+"""
+from datetime import date
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.metrics import stage
+
+STRING = pd.StringDtype("pyarrow")
+DATE = pd.ArrowDtype(pa.date32())
+INT_TYPES = ("int8", "int16", "int32", "int64")
+# auto: text becomes categorical when distinct values are at most this share of the rows
+CATEGORY_MAX_RATIO = 0.5
+
+def is_date(s: pd.Series) -> bool:
+    return isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_date(s.dtype.pyarrow_dtype)
+
+def _is_text(s: pd.Series) -> bool:
+    return s.dtype == object or isinstance(s.dtype, pd.StringDtype) or \
+        (isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_string(s.dtype.pyarrow_dtype))
+
+def _smallest_int(lo, hi) -> str:
+    for t in INT_TYPES:
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            return t
+    raise ValueError(f"Values {lo}..{hi} do not fit into int64")
+
+def _number(s: pd.Series) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s) or s.empty:
+        return s
+    values = s.to_numpy(dtype=float, na_value=np.nan)
+    finite = values[np.isfinite(values)]
+    if len(finite) == len(values) and np.array_equal(finite, np.floor(finite)) and np.abs(finite).max() < 2**53:
+        return s.astype(_smallest_int(finite.min(), finite.max()))
+    if s.dtype == np.float64 and np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+        return s.astype(np.float32)
+    return s
+
+def _exact(s: pd.Series, dtype: str) -> pd.Series:
+    target = np.dtype(dtype)
+    if not pd.api.types.is_numeric_dtype(s):
+        s = pd.to_numeric(s, errors="coerce")
+    values = s.to_numpy(dtype=float, na_value=np.nan)
+    finite = values[~np.isnan(values)]
+    if target.kind in "iu":
+        info = np.iinfo(target)
+        if len(finite) and (finite.min() < info.min or finite.max() > info.max):
+            raise ValueError(f"{s.name}: values {finite.min():g}..{finite.max():g} overflow {target}")
+        if not np.array_equal(finite, np.floor(finite)):
+            raise ValueError(f"{s.name}: fractional values do not fit {target}")
+        if len(finite) < len(values):
+            return s.astype(target.name.capitalize().replace("Ui", "UI"))  # Int32 / UInt16, nullable
+        return s.astype(target)
+    converted = values.astype(target)
+    if not np.array_equal(converted.astype(np.float64), values, equal_nan=True):
+        raise ValueError(f"{s.name}: values change when stored as {target}")
+    return s.astype(target)
+
+def _date(s: pd.Series) -> pd.Series:
+    if is_date(s):
+        return s
+    ts = pd.to_datetime(s, errors="coerce")
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_localize(None)
+    if (ts.dropna() != ts.dropna().dt.normalize()).any():
+        raise ValueError(f"{s.name}: values have a time of day, not stored as date")
+    return ts.astype("datetime64[s]").astype(DATE)
+
+def _category(s: pd.Series) -> pd.Series:
+    return s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+
+def _string(s: pd.Series) -> pd.Series:
+    return s if s.dtype == STRING else s.astype(STRING)
+
+def _auto(s: pd.Series) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype) or is_date(s):
+        return s
+    if pd.api.types.is_datetime64_any_dtype(s):
+        ts = s.dropna()
+        return _date(s) if getattr(s.dt, "tz", None) is None and (ts == ts.dt.normalize()).all() else s
+    if pd.api.types.is_numeric_dtype(s):
+        return _number(s)
+    if s.dtype == object and len(s) and s.dropna().map(type).eq(date).all():
+        return _date(s)
+    if _is_text(s):
+        # mixed object columns (numbers and text) are left alone
+        if s.dtype == object and not s.dropna().map(type).eq(str).all():
+            return s
+        if len(s) and s.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(s):
+            return _category(s)
+        return _string(s)
+    return s
+
+KINDS = {"category": _category, "string": _string, "date": _date, "number": _number, "keep": lambda s: s}
+
+def convert(s: pd.Series, kind: str) -> pd.Series:
+    if kind in KINDS:
+        return KINDS[kind](s)
+    return _exact(s, kind)
+
+def compact(df: pd.DataFrame, schema: dict[str, str] | None = None, auto: bool = True,
+            name: str = "dtypes") -> pd.DataFrame:
+    """Return df with compact dtypes (see module docstring); df itself is not modified."""
+    kinds = {str(k).strip().lower(): v for k, v in (schema or {}).items()}
+    before = df.memory_usage(deep=True, index=False)
+    with stage(name, rows_in=len(df)) as st:
+        out = {}
+        for col in df.columns:
+            kind = kinds.get(str(col).strip().lower())
+            s = df[col]
+            out[col] = convert(s, kind) if kind else (_auto(s) if auto else s)
+        result = pd.DataFrame(out, index=df.index)
+        after = result.memory_usage(deep=True, index=False)
+        saved = {str(c): int(before[c] - after[c]) for c in df.columns}
+        st.rows_out = len(result)
+        st.extra.update(bytes_before=int(before.sum()), bytes_after=int(after.sum()),
+                        saved_bytes={c: b for c, b in saved.items() if b})
+    return result
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Per column: dtype and deep memory usage before / after compact(), plus bytes saved."""
+    b, a = before.memory_usage(deep=True, index=False), after.memory_usage(deep=True, index=False)
+    rep = pd.DataFrame({"dtype_before": before.dtypes.astype(str), "dtype_after": after.dtypes.astype(str),
+                        "bytes_before": b, "bytes_after": a})
+    rep["saved"] = rep["bytes_before"] - rep["bytes_after"]
+    rep.loc["total"] = ["", "", b.sum(), a.sum(), b.sum() - a.sum()]
+    return rep
@@ -0,0 +1,74 @@
+from pathlib import Path
+import time
+import duckdb
+
+from utils.schema import Schema, duckdb_csv
+
+LOCK_TIMEOUT = 30.0
+
+def _lock_conflict(e: Exception) -> bool:
+    # another process holds the file lock / this process has it open with another read_only setting
+    msg = str(e)
+    return "lock" in msg or "different configuration" in msg
+
+def connect(db_path: Path | str, read_only: bool = False, lock_timeout: float = LOCK_TIMEOUT) -> duckdb.DuckDBPyConnection:
+    """duckdb.connect that waits while another connection holds the warehouse (a reader such as
+    utils.query_service between queries, or another loader): retries with backoff, 50 ms -> 1 s,
+    until lock_timeout; then, and for any other error, raises."""
+    deadline = time.monotonic() + lock_timeout
+    delay = 0.05
+    while True:
+        try:
+            return duckdb.connect(str(db_path), read_only=read_only)
+        except (duckdb.IOException, duckdb.ConnectionException) as e:
+            if not _lock_conflict(e) or time.monotonic() + delay > deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+def _lit(path: Path | str) -> str:
+    return "'" + Path(path).as_posix().replace("'", "''") + "'"
+
+def rates_view(con: duckdb.DuckDBPyConnection, rates_path: Path, name: str = "v_rates") -> int:
+    """Expose rates.json ({base, date, rates{}}) as a (currency, rate) view; returns its row count."""
+    con.execute(f"""
+        CREATE OR REPLACE TEMP VIEW {name} AS
+        SELECT upper(unnest(map_keys(rates))) AS currency,
+               unnest(map_values(rates))      AS rate,
+               base
+        FROM read_json({_lit(rates_path)},
+                       columns={{'base': 'VARCHAR', 'date': 'DATE', 'rates': 'MAP(VARCHAR, DOUBLE)'}});
+    """)
+    bases = [r[0] for r in con.execute(f"SELECT DISTINCT base FROM {name}").fetchall()]
+    if bases and bases != ["EUR"]:
+        raise ValueError("This demo expects base=EUR in rates.json")
+    n = con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    if not n:
+        raise ValueError("No rates found in rates.json")
+    return n
+
+def tx_eur_query(con: duckdb.DuckDBPyConnection, csv_path: Path, rates: str = "v_rates",
+                 schema: Schema | None = None) -> str:
+    """SELECT over the CSV scan + rates join: source columns (currency upper-cased) + amount_eur.
+
+    Nothing lands in pandas. Missing currencies are checked first (aggregate over the same
+    scan, all reported at once). With a schema the header is checked for drift and the scan
+    gets the declared types instead of sniffing them.
+    """
+    tx = duckdb_csv(csv_path, schema) if schema else f"read_csv_auto({_lit(csv_path)})"
+    missing = con.execute(f"""
+        SELECT upper(t.currency) AS currency, COUNT(*) AS n
+        FROM {tx} t
+        LEFT JOIN {rates} r ON upper(t.currency) = r.currency AND r.rate <> 0
+        WHERE r.currency IS NULL
+        GROUP BY 1 ORDER BY 1
+    """).fetchall()
+    if missing:
+        raise ValueError(f"Missing rates for currencies: {[c for c, _ in missing]}")
+
+    # amount_eur = amount / rate (base=EUR → rate = currency per EUR)
+    return f"""
+        SELECT t.* REPLACE (upper(t.currency) AS currency), ROUND(t.amount / r.rate, 2) AS amount_eur
+        FROM {tx} t
+        JOIN {rates} r ON upper(t.currency) = r.currency
+    """
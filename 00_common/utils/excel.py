@@ -0,0 +1,185 @@
+"""Streaming Excel reader + Parquet cache keyed by workbook content hash.
+
+python-calamine (Rust) is used when installed, openpyxl in read-only mode otherwise; both
+stream rows, so a sheet is never materialized as a DOM or one big DataFrame. A workbook is
+converted once into cache_dir/<sha256>/<NN>-<sheet>/part-NNNNN.parquet (one part per row
+batch, each with its own inferred types); an unchanged workbook is never parsed again.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator
+import json
+import os
+import re
+import shutil
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.manifest import file_hash
+
+BATCH_ROWS = 50_000
+PATTERNS = ["*.xlsx", "*.xlsm", "*.xls"]
+META = "_meta.json"
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # optional: pip install python-calamine
+    CalamineWorkbook = None
+
+def engine() -> str:
+    return "calamine" if CalamineWorkbook is not None else "openpyxl"
+
+def workbook_files(folder: Path) -> list[Path]:
+    # ~$name.xlsx: Excel's lock file while the workbook is open
+    files = {f for p in PATTERNS for f in folder.glob(p) if f.is_file() and not f.name.startswith("~$")}
+    return sorted(files)
+
+def _iter_rows(path: Path) -> Iterator[tuple[str, Iterator[list]]]:
+    """(sheet name, row iterator) for every sheet, in workbook order."""
+    if CalamineWorkbook is not None:
+        wb = CalamineWorkbook.from_path(str(path))
+        for name in wb.sheet_names:
+            yield name, wb.get_sheet_by_name(name).iter_rows()
+        return
+    if path.suffix.lower() == ".xls":
+        raise ValueError(f"{path.name}: .xls needs python-calamine (openpyxl reads only .xlsx/.xlsm)")
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def _header(row) -> list[str]:
+    names, seen = [], {}
+    for i, v in enumerate(row):
+        name = str(v).strip() if v not in (None, "") else f"col_{i + 1}"
+        if name in seen:  # duplicate headers: OrderID, OrderID_2, ...
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    while names and names[-1].startswith("col_") and row[len(names) - 1] in (None, ""):
+        names.pop()  # trailing empty header cells
+    return names
+
+def _to_table(columns: list[str], rows: list[list]) -> pa.Table:
+    arrays = []
+    for i in range(len(columns)):
+        values = [r[i] for r in rows]
+        try:
+            arr = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed cells (numbers and text in one column): keep them as text
+            arr = pa.array([None if v is None else str(v) for v in values], pa.string())
+        # calamine returns every number as float: whole-number columns back to int64 (as pandas does)
+        if pa.types.is_floating(arr.type) and arr.null_count < len(arr) and \
+                pc.all(pc.equal(arr, pc.floor(arr))).as_py() and pc.max(pc.abs(arr)).as_py() < 2**53:
+            arr = arr.cast(pa.int64())
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, names=columns)
+
+def iter_sheet_batches(path: Path, batch_rows: int = BATCH_ROWS) -> Iterator[tuple[str, pa.Table]]:
+    """(sheet, table of <= batch_rows rows) for every sheet; the first row of a sheet is its header.
+
+    Empty rows are skipped, short rows are padded and cells beyond the header are dropped.
+    """
+    for sheet, rows in _iter_rows(path):
+        columns, batch = None, []
+        for row in rows:
+            row = list(row)
+            if all(v in (None, "") for v in row):
+                continue
+            if columns is None:
+                columns = _header(row)
+                continue
+            row = row[:len(columns)] + [None] * (len(columns) - len(row))
+            batch.append([None if v == "" else v for v in row])
+            if len(batch) >= batch_rows:
+                yield sheet, _to_table(columns, batch)
+                batch = []
+        if batch:
+            yield sheet, _to_table(columns, batch)
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", s).strip("_") or "sheet"
+
+def cached(cache_dir: Path, sha256: str) -> dict | None:
+    meta = cache_dir / sha256 / META
+    return json.loads(meta.read_text(encoding="utf-8")) if meta.exists() else None
+
+def convert_workbook(path: str, cache_dir: str, sha256: str | None = None,
+                     batch_rows: int = BATCH_ROWS) -> dict:
+    """Workbook -> Parquet parts in cache_dir/<sha256>/; returns the cache entry's metadata.
+
+    Runs in a worker process; the entry appears atomically (built in a temp dir, then renamed).
+    """
+    path, cache_dir = Path(path), Path(cache_dir)
+    sha256 = sha256 or file_hash(path)
+    meta = cached(cache_dir, sha256)
+    if meta is not None:
+        return {**meta, "cached": True}
+
+    tmp = cache_dir / f".tmp-{sha256}-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    sheets: dict[str, dict] = {}
+    for sheet, table in iter_sheet_batches(path, batch_rows):
+        info = sheets.setdefault(sheet, {"dir": f"{len(sheets):02d}-{_slug(sheet)}", "rows": 0, "parts": 0,
+                                         "columns": table.column_names})
+        out = tmp / info["dir"] / f"part-{info['parts']:05d}.parquet"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, out, compression="zstd")
+        info["rows"] += table.num_rows
+        info["parts"] += 1
+    meta = {"source": path.name, "sha256": sha256, "engine": engine(), "sheets": sheets,
+            "rows": sum(s["rows"] for s in sheets.values())}
+    tmp.mkdir(parents=True, exist_ok=True)
+    (tmp / META).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    final = cache_dir / sha256
+    try:
+        os.replace(tmp, final)
+    except OSError:  # another process converted the same workbook first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {**meta, "cached": False}
+
+def convert_workbooks(files: dict[str, str], cache_dir: Path, workers: int | None = None) -> dict[str, dict]:
+    """{path: sha256} -> {path: metadata}; workbooks not in the cache are parsed in a process pool."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    out, todo = {}, {}
+    for path, sha in files.items():
+        meta = cached(cache_dir, sha)
+        if meta is not None:
+            out[path] = {**meta, "cached": True}
+        else:
+            todo[path] = sha
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers <= 1:
+        for path, sha in todo.items():
+            out[path] = convert_workbook(path, str(cache_dir), sha)
+        return out
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_workbook, path, str(cache_dir), sha): path for path, sha in todo.items()}
+        for fut in as_completed(futures):
+            out[futures[fut]] = fut.result()
+    return out
+
+def iter_cached_parts(cache_dir: Path, meta: dict) -> Iterator[tuple[str, pa.Table]]:
+    """(sheet, table) for every Parquet part of a cache entry, in sheet and row order."""
+    root = cache_dir / meta["sha256"]
+    for sheet, info in meta["sheets"].items():
+        for part in sorted((root / info["dir"]).glob("part-*.parquet")):
+            yield sheet, pq.read_table(part)
+
+def prune_cache(cache_dir: Path, keep: set[str]) -> int:
+    """Remove cache entries (and leftover temp dirs) whose hash is not in keep; returns how many."""
+    removed = 0
+    for d in cache_dir.iterdir() if cache_dir.is_dir() else []:
+        if d.is_dir() and d.name not in keep:
+            shutil.rmtree(d, ignore_errors=True)
+            removed += 1
+    return removed
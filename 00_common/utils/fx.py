@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+def rates_frame(payload: dict) -> pd.DataFrame:
+    """exchangerate-style payload {base, date, rates{}} -> (date, currency, rate) table."""
+    rates = payload.get("rates") or {}
+    day = payload.get("run_date") or payload.get("date")
+    return pd.DataFrame({
+        "date": pd.to_datetime([day] * len(rates)),
+        "currency": [c.upper() for c in rates],
+        "rate": [float(r) for r in rates.values()],
+    })
+
+def lookup_snapshot(currency: pd.Series, rates: dict) -> np.ndarray:
+    """Rate per row from a single {currency: rate} snapshot (NaN where unknown).
+
+    Currencies are factorized to integer codes once and the codes index a NumPy
+    array of rates, so the cost is one hash pass + one gather for the whole column.
+    """
+    codes, uniques = pd.factorize(currency)
+    lookup = np.array([float(rates.get(c, np.nan)) for c in uniques] + [np.nan])
+    return lookup[codes]  # code -1 (null currency) hits the trailing NaN
+
+def lookup_asof(tx: pd.DataFrame, rates: pd.DataFrame,
+                currency_col: str = "currency", date_col: str = "date") -> np.ndarray:
+    """Rate per row from a (date, currency, rate) table: latest rate on or before the row's date."""
+    left = pd.DataFrame({
+        "_pos": np.arange(len(tx)),
+        "date": pd.to_datetime(tx[date_col]).astype("datetime64[ns]"),
+        "currency": tx[currency_col].astype(object),
+    }).sort_values("date", kind="stable")
+    right = pd.DataFrame({
+        "date": pd.to_datetime(rates["date"]).astype("datetime64[ns]"),
+        "currency": rates["currency"].astype(object),
+        "rate": rates["rate"].astype(float),
+    }).sort_values("date", kind="stable")
+    merged = pd.merge_asof(left.dropna(subset=["date"]), right, on="date", by="currency")
+    out = np.full(len(tx), np.nan)
+    out[merged["_pos"].to_numpy()] = merged["rate"].to_numpy()
+    return out
+
+def missing_rates(tx: pd.DataFrame, rate: np.ndarray,
+                  currency_col: str = "currency", date_col: str | None = None) -> pd.DataFrame:
+    """Distinct currency (or currency/date) pairs that got no rate, with row counts."""
+    bad = tx.loc[np.isnan(rate) | (rate == 0)]
+    cols = [currency_col] + ([date_col] if date_col else [])
+    return bad.groupby(cols, dropna=False).size().rename("rows").reset_index()
+
+def convert_to_eur(tx: pd.DataFrame, rates: dict | pd.DataFrame, amount_col: str = "amount",
+                   currency_col: str = "currency", date_col: str = "date") -> pd.Series:
+    """amount / rate for every row in one vectorized operation (base=EUR: rate = currency per EUR).
+
+    rates is either a {currency: rate} snapshot or a (date, currency, rate) table that
+    is as-of joined on date. All currency/date pairs without a rate are reported in a
+    single ValueError instead of failing on the first one.
+    """
+    if isinstance(rates, pd.DataFrame):
+        rate = lookup_asof(tx, rates, currency_col, date_col)
+        missing = missing_rates(tx, rate, currency_col, date_col)
+    else:
+        rate = lookup_snapshot(tx[currency_col], rates)
+        missing = missing_rates(tx, rate, currency_col)
+    if len(missing):
+        raise ValueError(f"Missing rates for {len(missing)} currency/date pairs:\n{missing.to_string(index=False)}")
+    amount = pd.to_numeric(tx[amount_col]).to_numpy(dtype=float)
+    return pd.Series(amount / rate, index=tx.index, name="amount_eur")
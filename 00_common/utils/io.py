@@ -1,16 +1,173 @@
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
 import pandas as pd
-from sqlalchemy import create_engine
+import pyarrow as pa
+import pyarrow.csv as pv
+from sqlalchemy import inspect, text
 
-def read_csv_folder(folder: Path) -> pd.DataFrame:
+from utils.sqlite_bulk import get_engine, load_sqlite
+from utils.schema import InferenceCache, Plan, Schema, iter_csv, read_plan, resolve, to_pandas
+
+# rough overhead of a parsed pandas chunk vs its share of the budget:
+# raw chunk + transformed copy + leftover carried over from the previous file
+CHUNK_BUDGET_FACTOR = 3
+SAMPLE_ROWS = 1000
+
+def read_csv_folder(folder: Path, workers: int = 1) -> pd.DataFrame:
     files = sorted(folder.glob("*.csv"))
+    if workers > 1:
+        tables = [t for _, t in read_csv_tables(files, workers)]
+        return concat_tables(tables).to_pandas() if tables else pd.DataFrame()
     dfs = [pd.read_csv(f) for f in files]
     return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
 
+def _read_csv_ipc(path: str, plan: Plan | None = None) -> pa.Buffer:
+    """Process-pool worker: parse one CSV with pyarrow, ship it back as an Arrow IPC stream.
+
+    The parent gets one contiguous buffer instead of a pickled DataFrame (no per-object
+    pickling of string columns). With a plan (utils.schema.resolve) columns are typed and pruned.
+    """
+    table = read_plan(plan) if plan else pv.read_csv(path)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def read_csv_tables(
+    files: list[Path],
+    workers: int,
+    schema: Schema | None = None,
+    cache: InferenceCache | None = None,
+) -> Iterator[tuple[Path, pa.Table]]:
+    """Parse files in a process pool, yielding (file, table) in the given (sorted) order.
+
+    At most `workers` files are in flight, so memory is bounded by workers x file size.
+    Plans (and the inference cache) are resolved in the parent, workers only parse.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for f in files:
+            plan = resolve(f, schema, cache) if schema else None
+            pending.append((f, pool.submit(_read_csv_ipc, str(f), plan)))
+            if len(pending) >= workers:
+                f0, fut = pending.popleft()
+                yield f0, pa.ipc.open_stream(fut.result()).read_all()
+        while pending:
+            f0, fut = pending.popleft()
+            yield f0, pa.ipc.open_stream(fut.result()).read_all()
+
+def concat_tables(tables: list[pa.Table]) -> pa.Table:
+    # files may disagree on inferred types (int64 vs double): widen instead of failing
+    return pa.concat_tables(tables, promote_options="permissive")
+
+def iter_csv_file_chunks(
+    files: list[Path],
+    chunk_rows: int | None = None,
+    memory_budget_mb: float = 256,
+    workers: int = 1,
+    schema: Schema | None = None,
+    cache: InferenceCache | None = None,
+) -> Iterator[tuple[Path, pd.DataFrame]]:
+    """(file, chunk) pairs in file order; chunks never span files.
+
+    workers <= 1: each file is streamed in chunk_rows pieces (pandas, or the pyarrow
+    streaming reader when a schema is given).
+    workers > 1: files are parsed in parallel (read_csv_tables) and sliced into
+    chunk_rows pieces on the Arrow side, converting one slice at a time.
+    schema: utils.schema declaration -> explicit types, only declared (or inferred and
+    cached) columns are parsed.
+    """
+    files = list(files)
+    if not files:
+        return
+    if chunk_rows is None:
+        chunk_rows = estimate_chunk_rows(files, memory_budget_mb)
+    if workers <= 1 and schema is None:
+        for f in files:
+            for part in pd.read_csv(f, chunksize=chunk_rows):
+                yield f, part
+        return
+    if workers <= 1:
+        block_size = max(1 << 20, int(memory_budget_mb * 1024 * 1024 / CHUNK_BUDGET_FACTOR))
+        for f in files:
+            for table in _rechunk(iter_csv(f, schema, cache, block_size), chunk_rows):
+                yield f, to_pandas(table)
+        return
+    for f, table in read_csv_tables(files, workers, schema, cache):
+        for start in range(0, table.num_rows, chunk_rows):
+            yield f, to_pandas(table.slice(start, chunk_rows))
+
+def _rechunk(tables: Iterator[pa.Table], rows: int) -> Iterator[pa.Table]:
+    """Re-slice a stream of tables into tables of exactly `rows` rows (the last may be shorter)."""
+    buf, n = [], 0
+    for t in tables:
+        buf.append(t)
+        n += t.num_rows
+        while n >= rows:
+            whole = pa.concat_tables(buf)
+            yield whole.slice(0, rows)
+            buf, n = [whole.slice(rows)], n - rows
+    if n:
+        yield pa.concat_tables(buf)
+
+def estimate_chunk_rows(files: list[Path], memory_budget_mb: float) -> int:
+    """How many rows fit into memory_budget_mb, judged by a sample of the first file."""
+    sample = pd.read_csv(files[0], nrows=SAMPLE_ROWS)
+    if sample.empty:
+        return SAMPLE_ROWS
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    budget = memory_budget_mb * 1024 * 1024 / CHUNK_BUDGET_FACTOR
+    return max(1, int(budget // bytes_per_row))
+
 def write_parquet(df: pd.DataFrame, path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
     df.to_parquet(path, index=False)
 
-def to_sqlite(df: pd.DataFrame, db_url: str, table: str, if_exists: str = "append"):
-    eng = create_engine(db_url)
-    df.to_sql(table, eng, if_exists=if_exists, index=False)
+def to_sqlite(
+    df: pd.DataFrame,
+    db_url: str,
+    table: str,
+    if_exists: str = "append",
+    key: list[str] | None = None,
+    indexes: list[list[str]] | None = None,
+    owner: str | None = None,
+):
+    """sqlite:// -> utils.sqlite_bulk.load_sqlite (key= upserts); other URLs -> DataFrame.to_sql (append/replace only)."""
+    sqlite = db_url.startswith("sqlite")
+    if (key or owner) and not sqlite:
+        raise ValueError(f"key=/owner= (upsert) are supported for sqlite:// targets only, "
+                         f"got {db_url.split('://', 1)[0]}://")
+    if sqlite:
+        load_sqlite(df, db_url, table, if_exists=if_exists, key=key, indexes=indexes, owner=owner)
+    else:
+        df.to_sql(table, get_engine(db_url), if_exists=if_exists, index=False, chunksize=10_000, method="multi")
+
+def sqlite_path(db_url: str) -> Path:
+    """sqlite:///relative/or/absolute.sqlite -> Path to the database file."""
+    prefix = "sqlite:///"
+    if not db_url.startswith(prefix):
+        raise ValueError(f"Not a sqlite URL: {db_url}")
+    return Path(db_url[len(prefix):])
+
+def delete_where(db_url: str, table: str, column: str, value) -> int:
+    """DELETE rows where column = value; a missing table simply deletes nothing."""
+    with get_engine(db_url).begin() as conn:
+        if not inspect(conn).has_table(table):
+            return 0
+        res = conn.execute(text(f'DELETE FROM "{table}" WHERE "{column}" = :v'), {"v": value})
+        return res.rowcount
+
+def truncate_table(db_url: str, table: str) -> int:
+    """DELETE every row (schema and indexes stay); a missing table simply deletes nothing."""
+    with get_engine(db_url).begin() as conn:
+        if not inspect(conn).has_table(table):
+            return 0
+        return conn.execute(text(f'DELETE FROM "{table}"')).rowcount
+
+def create_index(db_url: str, table: str, cols: list[str]):
+    name = f"ix_{table}_{'_'.join(cols)}"
+    col_sql = ", ".join(f'"{c}"' for c in cols)
+    with get_engine(db_url).begin() as conn:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({col_sql})'))
@@ -0,0 +1,82 @@
+from pathlib import Path
+import re
+import pyarrow.parquet as pq
+
+from utils.catalog import CATALOG_FILE, Catalog
+
+# silver partitions: date=YYYY-MM-DD (daily), month=YYYY-MM / year=YYYY (compacted)
+PART_RE = re.compile(r"^(date|month|year)=([0-9-]+)$")
+# silver dtypes (utils.dtypes.compact), the same for every partition: date32, dictionary
+# base/symbol, rate without loss of precision (02 writes daily files with it, compaction rewrites)
+RATES_DTYPES = {"date": "date", "base": "category", "symbol": "category", "rate": "float64"}
+
+def _partitions(silver_dir: Path, name: str) -> list[tuple[str, str, Path]]:
+    if not silver_dir.is_dir():
+        return []
+    out = []
+    for d in sorted(silver_dir.iterdir()):
+        m = PART_RE.match(d.name)
+        if m and (d / name).exists():
+            out.append((m.group(1), m.group(2), d / name))
+    return out
+
+def _covering(kind: str, value: str) -> list[tuple[str, str]]:
+    """Compacted partitions that would contain this partition."""
+    if kind == "date":
+        return [("month", value[:7]), ("year", value[:4])]
+    if kind == "month":
+        return [("year", value[:4])]
+    return []
+
+def scan_silver(silver_dir: Path, name: str = "rates.parquet") -> tuple[list[Path], list[tuple[Path, int]]]:
+    """Split silver files into (visible, hidden).
+
+    A partition is hidden once a compacted partition covering it was written after it
+    (mtime): the compactor's os.replace of the compacted file is the single commit point,
+    so readers switch from the small files to the big one atomically. Hidden files are
+    returned with the mtime_ns of the file that supersedes them (for delayed cleanup).
+    A daily file written after the compaction stays visible until the next compaction.
+    """
+    parts = _partitions(silver_dir, name)
+    mtimes = {(k, v): f.stat().st_mtime_ns for k, v, f in parts}
+    visible, hidden = [], []
+    for kind, value, f in parts:
+        newer = [mtimes[c] for c in _covering(kind, value) if mtimes.get(c, -1) >= mtimes[(kind, value)]]
+        if newer:
+            hidden.append((f, max(newer)))
+        else:
+            visible.append(f)
+    return visible, hidden
+
+def catalog(silver_dir: Path) -> Catalog:
+    return Catalog(silver_dir / CATALOG_FILE)
+
+def silver_files(silver_dir: Path, name: str = "rates.parquet", **where) -> list[Path]:
+    """Files a reader should scan right now (instead of globbing date=*/rates.parquet).
+
+    where: predicates for utils.catalog (e.g. date=("2025-01-01", "2025-01-07")) -> only
+    files whose min/max overlap; files not catalogued yet are registered from their footer.
+    """
+    files = scan_silver(silver_dir, name)[0]
+    if not where or not files:
+        return files
+    cat, dataset = catalog(silver_dir), Path(name).stem
+    cat.sync(dataset, files)
+    keep = set(cat.files(dataset, **where))
+    return [f for f in files if f in keep]
+
+def covered_dates(silver_dir: Path, name: str = "rates.parquet", dates: list | None = None) -> set[str]:
+    """Every date already present in the silver lake, daily or compacted.
+
+    With dates only files overlapping min(dates)..max(dates) are looked at.
+    """
+    where = {"date": (min(dates), max(dates))} if dates else {}
+    out = set()
+    for f in silver_files(silver_dir, name, **where):
+        kind, value = PART_RE.match(f.parent.name).groups()
+        if kind == "date":
+            out.add(value)
+        else:
+            col = pq.read_table(f, columns=["date"]).column("date")
+            out.update(str(v)[:10] for v in col.unique().to_pylist())
+    return out
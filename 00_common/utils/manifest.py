@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+HASH_BLOCK = 1 << 20
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def file_fingerprint(path: Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_hash(path)}
+
+def load_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict, path: Path):
+    # write to a temp file and swap, so a crash never leaves a half-written manifest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def changed_files(files: list[Path], manifest: dict) -> tuple[dict[str, dict], dict[str, dict]]:
+    """Split files against the manifest into ({path: fp} changed, {path: fp} touched).
+
+    size + mtime match -> trusted as unchanged without reading the file;
+    otherwise the content hash decides. "touched" files have identical content but a
+    new mtime: they need no reload, only a manifest refresh for the fast path next time.
+    """
+    changed, touched = {}, {}
+    for f in files:
+        key = f.as_posix()
+        seen = manifest.get(key)
+        st = f.stat()
+        if seen and seen["size"] == st.st_size and seen["mtime_ns"] == st.st_mtime_ns:
+            continue
+        fp = file_fingerprint(f)
+        if seen and seen["sha256"] == fp["sha256"]:
+            touched[key] = fp
+        else:
+            changed[key] = fp
+    return changed, touched
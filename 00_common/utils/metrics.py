@@ -0,0 +1,262 @@
+"""Per-stage pipeline metrics: wall/CPU time, memory, rows in/out -> JSON lines (+ Prefect artifact).
+
+    with pipeline("04_parquet_to_duckdb"):
+        with stage("load", rows_in=n) as st:
+            ...
+            st.rows_out = inserted
+
+    @task
+    @staged("transform")            # rows_in/rows_out taken from the first argument / the result
+    def transform(df): ...
+
+Environment switches (all off by default, so instrumentation costs a few syscalls per stage):
+    ETL_METRICS_PATH=path.jsonl     where records go (default .metrics/metrics.jsonl, gitignored)
+    ETL_METRICS_MAX_MB=32           rotate the file at this size: path.1 .. path.3 are kept, older dropped
+    ETL_TRACEMALLOC=1               also record the Python-heap peak per stage (slows allocation-heavy code)
+    ETL_PROFILE=cprofile|pyinstrument   profile every stage into .metrics/profiles/
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_PATH = Path(".metrics/metrics.jsonl")
+MAX_MB = 32
+KEEP_ROTATED = 3
+
+_lock = threading.Lock()
+# the current run per context: a flow's tasks on other threads get it through Prefect's copied context;
+# plain thread pools must submit with contextvars.copy_context().run to stay in the run
+_run: ContextVar[dict] = ContextVar("etl_metrics_run", default={"pipeline": None, "run_id": None, "records": None})
+
+def metrics_path() -> Path:
+    return Path(os.environ.get("ETL_METRICS_PATH") or METRICS_PATH)
+
+def _rotate(path: Path):
+    """path -> path.1 -> ... -> path.KEEP_ROTATED once path reaches ETL_METRICS_MAX_MB."""
+    limit = float(os.environ.get("ETL_METRICS_MAX_MB", MAX_MB)) * 2**20
+    if not path.is_file() or path.stat().st_size < limit:  # not written yet, or os.devnull
+        return
+    for i in range(KEEP_ROTATED - 1, 0, -1):
+        older = path.with_name(f"{path.name}.{i}")
+        if older.exists():
+            os.replace(older, path.with_name(f"{path.name}.{i + 1}"))
+    os.replace(path, path.with_name(f"{path.name}.1"))
+
+def rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb() -> float | None:
+    """Process-lifetime peak RSS (ru_maxrss: KiB on Linux, bytes on macOS)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def count_rows(obj) -> int | None:
+    if hasattr(obj, "num_rows"):   # pyarrow Table / RecordBatch
+        return int(obj.num_rows)
+    if hasattr(obj, "shape"):      # pandas / numpy
+        return int(obj.shape[0])
+    return None
+
+class Stage:
+    def __init__(self, name: str, rows_in: int | None = None, **extra):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.extra = extra
+
+class _Profiler:
+    def __init__(self, kind: str, name: str):
+        self.kind, self.name, self.prof, self.path = kind, name, None, None
+
+    def __enter__(self):
+        try:
+            if self.kind == "cprofile":
+                import cProfile
+                self.prof = cProfile.Profile()
+                self.prof.enable()
+            elif self.kind == "pyinstrument":
+                from pyinstrument import Profiler
+                self.prof = Profiler()
+                self.prof.start()
+        except (ImportError, ValueError, RuntimeError):
+            self.prof = None  # not installed, or another profiler is already active (nested stage)
+        return self
+
+    def __exit__(self, *exc):
+        if self.prof is None:
+            return
+        out = metrics_path().parent / "profiles"
+        out.mkdir(parents=True, exist_ok=True)
+        stem = f"{_slug(_run.get()['pipeline'] or 'adhoc')}-{_slug(self.name)}-{time.time_ns()}"
+        if self.kind == "cprofile":
+            self.prof.disable()
+            self.path = out / f"{stem}.prof"
+            self.prof.dump_stats(self.path)
+        else:
+            self.prof.stop()
+            self.path = out / f"{stem}.html"
+            self.path.write_text(self.prof.output_html(), encoding="utf-8")
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^a-z0-9-]+", "-", s.lower()).strip("-")
+
+class _Peak:
+    """Python-heap peak of one open stage."""
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+# open stages of the whole process: tracemalloc has one peak, so a stage that resets it first
+# folds it into every stage still open (including ones on other threads)
+_open_peaks: list[_Peak] = []
+
+def _trace_enter() -> _Peak:
+    peak = _Peak()
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current = tracemalloc.get_traced_memory()[1]
+        for p in _open_peaks:
+            p.bytes = max(p.bytes, current)
+        tracemalloc.reset_peak()
+        _open_peaks.append(peak)
+    return peak
+
+def _trace_exit(peak: _Peak) -> int:
+    with _lock:
+        _open_peaks[:] = [p for p in _open_peaks if p is not peak]
+        return max(peak.bytes, tracemalloc.get_traced_memory()[1])
+
+def _write(record: dict):
+    path = metrics_path()
+    records = _run.get()["records"]
+    with _lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _rotate(path)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        if records is not None:
+            records.append(record)
+
+@contextmanager
+def stage(name: str, rows_in: int | None = None, profile: str | None = None, **extra):
+    """Measure one stage; set st.rows_out (and st.rows_in) inside the block."""
+    st = Stage(name, rows_in, **extra)
+    peak = _trace_enter() if os.environ.get("ETL_TRACEMALLOC") == "1" else None
+    profiler = _Profiler(profile or os.environ.get("ETL_PROFILE", ""), name)
+    error = None
+    rss0 = rss_mb()
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        with profiler:
+            yield st
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        wall = time.perf_counter() - t0
+        rows = st.rows_out if st.rows_out is not None else st.rows_in
+        rss1 = rss_mb()
+        py_peak = _trace_exit(peak) if peak is not None else None
+        run = _run.get()
+        _write({
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "run_id": run["run_id"],
+            "pipeline": run["pipeline"],
+            "stage": name,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - c0, 4),  # all threads of the process (DuckDB/Arrow pools)
+            "rss_mb": round(rss1, 1) if rss1 is not None else None,
+            "rss_delta_mb": round(rss1 - rss0, 1) if rss1 is not None and rss0 is not None else None,
+            "peak_rss_mb": round(peak_rss_mb() or 0, 1) or None,
+            "py_peak_mb": round(py_peak / 2**20, 1) if py_peak is not None else None,
+            "rows_in": st.rows_in,
+            "rows_out": st.rows_out,
+            "rows_per_s": round(rows / wall) if rows and wall > 0 else None,
+            "profile": str(profiler.path) if profiler.path else None,
+            "error": error,
+            **st.extra,
+        })
+
+def staged(name: str | None = None, rows_in=None, rows_out=None):
+    """Decorator form of stage(); put it under @task so Prefect retries are measured one by one.
+
+    rows_in / rows_out: callables (args -> int, result -> int) overriding the default of
+    counting rows of the first argument / of the result (DataFrame, Arrow table).
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            n_in = rows_in(*args, **kwargs) if rows_in else (count_rows(args[0]) if args else None)
+            with stage(name or fn.__name__, n_in) as st:
+                result = fn(*args, **kwargs)
+                st.rows_out = rows_out(result) if rows_out else count_rows(result)
+                return result
+        return wrapper
+    return deco
+
+def summarize(records: list[dict]) -> list[dict]:
+    """One row per stage: calls, total wall/CPU, rows, max memory."""
+    out: dict[str, dict] = {}
+    for r in records:
+        s = out.setdefault(r["stage"], {"stage": r["stage"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                        "rows_in": 0, "rows_out": 0, "peak_rss_mb": 0.0, "py_peak_mb": None})
+        s["calls"] += 1
+        s["wall_s"] = round(s["wall_s"] + r["wall_s"], 4)
+        s["cpu_s"] = round(s["cpu_s"] + r["cpu_s"], 4)
+        s["rows_in"] += r["rows_in"] or 0
+        s["rows_out"] += r["rows_out"] or 0
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], r["peak_rss_mb"] or 0)
+        if r["py_peak_mb"] is not None:
+            s["py_peak_mb"] = max(s["py_peak_mb"] or 0, r["py_peak_mb"])
+    return list(out.values())
+
+def publish_artifact(name: str, summary: list[dict]):
+    """Table artifact on the current Prefect flow run; no-op outside Prefect."""
+    try:
+        from prefect.artifacts import create_table_artifact
+        from prefect.context import FlowRunContext
+    except ImportError:
+        return
+    if FlowRunContext.get() is None or not summary:
+        return
+    create_table_artifact(key=f"metrics-{_slug(name)}", table=summary,
+                          description=f"Per-stage metrics for {name}")
+
+@contextmanager
+def pipeline(name: str):
+    """Group the stages of one run (run_id, pipeline name) and publish their summary at the end."""
+    run = {"pipeline": name, "run_id": uuid.uuid4().hex[:12], "records": []}
+    token = _run.set(run)
+    try:
+        with stage("total"):
+            yield run
+    finally:
+        _run.reset(token)
+        summary = summarize(run["records"])
+        try:
+            publish_artifact(name, summary)
+        except Exception:
+            pass  # metrics must never fail the pipeline
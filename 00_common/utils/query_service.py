@@ -0,0 +1,225 @@
+"""Read-only query layer over a DuckDB warehouse: connection pool + named queries + result cache.
+
+    svc = QueryService("05_json_logs_to_duckdb/warehouse.duckdb")
+    svc.query("dau", start="2025-08-01", end="2025-08-31")   # -> pyarrow.Table
+
+Results are cached (LRU) per (query name, params) together with the warehouse version:
+the (mtime_ns, size) of the database file and its WAL. Any committed write by a loader
+changes that version, so cached results are never served across a load, and a repeated
+dashboard query on an unchanged warehouse never touches DuckDB at all.
+
+DuckDB lets one process write a file only while no other process holds it open, so the
+pool keeps its read-only handle only while queries run and closes it after hold_seconds
+of idleness; a loader can then take the write lock. If a loader holds the lock when a
+query arrives, the last cached result for that query is returned (or the open is retried
+until lock_timeout).
+"""
+from collections import OrderedDict
+from pathlib import Path
+import queue
+import threading
+import time
+
+import duckdb
+import pyarrow as pa
+
+from utils.duck import connect
+
+ALL_TIME = {"start": "1900-01-01", "end": "9999-12-31"}
+
+# name -> (sql with $params, default params); 04: fact_rates/dim_currency, 05: fact_events
+NAMED_QUERIES = {
+    # ---- 04_parquet_to_duckdb/sql/01_sample_queries.sql
+    "currencies": ("SELECT * FROM dim_currency ORDER BY symbol", {}),
+    "rates_per_date": ("""
+        SELECT date, COUNT(*) AS n
+        FROM fact_rates
+        WHERE date BETWEEN CAST($start AS DATE) AND CAST($end AS DATE)
+        GROUP BY date
+        ORDER BY date DESC
+    """, ALL_TIME),
+    "avg_rate_per_currency": ("""
+        SELECT d.symbol, AVG(f.rate) AS avg_rate
+        FROM fact_rates f
+        JOIN dim_currency d USING(currency_key)
+        WHERE f.date BETWEEN CAST($start AS DATE) AND CAST($end AS DATE)
+        GROUP BY d.symbol
+        ORDER BY d.symbol
+    """, ALL_TIME),
+    # ---- 05_json_logs_to_duckdb/sql/queries.sql
+    "event_counts": ("""
+        SELECT event, COUNT(*) AS events
+        FROM fact_events
+        WHERE timestamp >= CAST($start AS DATE) AND timestamp < CAST($end AS DATE) + INTERVAL 1 DAY
+        GROUP BY event
+        ORDER BY events DESC
+    """, ALL_TIME),
+    # dau / first_event / retention / funnel read the derived tables kept by the 05 loader (flows/derived.py)
+    "dau": ("""
+        SELECT d, COUNT(*) AS dau
+        FROM user_day
+        WHERE d BETWEEN CAST($start AS DATE) AND CAST($end AS DATE)
+        GROUP BY d
+        ORDER BY d DESC
+    """, ALL_TIME),
+    "first_event": ("""
+        SELECT user_id, first_event AS event, first_ts
+        FROM user_first_seen
+        ORDER BY first_ts
+        LIMIT $limit
+    """, {"limit": 1000}),
+    "retention": ("""
+        SELECT CAST(last_ts AS DATE) > CAST(first_ts AS DATE) AS returned_later, COUNT(*) AS users
+        FROM user_first_seen
+        WHERE CAST(first_ts AS DATE) BETWEEN CAST($start AS DATE) AND CAST($end AS DATE)
+        GROUP BY returned_later
+    """, ALL_TIME),
+    "funnel_login_purchase": ("""
+        SELECT
+          (SELECT COUNT(*) FROM user_first_seen)            AS users_total,
+          COUNT(*)                                          AS users_logged,
+          COUNT(*) FILTER (WHERE p.first_ts IS NOT NULL
+                           AND DATE_TRUNC('day', l.first_ts) = DATE_TRUNC('day', p.first_ts)) AS users_purchased_same_day
+        FROM user_event_first l
+        LEFT JOIN user_event_first p ON p.user_id = l.user_id AND p.event = $step2
+        WHERE l.event = $step1
+    """, {"step1": "login", "step2": "purchase"}),
+}
+
+def _to_arrow(result) -> pa.Table:
+    # duckdb >= 1.4 renamed fetch_arrow_table -> to_arrow_table
+    fetch = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+    return fetch()
+
+class QueryService:
+    def __init__(self, db_path: Path | str, pool_size: int = 4, cache_size: int = 128,
+                 hold_seconds: float = 2.0, lock_timeout: float = 10.0, queries: dict | None = None):
+        self.db_path = Path(db_path)
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self.hold_seconds = hold_seconds
+        self.lock_timeout = lock_timeout
+        self.queries = dict(NAMED_QUERIES if queries is None else queries)
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._con = None
+        self._pool: queue.Queue = queue.Queue()
+        self._in_flight = 0
+        self._last_used = 0.0
+        self._closer = None
+
+    # ---- warehouse version: changes on every committed write (db file or its WAL)
+
+    def version(self) -> tuple:
+        out = []
+        for p in (self.db_path, self.db_path.with_name(self.db_path.name + ".wal")):
+            try:
+                st = p.stat()
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    # ---- pool: cursors of one read-only handle, opened on demand, closed when idle
+
+    def _open(self):
+        # a loader may hold the write lock: retried with backoff until lock_timeout
+        return connect(self.db_path, read_only=True, lock_timeout=self.lock_timeout)
+
+    def _acquire(self):
+        with self._lock:
+            self._in_flight += 1
+            if self._con is None:
+                try:
+                    self._con = self._open()
+                except Exception:
+                    self._in_flight -= 1
+                    raise
+                for _ in range(self.pool_size):
+                    self._pool.put(self._con.cursor())
+        return self._pool.get()
+
+    def _release(self, cur):
+        self._pool.put(cur)
+        with self._lock:
+            self._in_flight -= 1
+            self._last_used = time.monotonic()
+            if self._in_flight == 0 and self._closer is None:
+                self._closer = threading.Timer(self.hold_seconds, self._close_if_idle)
+                self._closer.daemon = True
+                self._closer.start()
+
+    def _close_if_idle(self):
+        with self._lock:
+            self._closer = None
+            if self._in_flight or self._con is None:
+                return
+            if time.monotonic() - self._last_used < self.hold_seconds:
+                self._closer = threading.Timer(self.hold_seconds, self._close_if_idle)
+                self._closer.daemon = True
+                self._closer.start()
+                return
+            self._close_locked()
+
+    def _close_locked(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._con.close()
+        self._con = None
+
+    def close(self):
+        with self._lock:
+            if self._closer is not None:
+                self._closer.cancel()
+                self._closer = None
+            if self._con is not None:
+                self._close_locked()
+
+    # ---- queries
+
+    def execute(self, sql: str, params: dict | None = None) -> pa.Table:
+        """Run ad-hoc SQL on a pooled read-only cursor (not cached)."""
+        cur = self._acquire()
+        try:
+            return _to_arrow(cur.execute(sql, params or None))
+        finally:
+            self._release(cur)
+
+    def query(self, name: str, **params) -> pa.Table:
+        """Named query as an Arrow table; served from the cache while the warehouse is unchanged."""
+        sql, defaults = self.queries[name]
+        params = {**defaults, **params}
+        key = (name, tuple(sorted(params.items())))
+        version = self.version()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == version:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+        try:
+            table = self.execute(sql, params)
+        except (duckdb.IOException, duckdb.ConnectionException):
+            if entry is None:
+                raise
+            with self._lock:
+                self.stats["stale"] += 1  # writer still holds the lock: last known result
+            return entry[1]
+        with self._lock:
+            self.stats["misses"] += 1
+            self._cache[key] = (version, table)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return table
+
+    def stats_line(self) -> str:
+        s = self.stats
+        return f"Query cache: hits={s['hits']}, misses={s['misses']}, stale={s['stale']}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,279 @@
+"""Declared source schemas: typed, column-pruned CSV parsing with pyarrow.
+
+    SALES = Schema("sales", (Column("order_id", "int32"), Column("order_date", "date"),
+                             Column("note", "string", required=False)))
+    check_headers(files, SALES)       # drift check on header lines only, before any parse
+    table = read_csv(path, SALES)     # explicit types, no inference for declared columns
+
+Column types: int8..int64, float32 / float64, bool, string, category (dictionary-encoded),
+date (date32; ISO, or a strptime `format` -- a value with a time of day raises), timestamp
+(ISO or `format`); None leaves the type to the parser.
+
+Declared names match file headers case-insensitively, ignoring surrounding spaces; parsed
+columns are renamed to the declared names. A missing required column raises SchemaDriftError
+before anything is parsed, a missing optional one comes back as nulls of its type.
+
+Undeclared columns (Schema.extra):
+    "drop"   never parsed (pyarrow include_columns projection)
+    "infer"  parsed with inferred types. With an InferenceCache the types inferred from the
+             first block of a file are stored per header (in the source folder's .cache/) and
+             reused as explicit types on later runs, so every file of the folder is parsed to
+             the same schema without re-inferring.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+import csv
+import json
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+from utils.dtypes import DATE
+
+ARROW_TYPES = {
+    "int8": pa.int8(), "int16": pa.int16(), "int32": pa.int32(), "int64": pa.int64(),
+    "float32": pa.float32(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string(),
+    "category": pa.dictionary(pa.int32(), pa.string()), "date": pa.date32(), "timestamp": pa.timestamp("us"),
+}
+DUCKDB_TYPES = {
+    "int8": "TINYINT", "int16": "SMALLINT", "int32": "INTEGER", "int64": "BIGINT", "float32": "FLOAT",
+    "float64": "DOUBLE", "bool": "BOOLEAN", "string": "VARCHAR", "category": "VARCHAR", "date": "DATE",
+    "timestamp": "TIMESTAMP",
+}
+# utils.dtypes.compact kinds for the declared types (the rest is already compact after parsing)
+COMPACT_KINDS = {"string": "string", "category": "category", "date": "date"}
+INFER_BLOCK = 1 << 20  # bytes of a new file parsed to infer its undeclared columns
+
+class SchemaDriftError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str | None = None
+    format: str | None = None  # strptime pattern for date / timestamp
+    required: bool = True
+
+    def __post_init__(self):
+        if self.type is not None and self.type not in ARROW_TYPES:
+            raise ValueError(f"{self.name}: unknown column type {self.type!r}")
+
+@dataclass(frozen=True)
+class Schema:
+    name: str
+    columns: tuple[Column, ...]
+    extra: str = "infer"  # undeclared columns: "infer" | "drop"
+
+    def dtypes(self) -> dict[str, str]:
+        """Declared types as utils.dtypes.compact() kinds (fixed widths stay fixed)."""
+        return {c.name: COMPACT_KINDS.get(c.type, c.type) for c in self.columns if c.type}
+
+@dataclass(frozen=True)
+class Plan:
+    """How one file is parsed: resolved against its header, picklable for process-pool workers."""
+    path: Path
+    include: tuple[str, ...]  # header names (missing optional ones under their declared name)
+    types: dict[str, str]     # header name -> type
+    formats: dict[str, str]   # header name -> strptime pattern
+    rename: dict[str, str]    # header name -> declared name
+    cached: tuple[str, ...] = ()  # columns typed from the inference cache
+
+    def convert_options(self) -> pv.ConvertOptions:
+        parsers = sorted(set(self.formats.values()))
+        types = {c: pa.timestamp("s") if c in self.formats else ARROW_TYPES[t] for c, t in self.types.items()}
+        return pv.ConvertOptions(column_types=types, include_columns=list(self.include),
+                                 include_missing_columns=True,
+                                 timestamp_parsers=[*parsers, pv.ISO8601] if parsers else None)
+
+@dataclass
+class Drift:
+    path: Path
+    missing: list[str] = field(default_factory=list)  # declared columns not in the header
+    added: list[str] = field(default_factory=list)    # undeclared columns not seen in this folder before
+
+    def __str__(self) -> str:
+        parts = [f"missing {self.missing}" if self.missing else "", f"new {self.added}" if self.added else ""]
+        return f"{self.path.name}: " + ", ".join(p for p in parts if p)
+
+def _norm(name: str) -> str:
+    return str(name).strip().lower()
+
+def header(path: Path) -> list[str]:
+    """Column names from the first line only (nothing else of the file is read)."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+def _kind(t: pa.DataType) -> str:
+    if pa.types.is_integer(t):
+        return "int64"
+    if pa.types.is_floating(t):
+        return "float64"
+    if pa.types.is_boolean(t):
+        return "bool"
+    if pa.types.is_timestamp(t):
+        return "timestamp"
+    if pa.types.is_date(t):
+        return "date"
+    return "string"  # text, or all-null in the sampled block
+
+class InferenceCache:
+    """Inferred types of undeclared columns, one entry per distinct header, in <folder>/.cache/."""
+
+    def __init__(self, folder: Path, name: str):
+        self.path = Path(folder) / ".cache" / f"schema-{name}.json"
+        self._entries = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else []
+
+    def headers(self) -> list[list[str]]:
+        return [e["header"] for e in self._entries]
+
+    def get(self, hdr: list[str]) -> dict[str, str] | None:
+        return next((e["types"] for e in self._entries if e["header"] == hdr), None)
+
+    def put(self, hdr: list[str], types: dict[str, str]):
+        self._entries = [e for e in self._entries if e["header"] != hdr] + [{"header": hdr, "types": types}]
+        self._save()
+
+    def forget(self, hdr: list[str]):
+        self._entries = [e for e in self._entries if e["header"] != hdr]
+        self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self._entries, indent=2), encoding="utf-8")
+
+def bind(schema: Schema, hdr: list[str], path: Path | str = "") -> dict[str, str | None]:
+    """Declared name -> header name (None for a missing optional column)."""
+    by_norm = {_norm(h): h for h in hdr}
+    bound = {c.name: by_norm.get(_norm(c.name)) for c in schema.columns}
+    missing = [c.name for c in schema.columns if c.required and bound[c.name] is None]
+    if missing:
+        raise SchemaDriftError(f"{path}: required columns {missing} not in header {hdr}")
+    return bound
+
+def _undeclared(schema: Schema, hdr: list[str]) -> list[str]:
+    declared = {_norm(c.name) for c in schema.columns}
+    return [h for h in hdr if _norm(h) not in declared]
+
+def check_headers(files: list[Path], schema: Schema, cache: InferenceCache | None = None) -> list[Drift]:
+    """Compare header lines with the schema (and the headers cached for the folder).
+
+    Every file with a missing required column is reported in one SchemaDriftError; other
+    differences come back as Drift entries for logging.
+    """
+    seen = {h for hdr in (cache.headers() if cache else []) for h in hdr}
+    errors, drift = [], []
+    for f in files:
+        hdr = header(f)
+        try:
+            bound = bind(schema, hdr, f)
+        except SchemaDriftError as e:
+            errors.append(str(e))
+            continue
+        d = Drift(Path(f), missing=[n for n, h in bound.items() if h is None],
+                  added=[h for h in _undeclared(schema, hdr) if h not in seen] if cache or schema.extra == "drop" else [])
+        if d.missing or d.added:
+            drift.append(d)
+    if errors:
+        raise SchemaDriftError("Schema drift:\n" + "\n".join(errors))
+    return drift
+
+def _infer(plan: Plan, columns: list[str]) -> dict[str, str]:
+    # first block of the file only, declared columns keep their explicit types
+    opts = pv.ConvertOptions(column_types=plan.convert_options().column_types, include_columns=columns)
+    reader = pv.open_csv(plan.path, read_options=pv.ReadOptions(block_size=INFER_BLOCK), convert_options=opts)
+    return {c: _kind(reader.schema.field(c).type) for c in columns}
+
+def resolve(path: Path, schema: Schema, cache: InferenceCache | None = None) -> Plan:
+    """Parse plan for one file: header drift check, projection and types."""
+    hdr = header(path)
+    bound = bind(schema, hdr, path)
+    include, types, formats, rename = [], {}, {}, {}
+    for c in schema.columns:
+        h = bound[c.name] or c.name
+        include.append(h)
+        rename[h] = c.name
+        if c.type:
+            types[h] = c.type
+        if c.type in ("date", "timestamp") and c.format:
+            formats[h] = c.format
+    extras = _undeclared(schema, hdr) if schema.extra == "infer" else []
+    include += extras
+    plan = Plan(Path(path), tuple(include), types, formats, rename)
+    if not (cache and extras):
+        return plan
+    inferred = cache.get(hdr)
+    if inferred is None:
+        inferred = _infer(plan, extras)
+        cache.put(hdr, inferred)
+    return Plan(plan.path, plan.include, {**types, **inferred}, formats, rename, tuple(inferred))
+
+def _finish(table: pa.Table, plan: Plan) -> pa.Table:
+    table = table.rename_columns([plan.rename.get(c, c) for c in table.column_names])
+    for h, fmt in plan.formats.items():
+        if plan.types[h] != "date":
+            continue
+        name = plan.rename[h]
+        ts = table.column(name)
+        if pc.all(pc.equal(ts, pc.floor_temporal(ts, unit="day"))).as_py() is False:
+            raise SchemaDriftError(f"{plan.path}: {name} has a time of day, not a date ({fmt})")
+        table = table.set_column(table.column_names.index(name), name, ts.cast(pa.date32()))
+    return table
+
+def _parse_error(plan: Plan, cache: InferenceCache | None, e: Exception) -> SchemaDriftError:
+    hdr = header(plan.path)
+    col = re.search(r"CSV column #(\d+)", str(e))
+    if cache and col and int(col[1]) < len(hdr) and hdr[int(col[1])] in plan.cached:
+        # an inferred type no longer fits: infer again from the next file with this header
+        cache.forget(hdr)
+    return SchemaDriftError(f"{plan.path}: {e}")
+
+def read_plan(plan: Plan) -> pa.Table:
+    return _finish(pv.read_csv(plan.path, convert_options=plan.convert_options()), plan)
+
+def read_csv(path: Path, schema: Schema, cache: InferenceCache | None = None) -> pa.Table:
+    plan = resolve(path, schema, cache)
+    try:
+        return read_plan(plan)
+    except pa.ArrowInvalid as e:
+        raise _parse_error(plan, cache, e) from e
+
+def iter_csv(path: Path, schema: Schema, cache: InferenceCache | None = None,
+             block_size: int | None = None) -> Iterator[pa.Table]:
+    """Stream one file as typed tables of about block_size bytes each."""
+    plan = resolve(path, schema, cache)
+    read_options = pv.ReadOptions(block_size=block_size) if block_size else None
+    try:
+        for batch in pv.open_csv(path, read_options=read_options, convert_options=plan.convert_options()):
+            if batch.num_rows:
+                yield _finish(pa.Table.from_batches([batch]), plan)
+    except pa.ArrowInvalid as e:
+        raise _parse_error(plan, cache, e) from e
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    # dates stay date32 (what utils.dtypes.compact produces), categories come back as Categorical
+    return table.to_pandas(types_mapper={pa.date32(): DATE}.get)
+
+def duckdb_columns(schema: Schema) -> str:
+    """DuckDB `columns=` struct for read_json / read_csv (every column declared, in order)."""
+    return "{" + ", ".join(f"'{c.name}': '{DUCKDB_TYPES[c.type]}'" for c in schema.columns) + "}"
+
+def duckdb_csv(path: Path, schema: Schema) -> str:
+    """read_csv(...) scan with the declared types; the header is checked for drift first."""
+    bound = bind(schema, header(path), path)
+    # DuckDB trims header names
+    types = {bound[c.name].strip(): DUCKDB_TYPES[c.type] for c in schema.columns if c.type and bound[c.name]}
+    fmt = {c.type: c.format for c in schema.columns if c.format and bound[c.name]}
+    opts = ["header=true"]
+    if types:
+        opts.append("types={" + ", ".join(f"'{_sql(h)}': '{t}'" for h, t in types.items()) + "}")
+    if "date" in fmt:
+        opts.append(f"dateformat='{_sql(fmt['date'])}'")
+    if "timestamp" in fmt:
+        opts.append(f"timestampformat='{_sql(fmt['timestamp'])}'")
+    return f"read_csv('{_sql(Path(path).as_posix())}', {', '.join(opts)})"
+
+def _sql(s: str) -> str:
+    return s.replace("'", "''")
@@ -0,0 +1,187 @@
+"""Content-addressed silver snapshots: rows are stored once as hashed chunks, runs as manifests.
+
+    store = SnapshotStore(processed_folder, "sales")
+    snap = store.begin()                              # starts from the latest snapshot
+    snap.set_source("data_raw/a.csv", fp, [store.put(df) for df in chunks])
+    df = store.read()                                 # latest; read("silver_20250813_073911") or as_of=datetime
+    con.sql(f"SELECT ... FROM {read_parquet_sql(store.chunk_paths(order_date=('2024-01-01', '2024-01-31')))}")
+    store.gc(keep_last=10)                            # old manifests, then chunks no manifest references
+
+Layout under root:
+    chunks/<h[:2]>/<h>.parquet   one chunk of rows; h = blake2b over column names, dtypes and the
+                                 per-row hashes of the values (same rows -> same file, written once)
+    snapshots/<id>.json          manifest: id, created_at, parent and, per source file, its
+                                 fingerprint, the snapshot that loaded it and its chunks (hash, rows)
+
+A snapshot is the whole dataset as of its run: begin() copies the parent's sources and
+set_source() replaces one source, drop_source() removes one (the manifest is rewritten each
+time, so it always matches what is loaded). Unchanged data costs nothing but its manifest entry. Chunks are registered in
+the directory's utils.catalog, so chunk_paths(**where) prunes by min/max like any silver file.
+
+gc() keeps the newest keep_last snapshots (and any younger than keep_days), then deletes chunks
+none of them references, but only chunks older than grace_seconds: a running load may have
+written chunks its manifest does not list yet.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.catalog import CATALOG_FILE, Catalog
+
+ID_PREFIX = "silver_"
+GRACE_SECONDS = 3600
+
+def chunk_hash(df: pd.DataFrame) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+@dataclass
+class Snapshot:
+    store: "SnapshotStore"
+    id: str
+    parent: str | None
+    created_at: str
+    sources: dict[str, dict] = field(default_factory=dict)
+
+    @property
+    def rows(self) -> int:
+        return sum(c["rows"] for s in self.sources.values() for c in s["chunks"])
+
+    def set_source(self, source: str, fingerprint: dict, chunks: list[dict]):
+        """Replace one source file's chunks (lineage: its fingerprint and this snapshot's id)."""
+        self.sources[source] = {"fingerprint": fingerprint, "loaded_in": self.id, "chunks": chunks}
+        self.save()
+
+    def drop_source(self, source: str):
+        """Forget a source file that is gone (its chunks stay until gc() finds them unreferenced)."""
+        if self.sources.pop(source, None) is not None:
+            self.save()
+
+    def save(self):
+        body = {"id": self.id, "created_at": self.created_at, "parent": self.parent,
+                "rows": self.rows, "sources": dict(sorted(self.sources.items()))}
+        path = self.store.manifest_path(self.id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(body, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+
+class SnapshotStore:
+    def __init__(self, root: Path, dataset: str = "silver"):
+        self.root = Path(root)
+        self.dataset = dataset
+        self.chunks_dir = self.root / "chunks"
+        self.snapshots_dir = self.root / "snapshots"
+
+    @property
+    def catalog(self) -> Catalog:
+        return Catalog(self.root / CATALOG_FILE)
+
+    def chunk_path(self, h: str) -> Path:
+        return self.chunks_dir / h[:2] / f"{h}.parquet"
+
+    def manifest_path(self, snapshot_id: str) -> Path:
+        return self.snapshots_dir / f"{snapshot_id}.json"
+
+    def put(self, df: pd.DataFrame) -> dict:
+        """Store a chunk unless the same rows are already there; returns its {hash, rows} reference."""
+        h = chunk_hash(df)
+        path = self.chunk_path(h)
+        if path.exists():
+            os.utime(path)  # referenced again: keep it out of a concurrent gc()'s grace window
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".parquet.tmp")
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+            os.replace(tmp, path)
+            self.catalog.register(path, self.dataset)
+        return {"hash": h, "rows": len(df)}
+
+    def snapshots(self) -> list[str]:
+        """Snapshot ids, oldest first."""
+        if not self.snapshots_dir.is_dir():
+            return []
+        return sorted(p.stem for p in self.snapshots_dir.glob(f"{ID_PREFIX}*.json"))
+
+    def begin(self, full: bool = False) -> Snapshot:
+        """New snapshot on top of the latest one (full=True: start empty, e.g. a full refresh)."""
+        ids = self.snapshots()
+        now = _now()
+        base = f"{ID_PREFIX}{now.strftime('%Y%m%d_%H%M%S')}"
+        sid, n = base, 1
+        while sid in ids:  # two runs in one second: ids still sort in creation order
+            sid, n = f"{base}_{n}", n + 1
+        parent = self.load(ids[-1]) if ids else None
+        sources = {} if full or parent is None else json.loads(json.dumps(parent.sources))
+        return Snapshot(self, sid, parent.id if parent else None, now.isoformat(timespec="seconds"), sources)
+
+    def load(self, snapshot_id: str | None = None, as_of: datetime | None = None) -> Snapshot:
+        """A snapshot by id, the last one created at or before as_of, or the latest."""
+        ids = self.snapshots()
+        if snapshot_id is None:
+            if as_of is not None:
+                as_of = as_of if as_of.tzinfo else as_of.replace(tzinfo=timezone.utc)
+                ids = [i for i in ids if datetime.fromisoformat(self._raw(i)["created_at"]) <= as_of]
+            if not ids:
+                raise FileNotFoundError(f"No snapshot in {self.snapshots_dir}" + (f" before {as_of}" if as_of else ""))
+            snapshot_id = ids[-1]
+        m = self._raw(snapshot_id)
+        return Snapshot(self, m["id"], m["parent"], m["created_at"], m["sources"])
+
+    def _raw(self, snapshot_id: str) -> dict:
+        return json.loads(self.manifest_path(snapshot_id).read_text(encoding="utf-8"))
+
+    def chunk_paths(self, snapshot_id: str | None = None, as_of: datetime | None = None, **where) -> list[Path]:
+        """Chunk files of a snapshot in source order; where: utils.catalog predicates."""
+        snap = self.load(snapshot_id, as_of)
+        paths = [self.chunk_path(c["hash"]) for _, s in sorted(snap.sources.items()) for c in s["chunks"]]
+        if not where:
+            return paths
+        keep = set(self.catalog.files(self.dataset, **where))
+        return [p for p in paths if p in keep]
+
+    def read(self, snapshot_id: str | None = None, as_of: datetime | None = None,
+             columns: list[str] | None = None, **where) -> pd.DataFrame:
+        """Time travel: the dataset as it was in a snapshot (only chunks overlapping where are read)."""
+        tables = [pq.read_table(p, columns=columns) for p in self.chunk_paths(snapshot_id, as_of, **where)]
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+    def gc(self, keep_last: int = 10, keep_days: float | None = None,
+           grace_seconds: float = GRACE_SECONDS) -> dict:
+        """Retention: drop manifests beyond the policy, then chunks no kept manifest references."""
+        ids = self.snapshots()
+        cutoff = _now() - timedelta(days=keep_days) if keep_days is not None else None
+        kept = set(ids[-keep_last:]) if keep_last > 0 else set()
+        if cutoff is not None:
+            kept |= {i for i in ids if datetime.fromisoformat(self._raw(i)["created_at"]) >= cutoff}
+        dropped = [i for i in ids if i not in kept]
+        for i in dropped:
+            self.manifest_path(i).unlink(missing_ok=True)
+
+        referenced = {c["hash"] for i in kept for s in self._raw(i)["sources"].values() for c in s["chunks"]}
+        old = time.time() - grace_seconds
+        removed, freed = [], 0
+        for path in self.chunks_dir.glob("*/*.parquet") if self.chunks_dir.is_dir() else []:
+            st = path.stat()
+            if path.stem not in referenced and st.st_mtime < old:
+                path.unlink(missing_ok=True)
+                removed.append(path)
+                freed += st.st_size
+        if removed:
+            self.catalog.unregister(removed)
+        return {"snapshots": len(dropped), "chunks": len(removed), "bytes": freed}
@@ -0,0 +1,170 @@
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+BATCH_ROWS = 100_000
+
+# applied on the load connection only; WAL + NORMAL is crash-safe (at worst the
+# last commits roll back on power loss) and far cheaper than the default FULL
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -256 * 1024,  # KiB -> 256 MB page cache
+    "temp_store": "MEMORY",
+}
+
+@lru_cache(maxsize=None)
+def get_engine(db_url: str) -> Engine:
+    # one engine (and so one connection pool) per URL for the life of the process
+    return create_engine(db_url)
+
+def sqlite_url(db_path: Path | str) -> str:
+    return f"sqlite:///{Path(db_path).as_posix()}"
+
+def _is_date(s: pd.Series) -> bool:
+    # date32 columns from utils.dtypes.compact
+    return isinstance(s.dtype, pd.ArrowDtype) and pa.types.is_date(s.dtype.pyarrow_dtype)
+
+def _sql_type(s: pd.Series) -> str:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return _sql_type(pd.Series(s.cat.categories))
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_integer_dtype(s):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(s):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(s) or _is_date(s):
+        return "TIMESTAMP"
+    return "TEXT"
+
+def _column_values(s: pd.Series) -> list:
+    """Column -> list of plain Python values sqlite3 can bind (NaN/NaT/NA -> NULL)."""
+    if pd.api.types.is_datetime64_any_dtype(s) or _is_date(s):
+        # same text layout DataFrame.to_sql uses for sqlite (a date is its midnight, so keys
+        # written before date32 columns existed still match)
+        out = s.dt.strftime("%Y-%m-%d %H:%M:%S")
+        return out.astype(object).where(s.notna(), None).tolist()
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biuf":
+        # numpy numerics: tolist() gives Python scalars, float NaN is stored as NULL
+        return s.tolist()
+    return s.astype(object).where(s.notna(), None).tolist()
+
+def _rows(df: pd.DataFrame):
+    return zip(*(_column_values(df[c]) for c in df.columns))
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _index_sql(table: str, cols: list[str], unique: bool = False) -> str:
+    name = f"{'ux' if unique else 'ix'}_{table}_{'_'.join(cols)}"
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    col_sql = ", ".join(_quote(c) for c in cols)
+    return f"CREATE {kind} IF NOT EXISTS {_quote(name)} ON {_quote(table)} ({col_sql})"
+
+def _owned_elsewhere(cur, table: str, key: list[str], owner: str, batch: pd.DataFrame) -> list[tuple]:
+    cols = [*key, owner]
+    cur.execute(f"CREATE TEMP TABLE _owner_check AS SELECT {', '.join(_quote(c) for c in cols)} "
+                f"FROM {_quote(table)} WHERE 0")
+    cur.executemany(f"INSERT INTO _owner_check VALUES ({', '.join('?' for _ in cols)})", _rows(batch[cols]))
+    on = " AND ".join(f"t.{_quote(c)} = b.{_quote(c)}" for c in key)
+    taken = cur.execute(f"""
+        SELECT {', '.join(f't.{_quote(c)}' for c in key)}, t.{_quote(owner)}, b.{_quote(owner)}
+        FROM _owner_check b JOIN {_quote(table)} t ON {on}
+        WHERE t.{_quote(owner)} IS NOT b.{_quote(owner)}
+    """).fetchall()
+    cur.execute("DROP TABLE _owner_check")
+    return taken
+
+def load_sqlite(
+    df: pd.DataFrame,
+    db_url: str,
+    table: str,
+    if_exists: str = "append",
+    key: list[str] | None = None,
+    indexes: list[list[str]] | None = None,
+    batch_rows: int = BATCH_ROWS,
+    add_columns: bool = False,
+    owner: str | None = None,
+) -> int:
+    """Bulk-load df into a SQLite table with executemany, one transaction per batch.
+
+    if_exists: "append" | "replace" | "fail" (as in DataFrame.to_sql).
+    key: natural key columns -> INSERT ... ON CONFLICT(key) DO UPDATE (true upsert).
+    indexes: secondary indexes, created after the data is in (cheaper than maintaining
+    them row by row during the load).
+    add_columns: appending to an existing table adds df's columns it lacks (ALTER TABLE);
+    table columns df lacks are NULL for its rows. Off: a new column fails the insert.
+    owner: column that owns a key (e.g. source_file). The upsert only updates rows of the same
+    owner; a key already held by another owner raises ValueError and its batch is rolled back
+    (otherwise the row would silently move, and replacing the old owner later would delete it).
+    """
+    if if_exists not in ("append", "replace", "fail"):
+        raise ValueError(f"if_exists must be append/replace/fail, got {if_exists!r}")
+    cols = [str(c) for c in df.columns]
+    if key and not set(key).issubset(cols):
+        raise ValueError(f"Upsert key {key} not in columns {cols}")
+    if owner and (not key or owner in key or owner not in cols):
+        raise ValueError(f"owner must be a non-key column of {cols} with key=..., got {owner!r}")
+
+    conn = get_engine(db_url).raw_connection()
+    try:
+        cur = conn.cursor()
+        for name, value in LOAD_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+
+        exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone() is not None
+        if exists and if_exists == "fail":
+            raise ValueError(f"Table {table} already exists")
+        if exists and if_exists == "replace":
+            cur.execute(f"DROP TABLE {_quote(table)}")
+            exists = False
+        if not exists:
+            col_defs = ", ".join(f"{_quote(c)} {_sql_type(df[c])}" for c in cols)
+            cur.execute(f"CREATE TABLE {_quote(table)} ({col_defs})")
+        elif add_columns:
+            have = {r[1].lower() for r in cur.execute(f"PRAGMA table_info({_quote(table)})")}
+            for c in cols:
+                if c.lower() not in have:
+                    cur.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)} {_sql_type(df[c])}")
+        if key:
+            # ON CONFLICT needs a unique index on the key
+            cur.execute(_index_sql(table, key, unique=True))
+        conn.commit()
+
+        placeholders = ", ".join("?" for _ in cols)
+        sql = f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in cols)}) VALUES ({placeholders})"
+        if key:
+            updates = [c for c in cols if c not in key]
+            conflict = ", ".join(_quote(c) for c in key)
+            if updates:
+                sets = ", ".join(f"{_quote(c)}=excluded.{_quote(c)}" for c in updates)
+                sql += f" ON CONFLICT({conflict}) DO UPDATE SET {sets}"
+                if owner:
+                    sql += f" WHERE {_quote(table)}.{_quote(owner)} IS excluded.{_quote(owner)}"
+            else:
+                sql += f" ON CONFLICT({conflict}) DO NOTHING"
+
+        for start in range(0, len(df), batch_rows):
+            batch = df.iloc[start:start + batch_rows]
+            cur.executemany(sql, _rows(batch))
+            # a key of another owner is neither inserted nor updated, so it is missing from rowcount
+            if owner and cur.rowcount < len(batch):
+                taken = _owned_elsewhere(cur, table, key, owner, batch)
+                raise ValueError(f"{len(taken)} key(s) {key} of {table} already belong to another {owner}, "
+                                 f"e.g. (key..., current {owner}, new {owner}): {taken[:5]}")
+            conn.commit()
+
+        for idx_cols in indexes or []:
+            cur.execute(_index_sql(table, idx_cols))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()  # back to the pool
+    return len(df)
@@ -1,10 +1,196 @@
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any
+import numpy as np
 import pandas as pd
 
+SAMPLE_ROWS = 5
+
+@dataclass(frozen=True)
+class Expectation:
+    kind: str                  # non_null | unique | between | in_set | not_future
+    columns: tuple[str, ...]
+    min: Any = None
+    max: Any = None
+    strict: bool = False       # between: exclusive bounds
+    values: tuple = ()         # in_set
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}({', '.join(self.columns)})"
+
+def non_null(*cols: str) -> Expectation:
+    return Expectation("non_null", cols)
+
+def unique(*cols: str) -> Expectation:
+    return Expectation("unique", cols)
+
+def between(col: str, min=None, max=None, strict: bool = False) -> Expectation:
+    return Expectation("between", (col,), min=min, max=max, strict=strict)
+
+def in_set(col: str, values) -> Expectation:
+    return Expectation("in_set", (col,), values=tuple(values))
+
+def not_future(col: str) -> Expectation:
+    return Expectation("not_future", (col,))
+
+def key_hashes(df: pd.DataFrame, cols: tuple[str, ...]) -> np.ndarray:
+    """64-bit hash per row of the key columns (collisions are negligible at ETL scale)."""
+    return pd.util.hash_pandas_object(df[list(cols)], index=False).to_numpy()
+
+@dataclass
+class Validator:
+    """Evaluates a list of expectations over one DataFrame or a stream of chunks.
+
+    Each update() builds one boolean "bad row" mask per expectation with vectorized
+    column ops (no Python per-row work); counts and a few sample rows are accumulated.
+    Uniqueness is tracked across chunks with a sorted array of key hashes: only the chunk
+    is sorted, looked up with a binary search and merged in (np.insert), so duplicates
+    spanning chunks are caught without re-sorting everything seen so far.
+    """
+    expectations: list[Expectation]
+    sample_rows: int = SAMPLE_ROWS
+    rows: int = 0
+    failed: dict = field(default_factory=dict)
+    samples: dict = field(default_factory=dict)
+    _seen: dict = field(default_factory=dict)
+
+    def _mask(self, e: Expectation, df: pd.DataFrame) -> np.ndarray:
+        col = df[e.columns[0]]
+        if e.kind == "non_null":
+            return df[list(e.columns)].isna().to_numpy().any(axis=1)
+        if e.kind == "unique":
+            h = key_hashes(df, e.columns)
+            seen = self._seen.get(e, np.empty(0, dtype=np.uint64))
+            pos = np.searchsorted(seen, h)
+            in_seen = seen[np.minimum(pos, len(seen) - 1)] == h if len(seen) else np.zeros(len(h), dtype=bool)
+            new = np.unique(h[~in_seen])  # sorted, only this chunk
+            self._seen[e] = np.insert(seen, np.searchsorted(seen, new), new)
+            return pd.Series(h).duplicated().to_numpy() | in_seen
+        if e.kind == "between":
+            lo, hi = e.min, e.max
+            if isinstance(lo if lo is not None else hi, (str, date)):
+                # date bounds: compare as timestamps
+                vals = pd.to_datetime(col, errors="coerce")
+                lo, hi = (pd.Timestamp(b) if b is not None else None for b in (lo, hi))
+            else:
+                vals = pd.to_numeric(col, errors="coerce")
+            bad = np.zeros(len(df), dtype=bool)
+            if lo is not None:
+                bad |= ((vals <= lo) if e.strict else (vals < lo)).to_numpy()
+            if hi is not None:
+                bad |= ((vals >= hi) if e.strict else (vals > hi)).to_numpy()
+            return bad
+        if e.kind == "in_set":
+            return (~col.isin(e.values) & col.notna()).to_numpy()
+        if e.kind == "not_future":
+            # compared as dates, like CAST(c AS DATE) > current_date in the SQL engine: a time
+            # earlier today is not in the future
+            ts = pd.to_datetime(col, errors="coerce")
+            return (ts.dt.normalize() > pd.Timestamp(date.today())).to_numpy()
+        raise ValueError(f"Unknown expectation kind: {e.kind}")
+
+    def update(self, df: pd.DataFrame) -> "Validator":
+        for e in self.expectations:
+            bad = self._mask(e, df)
+            n = int(bad.sum())
+            self.failed[e] = self.failed.get(e, 0) + n
+            sample = self.samples.setdefault(e, [])
+            if n and len(sample) < self.sample_rows:
+                idx = np.flatnonzero(bad)[: self.sample_rows - len(sample)]
+                rows = df.iloc[idx][list(e.columns)].astype(object)
+                for offset, rec in zip(idx, rows.to_dict("records")):
+                    sample.append({"_row": self.rows + int(offset), **rec})
+        self.rows += len(df)
+        return self
+
+    @property
+    def success(self) -> bool:
+        return not any(self.failed.values())
+
+    def report(self) -> dict:
+        return {
+            "success": self.success,
+            "rows": self.rows,
+            "results": [
+                {"expectation": e.name, "failed": self.failed.get(e, 0), "sample": self.samples.get(e, [])}
+                for e in self.expectations
+            ],
+        }
+
+    def raise_for_failures(self):
+        """One ValueError listing every failing expectation (not just the first)."""
+        if self.success:
+            return
+        lines = [f"{r['expectation']}: {r['failed']} of {self.rows} rows, e.g. {r['sample'][:3]}"
+                 for r in self.report()["results"] if r["failed"]]
+        raise ValueError("Data quality checks failed:\n" + "\n".join(lines))
+
+def validate(df: pd.DataFrame, expectations: list[Expectation]) -> dict:
+    return Validator(expectations).update(df).report()
+
+# ---- the same expectations as one DuckDB aggregate query
+
+def _q(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+def _lit(v) -> str:
+    if isinstance(v, date):
+        return f"DATE '{v.isoformat()}'"
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    return repr(v)
+
+def sql_condition(e: Expectation) -> str:
+    """WHERE-condition selecting the rows that violate e (not used for unique)."""
+    c = _q(e.columns[0])
+    if e.kind == "non_null":
+        return " OR ".join(f"{_q(x)} IS NULL" for x in e.columns)
+    if e.kind == "between":
+        parts = []
+        if e.min is not None:
+            parts.append(f"{c} {'<=' if e.strict else '<'} {_lit(e.min)}")
+        if e.max is not None:
+            parts.append(f"{c} {'>=' if e.strict else '>'} {_lit(e.max)}")
+        return " OR ".join(parts) or "FALSE"
+    if e.kind == "in_set":
+        return f"{c} IS NOT NULL AND {c} NOT IN ({', '.join(_lit(v) for v in e.values)})"
+    if e.kind == "not_future":
+        return f"CAST({c} AS DATE) > current_date"
+    raise ValueError(f"No SQL condition for: {e.kind}")
+
+def sql_failed_count(e: Expectation) -> str:
+    if e.kind == "unique":
+        # duplicates beyond the first occurrence; row(...) keeps NULL keys countable
+        return f"COUNT(*) - COUNT(DISTINCT row({', '.join(_q(x) for x in e.columns)}))"
+    return f"COUNT(*) FILTER (WHERE {sql_condition(e)})"
+
+def compile_sql(expectations: list[Expectation], relation: str) -> str:
+    """One aggregate SELECT returning row count + failed count per expectation."""
+    aggs = ",\n       ".join(["COUNT(*)"] + [sql_failed_count(e) for e in expectations])
+    return f"SELECT {aggs}\nFROM {relation}"
+
+def validate_duckdb(con, relation: str, expectations: list[Expectation],
+                    sample_rows: int = SAMPLE_ROWS) -> dict:
+    """Run the expectations inside DuckDB; only counts (and a few samples of failures) come back."""
+    rows, *failed = con.execute(compile_sql(expectations, relation)).fetchone()
+    results = []
+    for e, n in zip(expectations, failed):
+        sample = []
+        if n and sample_rows:
+            cols = ", ".join(_q(x) for x in e.columns)
+            if e.kind == "unique":
+                sql = f"SELECT {cols}, COUNT(*) AS n FROM {relation} GROUP BY ALL HAVING COUNT(*) > 1 LIMIT {sample_rows}"
+            else:
+                sql = f"SELECT {cols} FROM {relation} WHERE {sql_condition(e)} LIMIT {sample_rows}"
+            cur = con.execute(sql)
+            names = [d[0] for d in cur.description]
+            sample = [dict(zip(names, r)) for r in cur.fetchall()]
+        results.append({"expectation": e.name, "failed": int(n), "sample": sample})
+    return {"success": not any(r["failed"] for r in results), "rows": int(rows), "results": results}
+
 def expect_non_null(df: pd.DataFrame, cols: list[str]):
-    for c in cols:
-        if df[c].isna().any():
-            raise ValueError(f"Nulls found in required column: {c}")
+    Validator([non_null(c) for c in cols]).update(df).raise_for_failures()
 
 def expect_unique(df: pd.DataFrame, cols: list[str]):
-    if df.duplicated(subset=cols).any():
-        raise ValueError(f"Duplicates found on key: {cols}")
+    Validator([unique(*cols)]).update(df).raise_for_failures()
@@ -0,0 +1,251 @@
+"""Keyed, batched loads into the DuckDB warehouse of 06/07 (fact_transactions, dim_currency).
+
+    with load_batch(con, source=str(csv_path)) as b:
+        upsert_dim_currency(con, "SELECT symbol, rate_to_eur FROM ...")
+        merge_facts(con, b, tx_eur_query(con, csv_path))
+
+Every fact row has a tx_key: md5 of the declared natural key columns or, when the source has
+none (the default), md5 of the source name and the whole source row, + (n - 1) for the n-th of
+identical rows, so two equal transactions stay two rows and reloading the same file changes
+nothing. Hashed columns are cast to fixed types first (amount DECIMAL(18,4), date DATE, ...), so
+the key does not depend on how a parser typed them ("100" vs "100.0", pandas vs DuckDB path).
+
+A batch runs in one transaction: the source is staged into a temp table with its keys, the
+current version of every row it would change is copied to fact_undo, and the stage is merged
+with INSERT ... ON CONFLICT (tx_key) DO UPDATE (index lookups; unchanged rows are not
+rewritten). Readers see the table before or after the batch, never an empty one. Each row
+carries batch_id / loaded_at of the batch that last wrote it; load_batches records every batch
+(running / committed / failed / rolled_back) and rollback_batch() undoes the latest one.
+A batch is the whole of its source: rows of the same source missing from it (deleted, or edited
+without a natural key, which gives them a new key) are deleted in the same transaction.
+"""
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import Iterator
+
+import duckdb
+
+from utils.schema import Column, Schema
+
+# columns of transactions.csv; without a natural key the row hash covers all of them
+SOURCE_COLUMNS = ("user_id", "amount", "currency", "date")
+# canonical types of hashed columns (anything else is hashed as VARCHAR)
+KEY_TYPES = {"user_id": "BIGINT", "amount": "DECIMAL(18,4)", "date": "DATE"}
+# declared parse types (utils.schema)
+TX_SCHEMA = Schema("transactions", (
+    Column("user_id", "int64"),
+    Column("amount", "float64"),
+    Column("currency", "string"),
+    Column("date", "date"),
+), extra="drop")
+# committed batches whose pre-images are kept in fact_undo, i.e. how far back rollback reaches
+UNDO_BATCHES = 3
+
+def create_tables(con: duckdb.DuckDBPyConnection):
+    legacy = con.execute("""
+        SELECT COUNT(*) FROM information_schema.tables t
+        WHERE t.table_name = 'fact_transactions' AND (
+            SELECT COUNT(*) FROM information_schema.columns c
+            WHERE c.table_name = 'fact_transactions' AND c.column_name IN ('tx_key', 'source')) < 2
+    """).fetchone()[0]
+    if legacy:
+        # written by the old DELETE + full reload (no keys) or keyed by the untyped row text (no
+        # source): the load that follows rebuilds it; the undo log of those keys is useless
+        con.execute("DROP TABLE fact_transactions;")
+        con.execute("DROP TABLE IF EXISTS fact_undo;")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS dim_currency (
+        symbol TEXT PRIMARY KEY,
+        rate_to_eur DOUBLE
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS fact_transactions (
+        tx_key UHUGEINT PRIMARY KEY,
+        user_id INTEGER,
+        amount_eur DOUBLE,
+        date DATE,
+        source TEXT,
+        batch_id BIGINT,
+        loaded_at TIMESTAMP DEFAULT current_timestamp
+    );
+    """)
+    con.execute("CREATE SEQUENCE IF NOT EXISTS load_batch_seq;")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS load_batches (
+        batch_id BIGINT PRIMARY KEY,
+        source TEXT,
+        status TEXT,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        staged BIGINT,
+        inserted BIGINT,
+        updated BIGINT,
+        undo BOOLEAN
+    );
+    """)
+    con.execute("ALTER TABLE load_batches ADD COLUMN IF NOT EXISTS deleted BIGINT;")
+    if legacy:
+        con.execute("UPDATE load_batches SET undo = false WHERE undo;")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS fact_undo (
+        batch_id BIGINT,
+        tx_key UHUGEINT,
+        user_id INTEGER,
+        amount_eur DOUBLE,
+        date DATE,
+        source TEXT,
+        prev_batch_id BIGINT
+    );
+    """)
+
+@dataclass
+class Batch:
+    batch_id: int
+    source: str
+    staged: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    @property
+    def unchanged(self) -> int:
+        return self.staged - self.inserted - self.updated
+
+@contextmanager
+def load_batch(con: duckdb.DuckDBPyConnection, source: str) -> Iterator[Batch]:
+    """One batch = one transaction; the load_batches row survives a failure as status='failed'."""
+    batch_id = con.execute("SELECT nextval('load_batch_seq')").fetchone()[0]
+    con.execute("INSERT INTO load_batches (batch_id, source, status, started_at) VALUES (?, ?, 'running', now());",
+                [batch_id, source])
+    b = Batch(batch_id, source)
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        yield b
+        con.execute("""
+            UPDATE load_batches SET status = 'committed', finished_at = now(),
+                   staged = ?, inserted = ?, updated = ?, deleted = ?, undo = true
+            WHERE batch_id = ?;
+        """, [b.staged, b.inserted, b.updated, b.deleted, batch_id])
+        _prune_undo(con)
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        con.execute("UPDATE load_batches SET status = 'failed', finished_at = now() WHERE batch_id = ?;", [batch_id])
+        raise
+
+def _prune_undo(con: duckdb.DuckDBPyConnection, keep: int = UNDO_BATCHES):
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE undo_keep AS
+        SELECT batch_id FROM load_batches WHERE status = 'committed' AND undo
+        ORDER BY batch_id DESC LIMIT ?;
+    """, [keep])
+    con.execute("DELETE FROM fact_undo WHERE batch_id NOT IN (SELECT batch_id FROM undo_keep);")
+    con.execute("UPDATE load_batches SET undo = false WHERE undo AND batch_id NOT IN (SELECT batch_id FROM undo_keep);")
+
+def upsert_dim_currency(con: duckdb.DuckDBPyConnection, query: str) -> int:
+    """(symbol, rate_to_eur) rows from query, updated in place; symbols absent from query are kept."""
+    return con.execute(f"""
+        INSERT INTO dim_currency (symbol, rate_to_eur)
+        SELECT * FROM ({query})
+        ON CONFLICT (symbol) DO UPDATE SET rate_to_eur = excluded.rate_to_eur;
+    """).fetchone()[0]
+
+def _lit(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+def _key_expr(columns: tuple[str, ...] | list[str], source: str | None = None) -> str:
+    parts = [f"CAST(CAST({c} AS {KEY_TYPES[c]}) AS VARCHAR)" if c in KEY_TYPES else f"CAST({c} AS VARCHAR)"
+             for c in columns]
+    if source is not None:
+        parts.insert(0, _lit(source))
+    return f"md5_number(concat_ws('|', {', '.join(parts)}))"
+
+def _changed(old: str, new: str) -> str:
+    return " OR ".join(f"{old}.{c} IS DISTINCT FROM {new}.{c}" for c in ("user_id", "amount_eur", "date", "source"))
+
+def merge_facts(con: duckdb.DuckDBPyConnection, b: Batch, query: str,
+                key: list[str] | None = None) -> Batch:
+    """Merge query (user_id, amount_eur, date + key / SOURCE_COLUMNS) into fact_transactions.
+
+    key: natural key columns of the source; duplicates of a natural key within one batch are
+    an error (which version should win is not knowable here). Without one the row hash is
+    scoped to b.source. Rows of b.source the batch does not contain are deleted.
+    """
+    columns = tuple(key) if key else SOURCE_COLUMNS
+    # without a natural key, the n-th of several identical rows gets row hash + (n - 1)
+    tx_key = "h" if key else "h + CAST(row_number() OVER (PARTITION BY h) - 1 AS UHUGEINT)"
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE stage_facts AS
+        SELECT {tx_key} AS tx_key, user_id, amount_eur, date, {_lit(b.source)} AS source
+        FROM (SELECT {_key_expr(columns, None if key else b.source)} AS h,
+                     CAST(user_id AS INTEGER) AS user_id, amount_eur, CAST(date AS DATE) AS date
+              FROM ({query}));
+    """)
+    b.staged, distinct = con.execute("SELECT COUNT(*), COUNT(DISTINCT tx_key) FROM stage_facts").fetchone()
+    if distinct != b.staged:
+        raise ValueError(f"Duplicate natural keys {list(columns)} in batch: {b.staged - distinct} row(s)")
+
+    # pre-images for rollback_batch(): only rows this batch actually changes or deletes
+    b.updated = con.execute(f"""
+        INSERT INTO fact_undo
+        SELECT ?, f.tx_key, f.user_id, f.amount_eur, f.date, f.source, f.batch_id
+        FROM fact_transactions f JOIN stage_facts s USING (tx_key)
+        WHERE {_changed('f', 's')};
+    """, [b.batch_id]).fetchone()[0]
+    absent = "f.source = ? AND NOT EXISTS (SELECT 1 FROM stage_facts s WHERE s.tx_key = f.tx_key)"
+    b.deleted = con.execute(f"""
+        INSERT INTO fact_undo
+        SELECT ?, f.tx_key, f.user_id, f.amount_eur, f.date, f.source, f.batch_id
+        FROM fact_transactions f WHERE {absent};
+    """, [b.batch_id, b.source]).fetchone()[0]
+    if b.deleted:
+        con.execute(f"DELETE FROM fact_transactions f WHERE {absent};", [b.source])
+
+    before = con.execute("SELECT COUNT(*) FROM fact_transactions").fetchone()[0]
+    con.execute(f"""
+        INSERT INTO fact_transactions (tx_key, user_id, amount_eur, date, source, batch_id, loaded_at)
+        SELECT tx_key, user_id, amount_eur, date, source, ?, current_timestamp FROM stage_facts
+        ON CONFLICT (tx_key) DO UPDATE SET
+            user_id = excluded.user_id, amount_eur = excluded.amount_eur, date = excluded.date,
+            source = excluded.source, batch_id = excluded.batch_id, loaded_at = excluded.loaded_at
+        WHERE {_changed('fact_transactions', 'excluded')};
+    """, [b.batch_id])
+    b.inserted = con.execute("SELECT COUNT(*) FROM fact_transactions").fetchone()[0] - before
+    con.execute("DROP TABLE stage_facts;")
+    return b
+
+def rollback_batch(con: duckdb.DuckDBPyConnection, batch_id: int | None = None) -> int:
+    """Undo the latest committed batch (batch_id=None: whichever that is); returns its batch_id.
+
+    Rows it inserted are deleted, rows it updated or deleted get their previous values back (with a new
+    loaded_at, so 08's incremental rollups recompute them). Older batches are rolled back one
+    by one, newest first, as far as UNDO_BATCHES reaches. dim_currency is not restored.
+    """
+    latest = con.execute(
+        "SELECT batch_id, undo FROM load_batches WHERE status = 'committed' ORDER BY batch_id DESC LIMIT 1"
+    ).fetchone()
+    if latest is None:
+        raise ValueError("No committed batch to roll back")
+    if batch_id is not None and batch_id != latest[0]:
+        raise ValueError(f"Batch {batch_id} is not the latest committed one ({latest[0]}); roll back newer batches first")
+    if not latest[1]:
+        raise ValueError(f"Batch {latest[0]} is older than the undo log (UNDO_BATCHES={UNDO_BATCHES})")
+    batch_id = latest[0]
+
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        con.execute("DELETE FROM fact_transactions WHERE batch_id = ?;", [batch_id])
+        con.execute("""
+            INSERT INTO fact_transactions (tx_key, user_id, amount_eur, date, source, batch_id, loaded_at)
+            SELECT tx_key, user_id, amount_eur, date, source, prev_batch_id, current_timestamp
+            FROM fact_undo WHERE batch_id = ?;
+        """, [batch_id])
+        con.execute("DELETE FROM fact_undo WHERE batch_id = ?;", [batch_id])
+        con.execute("UPDATE load_batches SET status = 'rolled_back', undo = false, finished_at = now() "
+                    "WHERE batch_id = ?;", [batch_id])
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    return batch_id
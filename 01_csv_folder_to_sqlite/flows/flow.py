@@ -3,67 +3,118 @@ import pandas as pd
 from prefect import flow, task, get_run_logger
 from dotenv import dotenv_values
 from pydantic import BaseModel
-from datetime import datetime
+from itertools import groupby
 
-from pathlib import Path
 import sys
 ROOT = Path(__file__).resolve().parents[2]  # repo root
 sys.path.append(str(ROOT / "00_common"))
-from utils.io import read_csv_folder, write_parquet, to_sqlite  # noqa
-from utils.validate import expect_non_null, expect_unique  # noqa
+from utils.io import iter_csv_file_chunks, to_sqlite, sqlite_path, delete_where, truncate_table, create_index  # noqa
+from utils.manifest import load_manifest, save_manifest, changed_files  # noqa
+from utils.validate import Validator, non_null, unique  # noqa
+from utils.metrics import pipeline, staged  # noqa
+from utils.arrow_results import ARROW_TASK, ARROW_SINK_TASK, prune_results  # noqa
+from utils.dtypes import compact, is_date  # noqa
+from utils.schema import Column, InferenceCache, Schema, check_headers  # noqa
+from utils.snapshots import SnapshotStore  # noqa
 
 class Config(BaseModel):
     raw_folder: Path
     processed_folder: Path
     db_url: str
     table: str = "sales"
+    chunk_rows: int | None = None  # None -> derived from memory_budget_mb
+    memory_budget_mb: float = 256
+    workers: int = 1  # >1 -> parse files in a process pool (e.g. os.cpu_count())
+    full_refresh: bool = False
+    keep_snapshots: int = 10  # silver retention: manifests kept, chunks only they reference
+    key: list[str] = ["order_id", "product_id", "order_date"]  # upsert key in the target table
+
+    @property
+    def manifest_path(self) -> Path:
+        # processed-files manifest lives next to the SQLite DB
+        db = sqlite_path(self.db_url)
+        return db.with_name(f"{db.stem}.manifest.json")
+
+# declared source schema: the pyarrow parser gets explicit types (no inference, no second
+# to_numeric / to_datetime pass); columns outside it are typed once on the first run and the
+# result is cached in raw_folder/.cache/. Fixed widths, so every silver part file has the same
+# schema; a value that does not fit raises instead of wrapping (widen the column then)
+SALES_SCHEMA = Schema("sales", (
+    Column("order_id", "int32"),
+    Column("product_id", "int32"),
+    Column("order_date", "date"),
+    Column("quantity", "int32"),
+    Column("price", "float64"),
+))
+# compact dtypes right after extract (source_file is added by the flow)
+SALES_DTYPES = {**SALES_SCHEMA.dtypes(), "source_file": "category"}
 
 @task(retries=2, retry_delay_seconds=5)
-def extract(cfg: Config) -> pd.DataFrame:
-    df = read_csv_folder(cfg.raw_folder)
-    return df
+@staged("extract", rows_out=lambda r: len(r[0]))  # changed files
+def extract(cfg: Config) -> tuple[dict, dict]:
+    # only fingerprint the inputs here; rows are streamed chunk by chunk in the flow
+    files = sorted(cfg.raw_folder.glob("*.csv"))
+    manifest = {} if cfg.full_refresh else load_manifest(cfg.manifest_path)
+    return changed_files(files, manifest)
+
+def sales_expectations(columns) -> list:
+    key_cols = [c for c in ("order_id", "product_id") if c in columns]
+    if not key_cols:
+        return []
+    return [non_null(*key_cols), unique(*key_cols, *(["order_date"] if "order_date" in columns else []))]
 
-@task
+# chunk tasks: persisted results (opt-in, see utils.arrow_results) are Arrow IPC files (memory-mapped on load) instead of pickles,
+# DataFrame arguments are keyed by a hash of their buffers, not pickled; load is never cached
+@task(**ARROW_TASK)
+@staged("transform")
 def transform(df: pd.DataFrame) -> pd.DataFrame:
     # example transforms — tweak for your dataset
     # standardize columns
     cols = {c: c.strip().lower() for c in df.columns}
     df = df.rename(columns=cols)
 
-    # parse dates
-    if "order_date" in df.columns:
+    # parse dates (already date32 when the chunk went through compact())
+    if "order_date" in df.columns and not is_date(df["order_date"]):
         df["order_date"] = pd.to_datetime(df["order_date"], errors="coerce")
 
-    # enforce dtypes
+    # enforce dtypes (already numeric when parsed with SALES_SCHEMA: only NULL -> 0 is left)
     for col in ("quantity", "price"):
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+            s = df[col] if pd.api.types.is_numeric_dtype(df[col]) else pd.to_numeric(df[col], errors="coerce")
+            df[col] = s.fillna(0)
 
     # derived metrics
     if {"quantity", "price"}.issubset(df.columns):
         df["revenue"] = df["quantity"] * df["price"]
 
-    # data quality
-    key_cols = [c for c in ("order_id", "product_id") if c in df.columns]
-    if key_cols:
-        expect_non_null(df, key_cols)
-        expect_unique(df, key_cols + (["order_date"] if "order_date" in df.columns else []))
+    # data quality: all rules in one vectorized pass, every failure reported at once
+    Validator(sales_expectations(df.columns)).update(df).raise_for_failures()
 
     return df
 
-@task
-def load(df: pd.DataFrame, cfg: Config):
-    # write silver parquet snapshot for lineage
-    snapshot = cfg.processed_folder / f"silver_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.parquet"
-    write_parquet(df, snapshot)
-    # upsert-ish (simple demo): replace table and reload (idempotent for small demo)
-    to_sqlite(df, cfg.db_url, cfg.table, if_exists="replace")
+@task(**ARROW_SINK_TASK)
+@staged("load")
+def load(df: pd.DataFrame, cfg: Config, store: SnapshotStore, if_exists: str = "append") -> dict:
+    # silver copy for lineage: the chunk is stored once under its content hash (a rerun of the
+    # same rows writes nothing) and registered in the catalog; the run's manifest points to it
+    ref = store.put(df)
+    key = cfg.key if set(cfg.key).issubset(df.columns) else None
+    # a key already loaded from another file fails the load: the upsert must not move it there
+    # (the per-file refresh deletes by source_file, so the other file would lose it later)
+    to_sqlite(df, cfg.db_url, cfg.table, if_exists=if_exists, key=key, owner="source_file" if key else None)
+    return ref
 
 @flow(name="csv-folder-to-sqlite")
+@pipeline("01_csv_folder_to_sqlite")
 def etl_csv_to_sqlite(
     raw_folder="01_csv_folder_to_sqlite/data_raw",
     processed_folder="01_csv_folder_to_sqlite/data_processed",
-    table="sales"
+    table="sales",
+    chunk_rows: int | None = None,
+    memory_budget_mb: float = 256,
+    workers: int = 1,
+    full_refresh: bool = False,
+    keep_snapshots: int = 10,
 ):
     env = dotenv_values(ROOT / "00_common" / ".env")
     db_url = env.get("DATABASE_URL", "sqlite:///01_csv_folder_to_sqlite/db/etl_demo.sqlite")
@@ -73,16 +124,86 @@ def etl_csv_to_sqlite(
         processed_folder=Path(processed_folder),
         db_url=db_url,
         table=table,
+        chunk_rows=chunk_rows,
+        memory_budget_mb=memory_budget_mb,
+        workers=workers,
+        full_refresh=full_refresh,
+        keep_snapshots=keep_snapshots,
     )
+    # no manifest yet (first run / legacy table without source_file) -> rebuild
+    store = SnapshotStore(cfg.processed_folder, cfg.table)
+    if not cfg.manifest_path.exists() or not store.snapshots():
+        # (no silver snapshot yet: the first one must hold every file, not only the changed ones)
+        cfg.full_refresh = True
     logger = get_run_logger()
     logger.info(f"Starting ETL with db={cfg.db_url}")
-    df_raw = extract.submit(cfg).result()
-    if df_raw.empty:
-        logger.warning("No CSV files found. Nothing to process.")
+    changed, touched = extract.submit(cfg).result()
+    # header lines only: a file without a required column fails the run before any parse or delete
+    cache = InferenceCache(cfg.raw_folder, SALES_SCHEMA.name)
+    for drift in check_headers([Path(k) for k in changed], SALES_SCHEMA, cache):
+        logger.warning(f"Schema drift: {drift}")
+    manifest = {} if cfg.full_refresh else load_manifest(cfg.manifest_path)
+    current = {f.as_posix() for f in cfg.raw_folder.glob("*.csv")}
+    removed = [k for k in manifest if k not in current]
+    manifest.update(touched)
+    if not changed and not removed:
+        save_manifest(manifest, cfg.manifest_path)
+        logger.warning("No new or changed CSV files. Nothing to process.")
         return
-    df_t = transform.submit(df_raw).result()
-    load.submit(df_t, cfg)
-    logger.info(f"Done. Rows loaded: {len(df_t)}")
+    if cfg.full_refresh:
+        # a crash mid-rebuild must not leave entries for files that were never reloaded; old rows
+        # go up front, not only with the first chunk (changed files may all be header-only)
+        cfg.manifest_path.unlink(missing_ok=True)
+        truncate_table(cfg.db_url, cfg.table)
+
+    # stream extract -> transform -> load per file so memory stays flat regardless of folder size;
+    # only new/changed files are read, and a changed file's old rows are replaced by source_file
+    # the run's snapshot starts as a copy of the previous one and each loaded file replaces its entry
+    snapshot = store.begin(full=cfg.full_refresh)
+    # files deleted from raw_folder: their rows, manifest entry and snapshot source go before any load
+    for key in removed:
+        delete_where(cfg.db_url, cfg.table, "source_file", key)
+        snapshot.drop_source(key)
+        manifest.pop(key)
+        save_manifest(manifest, cfg.manifest_path)
+    rows, chunk_no = 0, 0
+    run_dq = None  # key uniqueness across all chunks of this run (transform only sees one chunk)
+    chunks = iter_csv_file_chunks([Path(k) for k in changed], cfg.chunk_rows, cfg.memory_budget_mb, cfg.workers,
+                                  schema=SALES_SCHEMA, cache=cache)
+    for path, file_chunks in groupby(chunks, key=lambda fc: fc[0]):
+        key = path.as_posix()
+        fp = changed[key]
+        if not cfg.full_refresh:
+            delete_where(cfg.db_url, cfg.table, "source_file", key)
+        refs = []
+        for _, df_raw in file_chunks:
+            df_raw["source_file"] = key
+            df_raw = compact(df_raw, SALES_DTYPES)
+            df_t = transform.submit(df_raw).result()
+            if run_dq is None:
+                run_dq = Validator([e for e in sales_expectations(df_t.columns) if e.kind == "unique"])
+            run_dq.update(df_t).raise_for_failures()
+            if_exists = "replace" if cfg.full_refresh and chunk_no == 0 else "append"
+            refs.append(load.submit(df_t, cfg, store, if_exists).result())
+            rows += len(df_t)
+            chunk_no += 1
+        # commit the file to the snapshot and the manifest only once all its rows are in
+        snapshot.set_source(key, fp, refs)
+        manifest[key] = fp
+        save_manifest(manifest, cfg.manifest_path)
+    # header-only files yield no chunks: still drop their old rows and record them
+    for key in [k for k, fp in changed.items() if manifest.get(k) != fp]:
+        if not cfg.full_refresh:
+            delete_where(cfg.db_url, cfg.table, "source_file", key)
+        snapshot.set_source(key, changed[key], [])
+        manifest[key] = changed[key]
+        save_manifest(manifest, cfg.manifest_path)
+    create_index(cfg.db_url, cfg.table, ["source_file"])
+    gc = store.gc(keep_last=cfg.keep_snapshots)
+    prune_results()  # persisted task results (PREFECT_RESULTS_PERSIST_BY_DEFAULT): bounded by age / size
+    logger.info(f"Done. Files loaded: {len(changed)}, removed: {len(removed)}. Rows loaded: {rows}. "
+                f"Snapshot: {snapshot.id} ({snapshot.rows} rows); "
+                f"removed {gc['snapshots']} old snapshots, {gc['chunks']} chunks")
 
 if __name__ == "__main__":
     etl_csv_to_sqlite()
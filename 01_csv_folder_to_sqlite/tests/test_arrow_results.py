@@ -0,0 +1,20 @@
+import pandas as pd
+import pyarrow as pa
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.arrow_results import fingerprint
+
+def _dict_table(values: list[str], nested: bool = False) -> pa.Table:
+    arr = pa.array(values).dictionary_encode()
+    if nested:
+        arr = pa.StructArray.from_arrays([pa.ListArray.from_arrays([0, 1, 2], arr)], ["c"])
+    return pa.table({"c": arr})
+
+def test_fingerprint_covers_dictionary_values():
+    # same indices [0, 1], different dictionaries
+    a = pd.DataFrame({"c": pd.Categorical(["GBP", "USD"])})
+    b = pd.DataFrame({"c": pd.Categorical(["EUR", "UAH"])})
+    assert fingerprint(pa.Table.from_pandas(a)) != fingerprint(pa.Table.from_pandas(b))
+    assert fingerprint(a) != fingerprint(b)
+    assert fingerprint(_dict_table(["GBP", "USD"], nested=True)) != fingerprint(_dict_table(["EUR", "UAH"], nested=True))
+    assert fingerprint(_dict_table(["GBP", "USD"])) == fingerprint(_dict_table(["GBP", "USD"]))
@@ -0,0 +1,109 @@
+from pathlib import Path
+import pandas as pd
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.io import iter_csv_file_chunks, read_csv_folder
+
+def test_chunks_have_fixed_size_and_never_span_files(tmp_path: Path):
+    pd.DataFrame({"order_id": [1, 2, 3]}).to_csv(tmp_path / "a.csv", index=False)
+    pd.DataFrame({"order_id": [4, 5, 6, 7]}).to_csv(tmp_path / "b.csv", index=False)
+
+    chunks = list(iter_csv_file_chunks([tmp_path / "a.csv", tmp_path / "b.csv"], chunk_rows=2))
+    assert [(f.name, len(c)) for f, c in chunks] == [("a.csv", 2), ("a.csv", 1), ("b.csv", 2), ("b.csv", 2)]
+    assert list(pd.concat(c for _, c in chunks)["order_id"]) == [1, 2, 3, 4, 5, 6, 7]
+
+def test_parallel_read_keeps_file_order(tmp_path: Path):
+    for i in range(5):
+        pd.DataFrame({"order_id": [i * 10, i * 10 + 1]}).to_csv(tmp_path / f"sales_{i}.csv", index=False)
+
+    out = read_csv_folder(tmp_path, workers=3)
+    assert list(out["order_id"]) == list(read_csv_folder(tmp_path)["order_id"])
+
+def test_validator_catches_duplicates_across_chunks():
+    from utils.validate import Validator, unique
+
+    dq = Validator([unique("order_id")])
+    dq.update(pd.DataFrame({"order_id": [1, 2]})).update(pd.DataFrame({"order_id": [3, 1]}))
+    assert dq.report()["results"][0]["failed"] == 1
+    assert dq.report()["results"][0]["sample"] == [{"_row": 3, "order_id": 1}]
+
+def test_not_future_compares_dates_like_the_sql_engine():
+    from datetime import datetime, timedelta
+    import duckdb
+    from utils.validate import Validator, not_future, validate_duckdb
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    df = pd.DataFrame({"ts": [today, today + timedelta(hours=23, minutes=59), today + timedelta(days=1)]})
+    pandas_failed = Validator([not_future("ts")]).update(df).report()["results"][0]["failed"]
+    con = duckdb.connect()
+    con.register("df", df)
+    assert pandas_failed == validate_duckdb(con, "df", [not_future("ts")])["results"][0]["failed"] == 1
+
+def test_schema_typed_chunks_and_header_drift(tmp_path: Path):
+    import pytest
+    from flows.flow import SALES_SCHEMA
+    from utils.io import iter_csv_file_chunks
+    from utils.schema import InferenceCache, SchemaDriftError, check_headers
+
+    (tmp_path / "a.csv").write_text("Order_ID,product_id,order_date,quantity,price,note\n"
+                                    "1,10,2024-01-05,,2.5,x\n2,11,2024-01-06,3,1.0,y\n")
+    (tmp_path / "b.csv").write_text("order_id,order_date,quantity,price\n3,2024-01-07,1,1.0\n")
+    cache = InferenceCache(tmp_path, SALES_SCHEMA.name)
+
+    [(_, df)] = list(iter_csv_file_chunks([tmp_path / "a.csv"], chunk_rows=10, schema=SALES_SCHEMA, cache=cache))
+    assert list(df.columns) == ["order_id", "product_id", "order_date", "quantity", "price", "note"]
+    assert str(df["order_id"].dtype) == "int32" and str(df["order_date"].dtype) == "date32[day][pyarrow]"
+    assert cache.get(["Order_ID", "product_id", "order_date", "quantity", "price", "note"]) == {"note": "string"}
+    with pytest.raises(SchemaDriftError, match=r"b\.csv: required columns \['product_id'\]"):
+        check_headers([tmp_path / "a.csv", tmp_path / "b.csv"], SALES_SCHEMA, cache)
+
+def test_silver_snapshots_dedupe_time_travel_and_gc(tmp_path: Path):
+    from utils.snapshots import SnapshotStore
+
+    store = SnapshotStore(tmp_path, "sales")
+    a, b = pd.DataFrame({"order_id": [1, 2]}), pd.DataFrame({"order_id": [3]})
+    first = store.begin(full=True)
+    first.set_source("a.csv", {"sha256": "1"}, [store.put(a)])
+    first.set_source("b.csv", {"sha256": "2"}, [store.put(b)])
+    chunks = set(tmp_path.rglob("*.parquet"))
+
+    # rerun of unchanged rows: same chunk, only the manifest is written
+    store.begin().set_source("a.csv", {"sha256": "1"}, [store.put(a.copy())])
+    assert set(tmp_path.rglob("*.parquet")) == chunks
+    store.begin().set_source("b.csv", {"sha256": "3"}, [store.put(pd.DataFrame({"order_id": [3, 4]}))])
+
+    assert len(store.snapshots()) == 3
+    assert list(store.read(first.id)["order_id"]) == [1, 2, 3]
+    assert list(store.read()["order_id"]) == [1, 2, 3, 4]
+    assert store.load().sources["a.csv"]["loaded_in"] == store.snapshots()[1]  # lineage
+    gc = store.gc(keep_last=1, grace_seconds=0)
+    assert (gc["snapshots"], gc["chunks"]) == (2, 1)
+    assert not store.chunk_path(first.sources["b.csv"]["chunks"][0]["hash"]).exists()
+    assert list(store.read()["order_id"]) == [1, 2, 3, 4]
+
+def test_load_sqlite_upserts_on_key(tmp_path: Path):
+    import sqlite3
+    from utils.dtypes import compact
+    from utils.sqlite_bulk import load_sqlite, sqlite_url
+
+    url = sqlite_url(tmp_path / "t.sqlite")
+    df = pd.DataFrame({"order_id": [1, 2], "order_date": ["2024-01-05", "2024-01-06"], "quantity": [1, 2]})
+    key = ["order_id", "order_date"]
+    load_sqlite(compact(df, {"order_date": "date"}), url, "sales", key=key)
+    upd = pd.DataFrame({"order_id": [2, 3], "order_date": ["2024-01-06", "2024-01-07"], "quantity": [5, 1]})
+    load_sqlite(compact(upd, {"order_date": "date"}), url, "sales", key=key)
+    load_sqlite(upd[key], url, "sales_keys", key=key)
+    load_sqlite(upd[key], url, "sales_keys", key=key)  # no non-key columns: DO NOTHING
+
+    with sqlite3.connect(tmp_path / "t.sqlite") as con:
+        assert con.execute("SELECT order_id, order_date, quantity FROM sales ORDER BY order_id").fetchall() == [
+            (1, "2024-01-05 00:00:00", 1), (2, "2024-01-06 00:00:00", 5), (3, "2024-01-07 00:00:00", 1)]
+        assert con.execute("SELECT COUNT(*) FROM sales_keys").fetchone()[0] == 2
+
+def test_to_sqlite_rejects_upsert_for_other_targets():
+    import pytest
+    from utils.io import to_sqlite
+
+    df = pd.DataFrame({"order_id": [1], "quantity": [2]})
+    with pytest.raises(ValueError, match=r"sqlite:// targets only, got postgresql\+psycopg://"):
+        to_sqlite(df, "postgresql+psycopg://etl@localhost/etl", "sales", key=["order_id"])
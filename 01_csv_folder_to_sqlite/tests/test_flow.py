@@ -0,0 +1,59 @@
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+import flows.flow as flow
+
+@pytest.fixture
+def run(tmp_path: Path, monkeypatch):
+    raw, db = tmp_path / "raw", tmp_path / "etl.sqlite"
+    raw.mkdir()
+    monkeypatch.setattr(flow, "dotenv_values", lambda *a, **k: {"DATABASE_URL": f"sqlite:///{db.as_posix()}"})
+
+    def _run(**kw) -> list[tuple]:
+        flow.etl_csv_to_sqlite(raw_folder=str(raw), processed_folder=str(tmp_path / "processed"), **kw)
+        with sqlite3.connect(db) as con:
+            return con.execute("SELECT source_file, order_id, quantity FROM sales ORDER BY order_id").fetchall()
+    _run.raw = raw
+    return _run
+
+HEADER = "order_id,product_id,order_date,quantity,price\n"
+
+def test_full_refresh_clears_rows_when_changed_files_are_header_only(run):
+    (run.raw / "a.csv").write_text(HEADER + "1,10,2024-01-05,2,1.5\n")
+    assert len(run()) == 1
+    (run.raw / "a.csv").write_text(HEADER)
+    assert run(full_refresh=True) == []
+
+def test_changed_file_replaces_only_its_own_rows(run):
+    (run.raw / "a.csv").write_text(HEADER + "1,10,2024-01-05,2,1.5\n2,11,2024-01-06,1,2.0\n")
+    (run.raw / "b.csv").write_text(HEADER + "3,12,2024-01-07,5,1.0\n")
+    first = run()
+    b_rows = [r for r in first if r[0].endswith("b.csv")]
+
+    (run.raw / "a.csv").write_text(HEADER + "1,10,2024-01-05,7,1.5\n")
+    rows = run()
+    assert [r for r in rows if r[0].endswith("b.csv")] == b_rows
+    assert [r[1:] for r in rows if r[0].endswith("a.csv")] == [(1, 7)]
+
+def test_key_shared_across_files_fails_instead_of_moving_the_row(run):
+    (run.raw / "a.csv").write_text(HEADER + "1,10,2024-01-05,2,1.5\n")
+    run()
+    (run.raw / "b.csv").write_text(HEADER + "1,10,2024-01-05,9,1.5\n")
+    with pytest.raises(ValueError, match="already belong to another source_file"):
+        run()
+    (run.raw / "b.csv").write_text(HEADER + "2,10,2024-01-05,9,1.5\n")  # b.csv виправлено
+    assert [(Path(f).name, o, q) for f, o, q in run()] == [("a.csv", 1, 2), ("b.csv", 2, 9)]
+
+def test_removed_file_drops_its_rows_manifest_entry_and_snapshot_source(run):
+    (run.raw / "a.csv").write_text(HEADER + "1,10,2024-01-05,2,1.5\n")
+    (run.raw / "b.csv").write_text(HEADER + "5,12,2024-01-07,5,1.0\n")
+    assert len(run()) == 2
+    (run.raw / "b.csv").unlink()
+    assert [(Path(f).name, o) for f, o, _ in run()] == [("a.csv", 1)]
+    store = flow.SnapshotStore(run.raw.parent / "processed", "sales")
+    assert [Path(k).name for k in store.load().sources] == ["a.csv"]
+    assert store.read()["order_id"].tolist() == [1]
+    manifest = flow.load_manifest(run.raw.parent / "etl.manifest.json")
+    assert [Path(k).name for k in manifest] == ["a.csv"]
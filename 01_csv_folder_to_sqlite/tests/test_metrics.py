@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.metrics import pipeline, stage
+
+def test_records_go_to_the_default_file_and_rotate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ETL_METRICS_PATH", raising=False)
+    with pipeline("p") as run:
+        with stage("load", rows_in=3):
+            pass
+    assert [r["stage"] for r in run["records"]] == ["load", "total"]
+    path = tmp_path / ".metrics" / "metrics.jsonl"
+    assert [json.loads(line)["stage"] for line in path.read_text().splitlines()] == ["load", "total"]
+
+    monkeypatch.setenv("ETL_METRICS_MAX_MB", str(200 / 2**20))  # ~200 bytes: every record rotates
+    for _ in range(6):
+        with stage("s"):
+            pass
+    assert sorted(p.name for p in path.parent.glob("metrics.jsonl*")) == [
+        "metrics.jsonl", "metrics.jsonl.1", "metrics.jsonl.2", "metrics.jsonl.3"]
+
+def test_concurrent_runs_keep_their_own_records(tmp_path, monkeypatch):
+    monkeypatch.setenv("ETL_METRICS_PATH", str(tmp_path / "m.jsonl"))
+
+    def one(name):
+        with pipeline(name) as run:
+            for _ in range(50):
+                with stage("step"):
+                    pass
+        return run
+
+    with ThreadPoolExecutor(4) as pool:
+        runs = list(pool.map(one, ["a", "b", "c", "d"]))
+    for run in runs:
+        assert len(run["records"]) == 51
+        assert {(r["pipeline"], r["run_id"]) for r in run["records"]} == {(run["pipeline"], run["run_id"])}
+
+def test_nested_stage_does_not_reset_the_outer_peak(tmp_path, monkeypatch):
+    monkeypatch.setenv("ETL_METRICS_PATH", str(tmp_path / "m.jsonl"))
+    monkeypatch.setenv("ETL_TRACEMALLOC", "1")
+    with pipeline("p") as run:
+        with stage("outer"):
+            block = bytearray(32 * 2**20)
+            del block
+            with stage("inner"):
+                small = bytearray(2**20)
+                del small
+    peaks = {r["stage"]: r["py_peak_mb"] for r in run["records"]}
+    assert peaks["inner"] < 16 <= peaks["outer"] <= peaks["total"]
@@ -1,3 +1,4 @@
+import pytest
 import pandas as pd
 from flows.flow import transform
 
@@ -6,3 +7,16 @@ def test_transform_adds_revenue():
     out = transform.fn(df)  # call task function directly
     assert "revenue" in out.columns
     assert list(out["revenue"]) == [20.0, 15.0]
+
+def test_transform_reports_all_dq_failures_at_once():
+    df = pd.DataFrame({
+        "order_id": [1, 1, None],
+        "product_id": [10, 10, 11],
+        "order_date": ["2024-01-01", "2024-01-01", "2024-01-02"],
+        "quantity": [1, 1, 1],
+        "price": [1.0, 1.0, 1.0],
+    })
+    with pytest.raises(ValueError) as err:
+        transform.fn(df)
+    assert "non_null(order_id, product_id): 1" in str(err.value)
+    assert "unique(order_id, product_id, order_date): 1" in str(err.value)
@@ -0,0 +1,150 @@
+"""Компакція silver: дрібні date=YYYY-MM-DD/rates.parquet → month=YYYY-MM (або year=YYYY).
+
+    python 02_api_to_parquet_daily/flows/compact.py                 # закриті місяці
+    python 02_api_to_parquet_daily/flows/compact.py --granularity year
+    python 02_api_to_parquet_daily/flows/compact.py --bench 1095     # before/after на синтетиці
+"""
+from __future__ import annotations
+from pathlib import Path
+from datetime import date, timedelta
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.lake import PART_RE, RATES_DTYPES, catalog, scan_silver, silver_files  # noqa
+from utils.dtypes import compact  # noqa
+
+SILVER_DIR = Path("02_api_to_parquet_daily") / "data_lake" / "silver"
+FILE_NAME = "rates.parquet"
+ROW_GROUP_ROWS = 256_000  # рік по ~200 символах ≈ 75k рядків → одна row group на файл
+GRACE_SECONDS = 3600      # скільки тримати витіснені файли для читачів, що вже їх відкрили
+
+def period_of(kind: str, value: str, granularity: str) -> str | None:
+    width = 7 if granularity == "month" else 4
+    if kind == "year" and granularity == "month":
+        return None  # рік на місяці не розбиваємо
+    return value[:width]
+
+def write_compacted(df: pd.DataFrame, out: Path):
+    """Сортування (date, symbol), dictionary для symbol/base, zstd, запис через tmp + os.replace."""
+    df = (df.drop_duplicates(["date", "symbol"], keep="last")
+            .sort_values(["date", "symbol"])
+            .reset_index(drop=True))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}.tmp")
+    pq.write_table(
+        table, tmp,
+        compression="zstd",
+        use_dictionary=["symbol", "base"],
+        row_group_size=ROW_GROUP_ROWS,
+        write_statistics=True,
+    )
+    os.replace(tmp, out)  # точка коміту: з цього моменту читачі бачать лише компактний файл
+    catalog(out.parent.parent).register(out, Path(FILE_NAME).stem)
+
+def collect_garbage(silver_dir: Path, grace_seconds: float = GRACE_SECONDS) -> int:
+    """Видаляє витіснені партиції, щойно їх витіснили більше ніж grace_seconds тому."""
+    removed = []
+    cutoff = time.time_ns() - int(grace_seconds * 1e9)
+    for f, superseded_at in scan_silver(silver_dir, FILE_NAME)[1]:
+        if superseded_at <= cutoff:
+            shutil.rmtree(f.parent, ignore_errors=True)
+            removed.append(f)
+    if removed:
+        catalog(silver_dir).unregister(removed)
+    return len(removed)
+
+def compact_silver(silver_dir: Path = SILVER_DIR, granularity: str = "month",
+                   include_open: bool = False, grace_seconds: float = GRACE_SECONDS) -> list[Path]:
+    """Переписує видимі файли кожного періоду в один {granularity}=PERIOD/rates.parquet.
+
+    Поточний (відкритий) місяць/рік не чіпаємо, доки include_open=False.
+    """
+    if granularity not in ("month", "year"):
+        raise ValueError("granularity must be 'month' or 'year'")
+    today = date.today().isoformat()
+    open_period = today[:7] if granularity == "month" else today[:4]
+
+    groups: dict[str, list[tuple[str, Path]]] = {}
+    for f in silver_files(silver_dir, FILE_NAME):
+        kind, value = PART_RE.match(f.parent.name).groups()
+        period = period_of(kind, value, granularity)
+        if period is None or (period == open_period and not include_open):
+            continue
+        groups.setdefault(period, []).append((kind, f))
+
+    written = []
+    for period, files in sorted(groups.items()):
+        target = silver_dir / f"{granularity}={period}" / FILE_NAME
+        if len(files) == 1 and files[0][1] == target:
+            continue  # вже компактний, нових дрібних файлів немає
+        # спершу наявний компактний файл, потім новіші → drop_duplicates(keep="last") бере свіжі
+        files.sort(key=lambda kf: (kf[1] != target, kf[1].parent.name))
+        # старі партиції з date-рядками і нові з date32 зводяться до одних типів
+        df = compact(pd.concat([pd.read_parquet(f) for _, f in files], ignore_index=True), RATES_DTYPES)
+        write_compacted(df, target)
+        written.append(target)
+
+    collect_garbage(silver_dir, grace_seconds)
+    return written
+
+def make_synthetic_lake(silver_dir: Path, days: int, symbols: int = 6):
+    start = date(2022, 1, 1)
+    syms = [f"S{i:02d}" for i in range(symbols)]
+    for i in range(days):
+        d = (start + timedelta(days=i)).isoformat()
+        part = silver_dir / f"date={d}"
+        part.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame({"date": d, "base": "EUR", "symbol": syms, "rate": [1.0 + i / 1000] * symbols}) \
+          .to_parquet(part / FILE_NAME, index=False)
+
+def bench_scan(files: list[Path], repeat: int = 5) -> float:
+    import duckdb
+    con = duckdb.connect()
+    lst = "[" + ", ".join(f"'{f.as_posix()}'" for f in files) + "]"
+    sql = f"SELECT symbol, AVG(rate) FROM read_parquet({lst}, hive_partitioning = false) GROUP BY symbol"
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        con.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench(days: int, granularity: str):
+    tmp = Path(tempfile.mkdtemp(prefix="silver_bench_"))
+    try:
+        make_synthetic_lake(tmp, days)
+        before = silver_files(tmp, FILE_NAME)
+        t_before = bench_scan(before)
+        t0 = time.perf_counter()
+        compact_silver(tmp, granularity, include_open=True, grace_seconds=0)
+        t_compact = time.perf_counter() - t0
+        after = silver_files(tmp, FILE_NAME)
+        t_after = bench_scan(after)
+        print(f"days={days}  compaction={t_compact:.2f}s")
+        print(f"before: files={len(before):5d}  scan={t_before * 1000:8.1f} ms")
+        print(f"after : files={len(after):5d}  scan={t_after * 1000:8.1f} ms  ({t_before / t_after:.1f}x)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--granularity", choices=["month", "year"], default="month")
+    ap.add_argument("--include-open", action="store_true")
+    ap.add_argument("--bench", type=int, metavar="DAYS")
+    args = ap.parse_args()
+    if args.bench:
+        bench(args.bench, args.granularity)
+    else:
+        out = compact_silver(SILVER_DIR, args.granularity, args.include_open)
+        print(f"✅ Compacted {len(out)} periods into {args.granularity} files")
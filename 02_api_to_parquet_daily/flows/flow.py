@@ -1,7 +1,10 @@
 from __future__ import annotations
 from pathlib import Path
-from datetime import date
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
 import json
+import time
 import requests
 import pandas as pd
 
@@ -12,25 +15,37 @@ import sys
 ROOT = Path(__file__).resolve().parents[2]  # repo root
 sys.path.append(str(ROOT / "00_common"))
 from utils.io import write_parquet  # noqa
+from utils.ratelimit import TokenBucket  # noqa
+from utils.api_client import CachedClient, get_client, FOREVER  # noqa
+from utils.lake import RATES_DTYPES, catalog, covered_dates  # noqa
+from utils.metrics import pipeline, staged  # noqa
+from utils.dtypes import compact  # noqa
 
 BASE_URL = "https://api.exchangerate.host"  # публічний без ключа
 DEFAULT_BASE = "EUR"
 SYMBOLS = ["USD", "GBP", "PLN", "UAH", "BRL", "JPY"]
+RETRY_STATUS = {429, 500, 502, 503, 504}
+HTTP_CACHE_DIR = Path("02_api_to_parquet_daily") / ".cache" / "http"
+LATEST_TTL = 3600  # /latest змінюється протягом дня; історичні дати кешуються назавжди
 
 @task(retries=3, retry_delay_seconds=5)
+@staged("extract", rows_out=lambda d: len(d.get("rates") or {}))
 def fetch_rates(run_date: date, base: str = DEFAULT_BASE, symbols: list[str] = SYMBOLS) -> dict:
     """Забрати курси на конкретну дату (якщо підставити 'latest', візьме сьогодні)."""
-    # Використаємо endpoint /latest (можна /{YYYY-MM-DD} для історії)
-    url = f"{BASE_URL}/latest"
+    # сьогодні → /latest (кеш на LATEST_TTL), минулі дати → /{YYYY-MM-DD} (кеш назавжди)
+    client = get_client(str(HTTP_CACHE_DIR))
     params = {"base": base, "symbols": ",".join(symbols)}
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+    if run_date >= date.today():
+        data = client.get_json(f"{BASE_URL}/latest", params=params, ttl=LATEST_TTL)
+    else:
+        data = client.get_json(f"{BASE_URL}/{run_date.isoformat()}", params=params, ttl=FOREVER)
+    data = dict(data)
     # Підстрахуємось: якщо в API інша дата, підставимо наш run_date
     data["run_date"] = run_date.isoformat()
     return data
 
 @task
+@staged("raw")
 def save_raw_json(data: dict, raw_dir: Path) -> Path:
     raw_dir.mkdir(parents=True, exist_ok=True)
     out = raw_dir / f"{data.get('run_date', 'unknown')}.json"
@@ -39,6 +54,7 @@ def save_raw_json(data: dict, raw_dir: Path) -> Path:
     return out
 
 @task
+@staged("transform")
 def transform_to_parquet(raw_json_path: Path, silver_dir: Path) -> Path:
     with raw_json_path.open("r", encoding="utf-8") as f:
         data = json.load(f)
@@ -53,16 +69,84 @@ def transform_to_parquet(raw_json_path: Path, silver_dir: Path) -> Path:
 
     # перетворення у табличний вигляд
     rows = [{"date": run_date, "base": base, "symbol": k, "rate": v} for k, v in rates.items()]
-    df = pd.DataFrame(rows).sort_values(["symbol"]).reset_index(drop=True)
+    df = compact(pd.DataFrame(rows).sort_values(["symbol"]).reset_index(drop=True), RATES_DTYPES)
 
     # запис parquet у партиції by date
     part_dir = silver_dir / f"date={run_date}"
     part_dir.mkdir(parents=True, exist_ok=True)
     out_path = part_dir / "rates.parquet"
     write_parquet(df, out_path)
+    # статистика файлу (рядки, схема, min/max) — у каталог, щоб читачі діапазону дат не відкривали зайві файли
+    catalog(silver_dir).register(out_path, "rates")
     return out_path
 
+def fetch_historical(client: CachedClient, day: date, base: str = DEFAULT_BASE,
+                     symbols: list[str] = SYMBOLS, base_url: str = BASE_URL,
+                     bucket: TokenBucket | None = None, max_retries: int = 3, backoff: float = 1.0) -> dict:
+    """GET /{YYYY-MM-DD} для однієї дати; повтори з експоненційним backoff лише для цієї дати.
+    Історична дата не змінюється, тож відповідь кешується назавжди."""
+    url = f"{base_url}/{day.isoformat()}"
+    params = {"base": base, "symbols": ",".join(symbols)}
+    for attempt in range(max_retries + 1):
+        # токен витрачається лише на реальні запити, кеш-хіти не гальмуються
+        if bucket is not None and not client.is_fresh(url, params, FOREVER):
+            bucket.acquire()
+        try:
+            data = dict(client.get_json(url, params=params, ttl=FOREVER))
+            data["run_date"] = day.isoformat()
+            return data
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = getattr(e.response, "status_code", None)
+            retryable = status is None or status in RETRY_STATUS
+            if attempt == max_retries or not retryable:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+def date_range(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+@staged("backfill", rows_in=lambda dates, *a, **k: len(dates), rows_out=lambda r: len(r["done"]))
+def backfill_dates(dates: list[date], raw_dir: Path, silver_dir: Path, concurrency: int = 8,
+                   rate_per_sec: float = 5.0, max_retries: int = 3, backoff: float = 1.0,
+                   base_url: str = BASE_URL, cache_dir: Path = HTTP_CACHE_DIR) -> dict:
+    """Паралельно качає історичні дати (CachedClient: спільна Session з пулом + дисковий кеш,
+    token bucket для rate limit).
+
+    Дати, які вже є в silver (денна партиція або компактний файл), пропускаються.
+    Повертає {"done": [...], "skipped": [...], "failed": {date: error}}.
+    """
+    # і денні партиції, і компактні month=/year=; відкриваються лише файли, що перетинають діапазон дат
+    covered = covered_dates(silver_dir, dates=dates)
+    skipped = [d for d in dates if d.isoformat() in covered]
+    todo = sorted(set(dates) - set(skipped))
+
+    client = CachedClient(cache_dir, pool_maxsize=concurrency)
+    bucket = TokenBucket(rate_per_sec)
+
+    def one(day: date) -> Path:
+        payload = fetch_historical(client, day, base_url=base_url, bucket=bucket,
+                                   max_retries=max_retries, backoff=backoff)
+        raw_path = save_raw_json.fn(payload, raw_dir)
+        return transform_to_parquet.fn(raw_path, silver_dir)
+
+    done, failed = [], {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # копія контексту на кожну дату: stage-записи потоків лишаються в поточному pipeline-run
+            futures = {pool.submit(contextvars.copy_context().run, one, d): d for d in todo}
+            for fut in as_completed(futures):
+                day = futures[fut]
+                try:
+                    fut.result()
+                    done.append(day)
+                except Exception as e:  # одна погана дата не зупиняє весь backfill
+                    failed[day] = repr(e)
+    finally:
+        client.close()
+    return {"done": sorted(done), "skipped": skipped, "failed": failed, "http": dict(client.stats)}
+
 @flow(name="api-to-parquet-daily")
+@pipeline("02_api_to_parquet_daily")
 def etl_api_to_parquet(run_today: bool = True, specific_date: str | None = None):
     """
     Якщо run_today=True — качає 'latest' і ставить сьогоднішню дату.
@@ -77,6 +161,7 @@ def etl_api_to_parquet(run_today: bool = True, specific_date: str | None = None)
 
     # EXTRACT
     payload = fetch_rates.submit(run_date).result()
+    logger.info(get_client(str(HTTP_CACHE_DIR)).stats_line())
 
     # RAW
     raw_path = save_raw_json.submit(payload, raw_dir).result()
@@ -88,5 +173,29 @@ def etl_api_to_parquet(run_today: bool = True, specific_date: str | None = None)
 
     logger.info("ETL finished successfully.")
 
+@flow(name="api-to-parquet-backfill")
+@pipeline("02_api_to_parquet_backfill")
+def backfill_api_to_parquet(start_date: str, end_date: str, concurrency: int = 8,
+                            rate_per_sec: float = 5.0, max_retries: int = 3,
+                            base_url: str = BASE_URL):
+    """Історичний backfill за діапазон дат (включно) через /{YYYY-MM-DD}."""
+    logger = get_run_logger()
+    dl_root = Path("02_api_to_parquet_daily") / "data_lake"
+    dates = date_range(date.fromisoformat(start_date), date.fromisoformat(end_date))
+
+    res = backfill_dates(dates, dl_root / "raw", dl_root / "silver", concurrency=concurrency,
+                         rate_per_sec=rate_per_sec, max_retries=max_retries, base_url=base_url)
+    logger.info(f"Backfill {start_date}..{end_date}: done={len(res['done'])}, "
+                f"skipped={len(res['skipped'])}, failed={len(res['failed'])}")
+    logger.info(f"HTTP cache: {res['http']}")
+    if res["failed"]:
+        raise RuntimeError(f"Backfill failed for dates: {sorted(d.isoformat() for d in res['failed'])}")
+    return res
+
 if __name__ == "__main__":
-    etl_api_to_parquet()
+    # python flows/flow.py                        → щоденний запуск
+    # python flows/flow.py 2024-01-01 2024-12-31  → backfill за діапазон
+    if len(sys.argv) == 3:
+        backfill_api_to_parquet(sys.argv[1], sys.argv[2])
+    else:
+        etl_api_to_parquet()
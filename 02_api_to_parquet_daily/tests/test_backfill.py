@@ -0,0 +1,84 @@
+from pathlib import Path
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import shutil
+import threading
+
+import pandas as pd
+
+from flows.flow import backfill_dates, date_range
+from utils.metrics import pipeline
+
+class FakeRatesAPI(BaseHTTPRequestHandler):
+    calls: dict = {}
+
+    def do_GET(self):
+        day = self.path.split("?")[0].strip("/")
+        self.calls[day] = self.calls.get(day, 0) + 1
+        # перший запит на 2025-01-02 падає з 503 → має спрацювати повтор
+        if day == "2025-01-02" and self.calls[day] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({"base": "EUR", "date": day, "rates": {"USD": 1.1, "GBP": 0.85}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_backfill_fetches_concurrently_retries_and_skips_existing(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("ETL_METRICS_PATH", str(tmp_path / "metrics.jsonl"))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRatesAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    silver = tmp_path / "silver"
+    existing = silver / "date=2025-01-01" / "rates.parquet"
+    existing.parent.mkdir(parents=True)
+    existing.write_bytes(b"")  # партиція вже є → дату пропускаємо
+
+    dates = date_range(date(2025, 1, 1), date(2025, 1, 4))
+    kwargs = dict(concurrency=3, rate_per_sec=100, backoff=0.01, base_url=base_url, cache_dir=tmp_path / "http")
+    try:
+        with pipeline("backfill") as run:
+            res = backfill_dates(dates, tmp_path / "raw", silver, **kwargs)
+        # повторний прогін після втрати silver: історичні дати беруться з кешу, без мережі
+        shutil.rmtree(silver / "date=2025-01-03")
+        calls_before = dict(FakeRatesAPI.calls)
+        rerun = backfill_dates(dates, tmp_path / "raw", silver, **kwargs)
+    finally:
+        server.shutdown()
+
+    assert res["skipped"] == [date(2025, 1, 1)]
+    assert res["done"] == [date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 4)]
+    assert res["failed"] == {}
+    # stage-записи з потоків пулу належать поточному run
+    assert sum(r["stage"] == "transform" for r in run["records"]) == 3
+    assert "2025-01-01" not in FakeRatesAPI.calls
+    assert FakeRatesAPI.calls["2025-01-02"] == 2
+    df = pd.read_parquet(silver / "date=2025-01-03" / "rates.parquet")
+    assert set(df["symbol"]) == {"USD", "GBP"}
+
+    assert rerun["done"] == [date(2025, 1, 3)]
+    assert rerun["http"]["hits"] == 1 and rerun["http"]["misses"] == 0
+    assert FakeRatesAPI.calls == calls_before
+
+def test_catalog_prunes_silver_files_by_date_range(tmp_path: Path):
+    from utils.lake import catalog, silver_files
+
+    silver = tmp_path / "silver"
+    for day, dates in [("date=2025-01-01", ["2025-01-01"]), ("date=2025-01-02", ["2025-01-02"]),
+                       ("month=2024-12", ["2024-12-01", "2024-12-31"])]:
+        (silver / day).mkdir(parents=True)
+        # старі партиції мають date рядком, нові — date32: каталог порівнює обидва як ISO-текст
+        col = dates if day.startswith("date=") else pd.to_datetime(dates).date
+        pd.DataFrame({"date": col, "symbol": "USD", "rate": 1.1}).to_parquet(silver / day / "rates.parquet")
+
+    picked = silver_files(silver, date=("2024-12-31", "2025-01-01"))
+    assert [f.parent.name for f in picked] == ["date=2025-01-01", "month=2024-12"]
+    assert silver_files(silver, date="2025-01-03") == []
+    assert {e.num_rows for e in catalog(silver).entries("rates")} == {1, 2}
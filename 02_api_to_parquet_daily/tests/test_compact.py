@@ -0,0 +1,67 @@
+from pathlib import Path
+from datetime import date
+import os
+
+import pandas as pd
+
+from flows.compact import FILE_NAME, collect_garbage, compact_silver, make_synthetic_lake
+from utils.lake import catalog, scan_silver, silver_files
+
+def _names(files: list[Path]) -> list[str]:
+    return [f.parent.name for f in files]
+
+def _read(files: list[Path]) -> pd.DataFrame:
+    df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    return df.assign(date=df["date"].astype(str).str[:10]).sort_values(["date", "symbol"]).reset_index(drop=True)
+
+def test_compaction_switches_readers_to_month_files_and_gc_removes_daily(tmp_path: Path):
+    silver = tmp_path / "silver"
+    make_synthetic_lake(silver, days=40, symbols=3)  # 2022-01-01 .. 2022-02-09
+    before = _read(silver_files(silver))
+
+    written = compact_silver(silver)
+    assert _names(written) == ["month=2022-01", "month=2022-02"]
+    # витіснені денні файли ще лежать (grace), але читачі бачать лише компактні
+    assert _names(silver_files(silver)) == ["month=2022-01", "month=2022-02"]
+    assert len(scan_silver(silver)[1]) == 40 and (silver / "date=2022-01-01" / FILE_NAME).exists()
+    pd.testing.assert_frame_equal(_read(silver_files(silver)), before, check_dtype=False, check_categorical=False)
+    assert compact_silver(silver) == []  # нових дрібних файлів немає
+
+    assert collect_garbage(silver, grace_seconds=0) == 40
+    assert [d.name for d in sorted(silver.glob("*=*"))] == ["month=2022-01", "month=2022-02"]
+    assert _names(catalog(silver).files("rates")) == ["month=2022-01", "month=2022-02"]
+
+def test_daily_file_after_compaction_is_visible_until_next_compaction(tmp_path: Path):
+    silver = tmp_path / "silver"
+    make_synthetic_lake(silver, days=31, symbols=2)
+    compact_silver(silver, grace_seconds=0)
+    month = silver / "month=2022-01" / FILE_NAME
+
+    late = silver / "date=2022-01-05" / FILE_NAME
+    late.parent.mkdir()
+    pd.DataFrame({"date": "2022-01-05", "base": "EUR", "symbol": ["S00", "S01"], "rate": [9.0, 9.5]}) \
+      .to_parquet(late, index=False)
+    t = month.stat().st_mtime_ns - 10**9  # компакція була раніше за денний запис
+    os.utime(month, ns=(t, t))
+    assert _names(silver_files(silver)) == ["date=2022-01-05", "month=2022-01"]
+
+    assert _names(compact_silver(silver, grace_seconds=0)) == ["month=2022-01"]
+    assert _names(silver_files(silver)) == ["month=2022-01"] and not late.exists()
+    df = _read([month])
+    assert len(df) == 62  # дата не задвоїлась: свіжий денний файл замінив її рядки
+    assert df.loc[df["date"] == "2022-01-05", "rate"].tolist() == [9.0, 9.5]
+
+def test_open_period_and_year_granularity(tmp_path: Path):
+    silver = tmp_path / "silver"
+    make_synthetic_lake(silver, days=40, symbols=2)
+    today = date.today().isoformat()
+    (silver / f"date={today}").mkdir()
+    pd.DataFrame({"date": today, "base": "EUR", "symbol": ["S00"], "rate": [1.0]}) \
+      .to_parquet(silver / f"date={today}" / FILE_NAME, index=False)
+
+    compact_silver(silver, grace_seconds=0)
+    assert f"date={today}" in _names(silver_files(silver))  # відкритий місяць не чіпаємо
+
+    compact_silver(silver, "year", include_open=True, grace_seconds=0)
+    assert _names(silver_files(silver)) == ["year=2022", f"year={today[:4]}"]
+    assert len(_read(silver_files(silver))) == 81
@@ -1,28 +1,103 @@
-import pandas as pd
+"""Excel (усі аркуші, усі книги в data/) → Parquet-кеш → SQLite, лише змінені книги.
+
+    python 03_excel_to_postgres/flows/flow.py
+    python 03_excel_to_postgres/flows/flow.py --full-refresh
+
+Книги читаються потоково (python-calamine, якщо встановлено, інакше openpyxl read_only) і
+паралельно конвертуються в Parquet-кеш data/.cache/<sha256>/ — незмінна книга більше не
+парситься. У таблицю orders додаються source_file і sheet: змінена книга замінює лише свої рядки.
+Аркуші з різними колонками йдуть у ту саму таблицю: нові колонки додаються, відсутні — NULL.
+"""
 from pathlib import Path
-import sqlite3
+import argparse
+
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.sqlite_bulk import load_sqlite, sqlite_url  # noqa
+from utils.io import delete_where, truncate_table, create_index  # noqa
+from utils.manifest import load_manifest, save_manifest, changed_files  # noqa
+from utils.excel import workbook_files, convert_workbooks, iter_cached_parts, prune_cache, engine  # noqa
+from utils.metrics import pipeline, stage  # noqa
+from utils.dtypes import compact  # noqa
+
+DATA_DIR = Path("03_excel_to_postgres/data")
+DB_FILE = Path("03_excel_to_postgres/data/orders.sqlite")
+CACHE_DIR = Path("03_excel_to_postgres/data/.cache")
+TABLE = "orders"
 
-def main():
-    # Path to Excel file
-    excel_file = Path("03_excel_to_postgres/data/sample.xlsx")
-    db_file = Path("03_excel_to_postgres/data/orders.sqlite")
+def load_workbook_rows(meta: dict, key: str, db_url: str, table: str, cache_dir: Path = CACHE_DIR,
+                       replace: bool = False) -> int:
+    """Parquet-частини з кешу → SQLite (executemany батчами); replace=True — таблиця створюється заново."""
+    rows = 0
+    for sheet, part in iter_cached_parts(cache_dir, meta):
+        df = part.to_pandas()
+        df["source_file"] = key
+        df["sheet"] = sheet
+        # компактні типи одразу після читання: source_file/sheet — словникові, числа — найвужчий тип
+        df = compact(df, {"source_file": "category", "sheet": "category"})
+        # аркуші можуть мати різні колонки: таблиця розширюється (ALTER TABLE), відсутні — NULL
+        load_sqlite(df, db_url, table, if_exists="replace" if replace and rows == 0 else "append",
+                    add_columns=True)
+        rows += len(df)
+    return rows
 
-    if not excel_file.exists():
+@pipeline("03_excel_to_postgres")
+def main(data_dir: Path = DATA_DIR, db_file: Path = DB_FILE, table: str = TABLE,
+         cache_dir: Path = CACHE_DIR, workers: int | None = None, full_refresh: bool = False):
+    files = workbook_files(data_dir)
+    if not files:
         print("❌ No Excel file found in data/. Please add one.")
-        return
+        if not db_file.exists():
+            return  # інакше далі прибираються рядки видалених книг
 
-    # Read Excel
-    df = pd.read_excel(excel_file)
+    db_url = sqlite_url(db_file)
+    manifest_path = db_file.with_name(f"{db_file.stem}.manifest.json")
+    # немає бази / маніфесту (перший запуск або стара таблиця без source_file) → повне перезавантаження
+    full_refresh = full_refresh or not db_file.exists() or not manifest_path.exists()
+    manifest = {} if full_refresh else load_manifest(manifest_path)
+    changed, touched = changed_files(files, manifest)
+    current = {f.as_posix() for f in files}
+    removed = [k for k in manifest if k not in current]
+    manifest.update(touched)
 
-    print("✅ Excel file loaded successfully!")
-    print(df.head())
+    # EXTRACT: змінені книги → Parquet-кеш (паралельно; книга з тим самим хешем — з кешу)
+    with stage("extract", rows_in=len(changed), engine=engine()) as st:
+        metas = convert_workbooks({k: fp["sha256"] for k, fp in changed.items()}, cache_dir, workers)
+        st.rows_out = sum(m["rows"] for m in metas.values())
+    for key, meta in metas.items():
+        sheets = ", ".join(f"{s}={i['rows']}" for s, i in meta["sheets"].items())
+        print(f"✅ {Path(key).name}: {'cache' if meta['cached'] else engine()} [{sheets}]")
 
-    # Save to SQLite
-    conn = sqlite3.connect(db_file)
-    df.to_sql("orders", conn, if_exists="replace", index=False)
-    conn.close()
+    # LOAD: рядки змінених книг замінюються за source_file; маніфест — після кожної книги
+    with stage("load", rows_in=st.rows_out) as st:
+        if full_refresh:
+            # старі рядки — одразу, а не з першою непорожньою частиною: книги можуть бути порожні чи видалені
+            manifest_path.unlink(missing_ok=True)
+            truncate_table(db_url, table)
+        else:
+            for key in removed + list(changed):
+                delete_where(db_url, table, "source_file", key)
+        for key in removed:
+            manifest.pop(key, None)
+        rows = 0
+        for key in sorted(metas):
+            # повне перезавантаження: перша непорожня частина замінює таблицю
+            rows += load_workbook_rows(metas[key], key, db_url, table, cache_dir, replace=full_refresh and rows == 0)
+            manifest[key] = changed[key]
+            save_manifest(manifest, manifest_path)
+        save_manifest(manifest, manifest_path)
+        if metas:
+            create_index(db_url, table, ["source_file"])
+        st.rows_out = rows
 
-    print(f"✅ Data saved to SQLite database: {db_file}")
+    prune_cache(cache_dir, {fp["sha256"] for fp in manifest.values()})
+    print(f"✅ Data saved to SQLite database: {db_file} (+{rows} rows from {len(metas)} workbook(s), "
+          f"{len(files) - len(metas)} unchanged)")
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full-refresh", action="store_true")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+    main(workers=args.workers, full_refresh=args.full_refresh)
@@ -0,0 +1,49 @@
+from pathlib import Path
+import sqlite3
+
+from openpyxl import Workbook
+
+from flows.flow import main
+
+def test_sheets_with_different_columns_share_the_table(tmp_path: Path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "jan"
+    ws.append(["order_id", "amount"])
+    ws.append([1, 10.5])
+    ws = wb.create_sheet("feb")
+    ws.append(["order_id", "amount", "customer"])
+    ws.append([2, 20.0, "acme"])
+    wb.save(tmp_path / "orders.xlsx")
+    db = tmp_path / "orders.sqlite"
+
+    main(data_dir=tmp_path, db_file=db, cache_dir=tmp_path / ".cache", workers=1)
+    main(data_dir=tmp_path, db_file=db, cache_dir=tmp_path / ".cache", workers=1, full_refresh=True)
+
+    with sqlite3.connect(db) as con:
+        rows = con.execute("SELECT sheet, order_id, amount, customer FROM orders ORDER BY order_id").fetchall()
+    assert rows == [("jan", 1, 10.5, None), ("feb", 2, 20.0, "acme")]
+
+def test_full_refresh_clears_rows_of_empty_and_removed_workbooks(tmp_path: Path):
+    wb = Workbook()
+    wb.active.append(["order_id", "amount"])
+    wb.active.append([1, 10.5])
+    wb.save(tmp_path / "orders.xlsx")
+    db = tmp_path / "orders.sqlite"
+    run = dict(data_dir=tmp_path, db_file=db, cache_dir=tmp_path / ".cache", workers=1)
+    main(**run)
+
+    wb = Workbook()
+    wb.active.append(["order_id", "amount"])  # лише заголовок
+    wb.save(tmp_path / "orders.xlsx")
+    main(**run, full_refresh=True)
+    with sqlite3.connect(db) as con:
+        assert con.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+
+    wb.active.append([2, 3.0])
+    wb.save(tmp_path / "orders.xlsx")
+    main(**run)
+    (tmp_path / "orders.xlsx").unlink()
+    main(**run, full_refresh=True)
+    with sqlite3.connect(db) as con:
+        assert con.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
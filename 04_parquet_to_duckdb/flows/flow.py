@@ -1,22 +1,82 @@
 from pathlib import Path
+from datetime import datetime
 import duckdb
-import glob
 
-SILVER_GLOB = r"02_api_to_parquet_daily/data_lake/silver/date=*/rates.parquet"
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.manifest import changed_files  # noqa
+from utils.lake import silver_files  # noqa
+from utils.duck import connect  # noqa
+from utils.metrics import pipeline, stage  # noqa
+
+# date=*/rates.parquet + компактні month=*/year=* (див. 02 flows/compact.py)
+SILVER_DIR = Path("02_api_to_parquet_daily/data_lake/silver")
 DB_PATH = "04_parquet_to_duckdb/warehouse.duckdb"
 
-def main():
-    # знайдемо всі партиції Parquet
-    files = sorted(glob.glob(SILVER_GLOB))
+def sql_list(values) -> str:
+    return "[" + ", ".join("'" + str(v).replace("'", "''") + "'" for v in values) + "]"
+
+def load_partitions(con: duckdb.DuckDBPyConnection, changed: dict[str, dict]) -> int:
+    """Insert only the given partitions; dates they contain are replaced in fact_rates.
+
+    A date present in several of them (a daily file written after its month was compacted, next
+    to that month's file) is taken from the newest file only (mtime), never loaded twice.
+    """
+    # лише нові/змінені parquet як один набір; дата, що є в кількох файлах, — лише з найновішого
+    con.execute("CREATE OR REPLACE TEMP TABLE v_files AS SELECT unnest(?) AS _file, unnest(?) AS mtime_ns;",
+                [list(changed), [fp["mtime_ns"] for fp in changed.values()]])
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE v_rates AS
+        WITH raw AS (
+          SELECT *, filename AS _file
+          FROM read_parquet({sql_list(changed)}, filename = true, hive_partitioning = false)
+        ), newest AS (
+          SELECT d, arg_max(_file, mtime_ns) AS _file
+          FROM (SELECT DISTINCT CAST(date AS DATE) AS d, _file FROM raw) JOIN v_files USING (_file)
+          GROUP BY d
+        )
+        SELECT raw.* FROM raw JOIN newest ON CAST(raw.date AS DATE) = newest.d AND raw._file = newest._file;
+    """)
+
+    # нові символи отримують ключі після поточного максимуму — старі ключі не змінюються
+    con.execute("""
+        INSERT INTO dim_currency (currency_key, symbol)
+        SELECT (SELECT COALESCE(MAX(currency_key), 0) FROM dim_currency)
+               + row_number() OVER (ORDER BY symbol) AS currency_key, symbol
+        FROM (SELECT DISTINCT symbol FROM v_rates
+              WHERE symbol NOT IN (SELECT symbol FROM dim_currency));
+    """)
+
+    # перезаписуємо лише дати, що є у змінених файлах (день або цілий компактний місяць)
+    con.execute("DELETE FROM fact_rates WHERE date IN (SELECT DISTINCT CAST(date AS DATE) FROM v_rates);")
+    con.execute("""
+        INSERT INTO fact_rates (date, base, currency_key, rate)
+        SELECT CAST(v.date AS DATE), v.base, m.currency_key, v.rate
+        FROM v_rates v
+        JOIN dim_currency m ON v.symbol = m.symbol;
+    """)
+
+    counts = dict(con.execute("SELECT _file, COUNT(*) FROM v_rates GROUP BY _file").fetchall())
+    now = datetime.now()
+    for path, fp in changed.items():
+        con.execute("INSERT OR REPLACE INTO load_state VALUES (?, ?, ?, ?, ?, ?)",
+                    [path, fp["size"], fp["mtime_ns"], fp["sha256"], counts.get(path, 0), now])
+    con.execute("DROP TABLE v_rates; DROP TABLE v_files;")
+    return sum(counts.values())
+
+@pipeline("04_parquet_to_duckdb")
+def main(silver_dir: Path = SILVER_DIR, db_path: str = DB_PATH):
+    # знайдемо всі актуальні партиції Parquet
+    files = [f.as_posix() for f in silver_files(silver_dir)]
     if not files:
         print("❌ No Parquet snapshots found. Run Project 02 first.")
         return
     print("Found snapshots:", len(files))
 
-    db_path = Path(DB_PATH)
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
 
-    con = duckdb.connect(DB_PATH)
+    con = connect(db_path)  # чекає, поки читач (QueryService) відпустить файл
 
     # створимо таблиці (idempotent)
     con.execute("""
@@ -34,33 +94,42 @@ def main():
       FOREIGN KEY(currency_key) REFERENCES dim_currency(currency_key)
     );
     """)
-
-    # підвантажимо всі parquet як один віртуальний набір
-    # (DuckDB вміє читати напряму з Parquet)
-    con.execute(f"""
-        CREATE OR REPLACE TEMP VIEW v_rates AS
-        SELECT * FROM read_parquet('{SILVER_GLOB}');
-    """)
-
-    # заповнимо dim_currency (символ → surrogate key)
+    # які партиції (і з якими відбитками файлів) вже завантажені
     con.execute("""
-        INSERT OR IGNORE INTO dim_currency (currency_key, symbol)
-        SELECT row_number() OVER (ORDER BY symbol) AS currency_key, symbol
-        FROM (SELECT DISTINCT symbol FROM v_rates)
-        ON CONFLICT(symbol) DO NOTHING;
+    CREATE TABLE IF NOT EXISTS load_state (
+      path TEXT PRIMARY KEY,
+      size BIGINT,
+      mtime_ns BIGINT,
+      sha256 TEXT,
+      rows BIGINT,
+      loaded_at TIMESTAMP
+    );
     """)
 
-    # створимо маппінг symbol → currency_key
-    con.execute("CREATE OR REPLACE TEMP VIEW v_map AS SELECT currency_key, symbol FROM dim_currency;")
+    state = {
+        path: {"size": size, "mtime_ns": mtime_ns, "sha256": sha256}
+        for path, size, mtime_ns, sha256 in con.execute(
+            "SELECT path, size, mtime_ns, sha256 FROM load_state").fetchall()
+    }
+    with stage("scan", rows_in=len(files)) as st:
+        changed, touched = changed_files([Path(f) for f in files], state)
+        st.rows_out = len(changed)
+    print(f"New/changed partitions: {len(changed)}")
 
-    # fact: приєднуємо ключі
-    con.execute("DELETE FROM fact_rates;")
-    con.execute("""
-        INSERT INTO fact_rates (date, base, currency_key, rate)
-        SELECT CAST(v.date AS DATE), v.base, m.currency_key, v.rate
-        FROM v_rates v
-        JOIN v_map m ON v.symbol = m.symbol;
-    """)
+    with stage("load") as st:
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            # файли з тим самим вмістом, але новим mtime — лише оновлюємо відбиток
+            for path, fp in touched.items():
+                con.execute("UPDATE load_state SET size = ?, mtime_ns = ? WHERE path = ?",
+                            [fp["size"], fp["mtime_ns"], path])
+            st.rows_out = load_partitions(con, changed) if changed else 0
+            # після компакції денні файли зникають — прибираємо їх зі стану
+            con.execute(f"DELETE FROM load_state WHERE path NOT IN (SELECT unnest({sql_list(files)}));")
+            con.execute("COMMIT;")
+        except Exception:
+            con.execute("ROLLBACK;")
+            raise
 
     # перевірка
     cnt = con.execute("SELECT COUNT(*) FROM fact_rates;").fetchone()[0]
@@ -9,3 +9,13 @@ CREATE TABLE IF NOT EXISTS fact_rates (
   currency_key INTEGER REFERENCES dim_currency(currency_key),
   rate DOUBLE
 );
+
+-- партиції silver, які вже завантажені (відбиток файлу → інкрементальне завантаження)
+CREATE TABLE IF NOT EXISTS load_state (
+  path TEXT PRIMARY KEY,
+  size BIGINT,
+  mtime_ns BIGINT,
+  sha256 TEXT,
+  rows BIGINT,
+  loaded_at TIMESTAMP
+);
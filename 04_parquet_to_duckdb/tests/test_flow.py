@@ -0,0 +1,50 @@
+from pathlib import Path
+import os
+
+import duckdb
+import pandas as pd
+
+from flows.flow import main
+
+def _part(silver: Path, partition: str, rows: list[tuple[str, str, float]], mtime: int | None = None) -> Path:
+    out = silver / partition / "rates.parquet"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows, columns=["date", "symbol", "rate"]).assign(base="EUR").to_parquet(out, index=False)
+    if mtime is not None:
+        os.utime(out, ns=(mtime, mtime))
+    return out
+
+def _facts(db: Path) -> list[tuple]:
+    with duckdb.connect(str(db)) as con:
+        return con.execute("""
+            SELECT CAST(f.date AS VARCHAR), d.symbol, f.rate, d.currency_key
+            FROM fact_rates f JOIN dim_currency d USING (currency_key) ORDER BY 1, 2
+        """).fetchall()
+
+def test_daily_file_after_compaction_is_loaded_once(tmp_path: Path):
+    silver, db = tmp_path / "silver", tmp_path / "warehouse.duckdb"
+    month = _part(silver, "month=2025-01", [("2025-01-01", "USD", 1.0), ("2025-01-02", "USD", 1.1)])
+    # денний файл записано (виправлено) після компакції місяця: видимий поряд з month=
+    _part(silver, "date=2025-01-02", [("2025-01-02", "USD", 1.5)], mtime=month.stat().st_mtime_ns + 10**9)
+
+    main(silver, str(db))
+    assert [r[:3] for r in _facts(db)] == [("2025-01-01", "USD", 1.0), ("2025-01-02", "USD", 1.5)]
+
+def test_new_partition_is_loaded_alone_and_currency_keys_are_stable(tmp_path: Path):
+    silver, db = tmp_path / "silver", tmp_path / "warehouse.duckdb"
+    _part(silver, "date=2025-01-01", [("2025-01-01", "USD", 1.1), ("2025-01-01", "GBP", 0.8)])
+    main(silver, str(db))
+    keys = {sym: k for _, sym, _, k in _facts(db)}
+
+    day2 = _part(silver, "date=2025-01-02", [("2025-01-02", "AUD", 1.6), ("2025-01-02", "USD", 1.2)])
+    main(silver, str(db))
+    rows = _facts(db)
+    assert [r[:3] for r in rows] == [("2025-01-01", "GBP", 0.8), ("2025-01-01", "USD", 1.1),
+                                     ("2025-01-02", "AUD", 1.6), ("2025-01-02", "USD", 1.2)]
+    assert {sym: k for _, sym, _, k in rows if sym in keys} == keys  # старі ключі не змінились
+    assert rows[2][3] > max(keys.values())                           # новий символ — після максимуму
+    with duckdb.connect(str(db)) as con:
+        state = con.execute("SELECT path, rows FROM load_state ORDER BY path").fetchall()
+        loaded = con.execute("SELECT max(loaded_at) - min(loaded_at) > INTERVAL 0 SECOND FROM load_state").fetchone()[0]
+    assert state == [(p.as_posix(), 2) for p in sorted(silver.glob("date=*/rates.parquet"))]
+    assert loaded and day2.as_posix() == state[-1][0]  # другий запуск записав лише нову партицію
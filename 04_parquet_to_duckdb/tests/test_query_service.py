@@ -0,0 +1,22 @@
+from pathlib import Path
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.duck import connect
+from utils.query_service import QueryService
+
+def test_cache_hits_until_a_load_changes_the_warehouse(tmp_path: Path):
+    db = tmp_path / "warehouse.duckdb"
+    with connect(db) as con:
+        con.execute("CREATE TABLE dim_currency (currency_key INTEGER, symbol TEXT)")
+        con.execute("INSERT INTO dim_currency VALUES (1, 'USD')")
+
+    with QueryService(db, hold_seconds=0.05) as svc:
+        assert svc.query("currencies").num_rows == 1
+        assert svc.query("currencies").num_rows == 1
+        assert svc.stats == {"hits": 1, "misses": 1, "stale": 0}
+
+        # loader: waits for the service's idle read-only handle to close instead of failing
+        with connect(db, lock_timeout=5) as con:
+            con.execute("INSERT INTO dim_currency VALUES (2, 'GBP')")
+        assert svc.query("currencies")["symbol"].to_pylist() == ["GBP", "USD"]
+        assert svc.stats == {"hits": 1, "misses": 2, "stale": 0}
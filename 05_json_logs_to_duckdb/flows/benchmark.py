@@ -0,0 +1,128 @@
+"""Звіти по fact_events: запити з sql/queries.sql vs похідні таблиці (derived.py) на синтетиці.
+
+    python 05_json_logs_to_duckdb/flows/benchmark.py              # 10M подій
+    python 05_json_logs_to_duckdb/flows/benchmark.py --events 2000000 --batches 5
+"""
+from pathlib import Path
+import argparse
+import shutil
+import tempfile
+import time
+
+import duckdb
+
+from derived import apply_batch, create_derived, rebuild_derived
+from flow import create_tables
+
+ORIGINAL = {
+    "dau": """
+        SELECT CAST(timestamp AS DATE) AS d, COUNT(DISTINCT user_id) AS dau
+        FROM fact_events GROUP BY d ORDER BY d DESC""",
+    "retention": """
+        WITH sessions AS (
+          SELECT user_id, DATE_TRUNC('day', timestamp) AS d, COUNT(*) AS hits
+          FROM fact_events GROUP BY user_id, d
+        ),
+        retained AS (
+          SELECT s1.user_id, s1.d AS day0,
+                 EXISTS(SELECT 1 FROM sessions s2 WHERE s2.user_id = s1.user_id AND s2.d > s1.d) AS returned_later
+          FROM sessions s1
+          QUALIFY ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day0) = 1
+        )
+        SELECT returned_later, COUNT(*) AS users FROM retained GROUP BY returned_later ORDER BY 1""",
+    "funnel": """
+        WITH per_user AS (
+          SELECT user_id,
+                 MIN(CASE WHEN event='login' THEN timestamp END) AS first_login,
+                 MIN(CASE WHEN event='purchase' THEN timestamp END) AS first_purchase
+          FROM fact_events GROUP BY user_id
+        )
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE first_login IS NOT NULL),
+               COUNT(*) FILTER (WHERE first_login IS NOT NULL AND first_purchase IS NOT NULL
+                                AND DATE_TRUNC('day', first_login) = DATE_TRUNC('day', first_purchase))
+        FROM per_user""",
+}
+
+DERIVED = {
+    "dau": "SELECT d, COUNT(*) AS dau FROM user_day GROUP BY d ORDER BY d DESC",
+    "retention": """
+        SELECT CAST(last_ts AS DATE) > CAST(first_ts AS DATE) AS returned_later, COUNT(*) AS users
+        FROM user_first_seen GROUP BY returned_later ORDER BY 1""",
+    "funnel": """
+        SELECT (SELECT COUNT(*) FROM user_first_seen),
+               COUNT(*) FILTER (WHERE l.first_ts IS NOT NULL),
+               COUNT(*) FILTER (WHERE p.first_ts IS NOT NULL
+                                AND DATE_TRUNC('day', l.first_ts) = DATE_TRUNC('day', p.first_ts))
+        FROM user_event_first l
+        LEFT JOIN user_event_first p ON p.user_id = l.user_id AND p.event = 'purchase'
+        WHERE l.event = 'login'""",
+}
+
+def synthetic(n: int, users: int, start_s: int, span_s: int, seed: int) -> str:
+    # події рівномірно по span_s секунд, починаючи з TIMESTAMP '2025-01-01' + start_s
+    return f"""
+        SELECT (hash(i, {seed}) % {users})::INTEGER AS user_id,
+               ['login', 'view', 'view', 'add_to_cart', 'purchase'][1 + (hash(i, {seed} + 1) % 5)::INTEGER] AS event,
+               TIMESTAMP '2025-01-01' + to_seconds({start_s} + (i * {span_s} // {n})::BIGINT) AS timestamp
+        FROM range({n}) t(i)
+    """
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench(events: int, batches: int, batch_size: int, users: int, days: int):
+    tmp = Path(tempfile.mkdtemp(prefix="events_bench_"))
+    try:
+        con = duckdb.connect(str(tmp / "warehouse.duckdb"))
+        create_tables(con)
+        base = events - batches * batch_size
+        span = days * 86400
+        con.execute(f"INSERT INTO fact_events SELECT *, 'synthetic' FROM ({synthetic(base, users, 0, span, 1)});")
+        t0 = time.perf_counter()
+        create_derived(con)  # перша побудова з усього fact_events
+        print(f"events={events:,} users={users:,} days={days}")
+        print(f"initial build of derived tables: {time.perf_counter() - t0:.2f}s")
+
+        # нові дані: батчі за наступну добу (частина подій — із запізненням у межах години)
+        per_batch = []
+        for b in range(batches):
+            start = span + b * 86400 // batches - 3600
+            con.execute(f"CREATE OR REPLACE TEMP TABLE batch AS {synthetic(batch_size, users, start, 86400 // batches, 100 + b)};")
+            t0 = time.perf_counter()
+            con.execute("BEGIN TRANSACTION;")
+            con.execute("INSERT INTO fact_events SELECT *, 'synthetic' FROM batch;")
+            apply_batch(con, "batch")
+            con.execute("COMMIT;")
+            per_batch.append(time.perf_counter() - t0)
+        print(f"incremental batch of {batch_size:,} events (insert + derived): "
+              f"avg {sum(per_batch) / len(per_batch):.2f}s, max {max(per_batch):.2f}s")
+
+        t0 = time.perf_counter()
+        rebuild_derived(con)
+        print(f"full rebuild (for comparison): {time.perf_counter() - t0:.2f}s")
+
+        for name in ORIGINAL:
+            a = con.execute(ORIGINAL[name]).fetchall()
+            b = con.execute(DERIVED[name]).fetchall()
+            assert a == b, f"{name}: results differ"
+            t_orig = timed(lambda: con.execute(ORIGINAL[name]).fetchall())
+            t_der = timed(lambda: con.execute(DERIVED[name]).fetchall())
+            print(f"{name:10s} fact_events: {t_orig * 1000:8.1f} ms   derived: {t_der * 1000:7.1f} ms  ({t_orig / t_der:.0f}x)")
+        con.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=10_000_000)
+    ap.add_argument("--batches", type=int, default=10)
+    ap.add_argument("--batch-size", type=int, default=100_000)
+    ap.add_argument("--users", type=int, default=200_000)
+    ap.add_argument("--days", type=int, default=90)
+    args = ap.parse_args()
+    bench(args.events, args.batches, args.batch_size, args.users, args.days)
@@ -0,0 +1,127 @@
+"""Похідні таблиці над fact_events, що оновлюються під час завантаження (лише нові події).
+
+- user_first_seen(user_id, first_ts, first_event, last_ts)   — онбординг, ретеншн
+- user_day(user_id, d, events, first_ts, last_ts)            — DAU, активність по днях
+- user_event_first(user_id, event, first_ts, events)         — фанели між будь-якими подіями
+- user_sessions(user_id, session_id, session_start, session_end, events) — сесії з розривом > gap
+
+Агрегати зливаються з батчем через INSERT ... ON CONFLICT DO UPDATE. Сесії перераховуються
+лише для зачеплених користувачів і лише від останньої сесії, з якою можуть злитися нові події
+(пізні події старші за неї теж коректно розбивають/зливають сесії).
+"""
+import duckdb
+
+SESSION_GAP_MINUTES = 30
+
+DDL = [
+    """CREATE TABLE IF NOT EXISTS user_first_seen (
+         user_id INTEGER PRIMARY KEY, first_ts TIMESTAMP, first_event TEXT, last_ts TIMESTAMP);""",
+    """CREATE TABLE IF NOT EXISTS user_day (
+         user_id INTEGER, d DATE, events BIGINT, first_ts TIMESTAMP, last_ts TIMESTAMP,
+         PRIMARY KEY (user_id, d));""",
+    """CREATE TABLE IF NOT EXISTS user_event_first (
+         user_id INTEGER, event TEXT, first_ts TIMESTAMP, events BIGINT,
+         PRIMARY KEY (user_id, event));""",
+    """CREATE TABLE IF NOT EXISTS user_sessions (
+         user_id INTEGER, session_id UBIGINT, session_start TIMESTAMP, session_end TIMESTAMP, events BIGINT);""",
+    "CREATE TABLE IF NOT EXISTS derived_state (name TEXT PRIMARY KEY, value TEXT);",
+]
+
+DERIVED_TABLES = ["user_first_seen", "user_day", "user_event_first", "user_sessions"]
+
+def create_derived(con: duckdb.DuckDBPyConnection, gap_minutes: int = SESSION_GAP_MINUTES):
+    for sql in DDL:
+        con.execute(sql)
+    # новий warehouse / старий без похідних таблиць / інший gap — перебудова з наявного fact_events
+    if current_gap(con) != gap_minutes:
+        rebuild_derived(con, gap_minutes)
+
+def merge_aggregates(con: duckdb.DuckDBPyConnection, rel: str):
+    """Злиття батчу (user_id, event, timestamp) з агрегатами по користувачу / дню / події."""
+    con.execute(f"""
+        INSERT INTO user_first_seen
+        SELECT user_id, MIN(timestamp), arg_min(event, timestamp), MAX(timestamp)
+        FROM {rel} GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+          first_event = CASE WHEN excluded.first_ts < first_ts THEN excluded.first_event ELSE first_event END,
+          first_ts = LEAST(first_ts, excluded.first_ts),
+          last_ts = GREATEST(last_ts, excluded.last_ts);
+    """)
+    con.execute(f"""
+        INSERT INTO user_day
+        SELECT user_id, CAST(timestamp AS DATE), COUNT(*), MIN(timestamp), MAX(timestamp)
+        FROM {rel} GROUP BY ALL
+        ON CONFLICT (user_id, d) DO UPDATE SET
+          events = events + excluded.events,
+          first_ts = LEAST(first_ts, excluded.first_ts),
+          last_ts = GREATEST(last_ts, excluded.last_ts);
+    """)
+    con.execute(f"""
+        INSERT INTO user_event_first
+        SELECT user_id, event, MIN(timestamp), COUNT(*)
+        FROM {rel} GROUP BY ALL
+        ON CONFLICT (user_id, event) DO UPDATE SET
+          first_ts = LEAST(first_ts, excluded.first_ts),
+          events = events + excluded.events;
+    """)
+
+def _sessionize(cut: str, gap_minutes: int) -> str:
+    # нова сесія, коли від попередньої події користувача минуло більше gap
+    return f"""
+        SELECT user_id, hash(user_id, MIN(timestamp)) AS session_id,
+               MIN(timestamp) AS session_start, MAX(timestamp) AS session_end, COUNT(*) AS events
+        FROM (
+          SELECT user_id, timestamp,
+                 SUM(is_new) OVER (PARTITION BY user_id ORDER BY timestamp ROWS UNBOUNDED PRECEDING) AS sid
+          FROM (
+            SELECT e.user_id, e.timestamp,
+                   CASE WHEN e.timestamp - lag(e.timestamp) OVER (PARTITION BY e.user_id ORDER BY e.timestamp)
+                             <= INTERVAL {int(gap_minutes)} MINUTE THEN 0 ELSE 1 END AS is_new
+            FROM fact_events e
+            JOIN {cut} c ON e.user_id = c.user_id AND e.timestamp >= c.from_ts
+            WHERE e.timestamp >= (SELECT MIN(from_ts) FROM {cut})
+          )
+        )
+        GROUP BY user_id, sid
+    """
+
+def update_sessions(con: duckdb.DuckDBPyConnection, rel: str, gap_minutes: int = SESSION_GAP_MINUTES):
+    """Перерахунок сесій для користувачів із батчу; fact_events уже містить нові події."""
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE session_cut AS
+        WITH touched AS (SELECT user_id, MIN(timestamp) AS min_new FROM {rel} GROUP BY user_id)
+        SELECT t.user_id, LEAST(t.min_new, COALESCE(MIN(s.session_start), t.min_new)) AS from_ts
+        FROM touched t
+        LEFT JOIN user_sessions s
+          ON s.user_id = t.user_id AND s.session_end >= t.min_new - INTERVAL {int(gap_minutes)} MINUTE
+        GROUP BY t.user_id, t.min_new;
+    """)
+    con.execute("""
+        DELETE FROM user_sessions s USING session_cut c
+        WHERE s.user_id = c.user_id AND s.session_start >= c.from_ts;
+    """)
+    con.execute(f"INSERT INTO user_sessions {_sessionize('session_cut', gap_minutes)};")
+    con.execute("DROP TABLE session_cut;")
+
+def apply_batch(con: duckdb.DuckDBPyConnection, rel: str = "batch", gap_minutes: int = SESSION_GAP_MINUTES):
+    """Інкрементальне оновлення після INSERT батчу в fact_events (у тій самій транзакції)."""
+    merge_aggregates(con, rel)
+    update_sessions(con, rel, gap_minutes)
+
+def current_gap(con: duckdb.DuckDBPyConnection) -> int | None:
+    row = con.execute("SELECT value FROM derived_state WHERE name = 'session_gap_minutes'").fetchone()
+    return int(row[0]) if row else None
+
+def rebuild_derived(con: duckdb.DuckDBPyConnection, gap_minutes: int = SESSION_GAP_MINUTES):
+    """З нуля по всьому fact_events: після перезавантаження файлу або зміни gap."""
+    # DROP + CREATE замість DELETE: масове видалення з PK-індексів у DuckDB повільне
+    for t in DERIVED_TABLES:
+        con.execute(f"DROP TABLE IF EXISTS {t};")
+    for sql in DDL:
+        con.execute(sql)
+    merge_aggregates(con, "fact_events")
+    con.execute("CREATE OR REPLACE TEMP TABLE session_cut AS "
+                "SELECT user_id, MIN(timestamp) AS from_ts FROM fact_events GROUP BY user_id;")
+    con.execute(f"INSERT INTO user_sessions {_sessionize('session_cut', gap_minutes)};")
+    con.execute("DROP TABLE session_cut;")
+    con.execute("INSERT OR REPLACE INTO derived_state VALUES ('session_gap_minutes', ?);", [str(gap_minutes)])
@@ -1,45 +1,272 @@
-import pandas as pd
-import json
+"""JSON / NDJSON логи → silver (Parquet по date=) → fact_events, лише нові дані.
+
+    python 05_json_logs_to_duckdb/flows/flow.py
+
+У data_raw/ підхоплюються logs.json (JSON-масив), *.ndjson / *.jsonl і їхні .gz версії.
+Файли читає DuckDB (read_json, потоково, без Python dict на кожну подію). Стан у таблиці
+ingest_state: для NDJSON, що дописується, запам'ятовується байтовий offset після останнього
+повного рядка — наступний запуск читає лише хвіст. Переписаний файл (змінився вміст до offset,
+або змінився .gz / .json) перезавантажується: його рядки й silver-частини видаляються.
+
+Файли silver не відкочуються разом з транзакцією DuckDB, тому нові частини пишуться в
+data_silver/_staging/<token>/, а в тій самій транзакції — рядок silver_publish. Лише після COMMIT
+старі частини файлу видаляються, а нові переносяться на місце (publish). Збій до COMMIT лишає
+silver і каталог як були; збій після COMMIT — наступний запуск доробляє publish за silver_publish.
+"""
 from pathlib import Path
+import hashlib
+import shutil
+import tempfile
+import os
+import uuid
+
 import duckdb
 
-RAW_FILE = Path("05_json_logs_to_duckdb/data_raw/logs.json")
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.manifest import file_hash  # noqa
+from utils.metrics import pipeline, stage  # noqa
+from utils.schema import Column, Schema, duckdb_columns  # noqa
+from utils.catalog import CATALOG_FILE, Catalog  # noqa
+from utils.duck import connect  # noqa
+from derived import SESSION_GAP_MINUTES, apply_batch, create_derived, rebuild_derived  # noqa
+
+RAW_DIR = Path("05_json_logs_to_duckdb/data_raw")
 SILVER_DIR = Path("05_json_logs_to_duckdb/data_silver")
 DB_PATH = "05_json_logs_to_duckdb/warehouse.duckdb"
 
-def main():
-    if not RAW_FILE.exists():
-        print(f"❌ Raw file not found: {RAW_FILE}")
-        return
+PATTERNS = ["*.json", "*.ndjson", "*.jsonl", "*.json.gz", "*.ndjson.gz", "*.jsonl.gz"]
+APPENDABLE = (".ndjson", ".jsonl")   # нестиснений NDJSON можна дочитувати з offset
+# задекларована схема подій: read_json отримує типи явно й розбирає лише ці ключі
+EVENTS_SCHEMA = Schema("events", (
+    Column("user_id", "int32"),
+    Column("event", "string"),
+    Column("timestamp", "timestamp"),
+))
+COLUMNS = duckdb_columns(EVENTS_SCHEMA)
+TAIL_BLOCK = 1 << 20                 # скільки байт перед offset хешуємо для перевірки "лише дописано"
+COPY_BLOCK = 16 << 20
+
+def _lit(path: Path | str) -> str:
+    return "'" + Path(path).as_posix().replace("'", "''") + "'"
 
-    # Read JSON
-    with open(RAW_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def raw_files(raw_dir: Path = RAW_DIR) -> list[Path]:
+    return sorted({f for p in PATTERNS for f in raw_dir.glob(p) if f.is_file()})
 
-    df = pd.DataFrame(data)
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
+def source_id(key: str) -> str:
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
 
-    # Save to Parquet (silver)
-    SILVER_DIR.mkdir(parents=True, exist_ok=True)
-    parquet_file = SILVER_DIR / "events.parquet"
-    df.to_parquet(parquet_file, index=False)
-    print(f"✅ Silver saved: {parquet_file}")
+def complete_end(path: Path, size: int) -> int:
+    """Байт після останнього '\\n' (незавершений рядок, який ще пишуть, не читаємо)."""
+    with path.open("rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(1 << 16, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            i = block.rfind(b"\n")
+            if i >= 0:
+                return pos - step + i + 1
+            pos -= step
+    return 0
 
-    # Load into DuckDB
-    con = duckdb.connect(DB_PATH)
+def tail_hash(path: Path, offset: int) -> str:
+    with path.open("rb") as f:
+        f.seek(max(0, offset - TAIL_BLOCK))
+        return hashlib.sha256(f.read(min(offset, TAIL_BLOCK))).hexdigest()
+
+def content_hash(path: Path, end: int) -> str:
+    # NDJSON: хвіст перед offset (перевірка "лише дописано"); .json/.gz: весь файл
+    return tail_hash(path, end) if path.name.endswith(APPENDABLE) else file_hash(path)
+
+def copy_range(path: Path, start: int, end: int, out: Path):
+    # потоково, блоками: хвіст мультигігабайтного файлу не вантажимо в пам'ять
+    with path.open("rb") as src, out.open("wb") as dst:
+        src.seek(start)
+        left = end - start
+        while left:
+            block = src.read(min(COPY_BLOCK, left))
+            if not block:
+                break
+            dst.write(block)
+            left -= len(block)
+
+def create_tables(con: duckdb.DuckDBPyConnection):
     con.execute("""
     CREATE TABLE IF NOT EXISTS fact_events (
       user_id INTEGER,
       event TEXT,
-      timestamp TIMESTAMP
+      timestamp TIMESTAMP,
+      source_file TEXT
     );
     """)
+    # warehouse, створений до інкрементального завантаження
+    con.execute("ALTER TABLE fact_events ADD COLUMN IF NOT EXISTS source_file TEXT;")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_state (
+      path TEXT PRIMARY KEY,
+      size BIGINT,
+      mtime_ns BIGINT,
+      "offset" BIGINT,
+      tail_sha256 TEXT,
+      rows BIGINT,
+      loaded_at TIMESTAMP
+    );
+    """)
+    # частини silver, закомічені в DuckDB, але ще не перенесені з _staging/ (див. publish)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS silver_publish (
+      token TEXT PRIMARY KEY,
+      source_file TEXT,
+      mode TEXT
+    );
+    """)
+
+def plan(f: Path, state: dict) -> tuple[str, int, int] | None:
+    """(mode, start, end) для файлу: 'new' | 'append' | 'reload' | 'touch'; None — нічого нового."""
+    st = f.stat()
+    key = f.as_posix()
+    prev = state.get(key)
+    if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+        return None
+    appendable = f.name.endswith(APPENDABLE)
+    end = complete_end(f, st.st_size) if appendable else st.st_size
+    if prev is None:
+        return ("new", 0, end) if end else None
+    if appendable and st.st_size >= prev["offset"] and tail_hash(f, prev["offset"]) == prev["tail_sha256"]:
+        return ("append", prev["offset"], end) if end > prev["offset"] else None
+    if not appendable and file_hash(f) == prev["tail_sha256"]:
+        return "touch", 0, end  # той самий вміст, новий mtime: лише оновити стан
+    return "reload", 0, end
+
+def staging_dir(silver_dir: Path, token: str) -> Path:
+    return silver_dir / "_staging" / token
+
+def drop_parts(key: str, silver_dir: Path, keep: str | None = None):
+    """Silver-частини файлу (крім частин завантаження keep) → видалити й прибрати з каталогу."""
+    parts = [p for p in silver_dir.glob(f"date=*/part-{source_id(key)}-*.parquet")
+             if keep is None or f"-{keep}-" not in p.name]
+    for part in parts:
+        part.unlink()
+        if not any(part.parent.iterdir()):
+            part.parent.rmdir()
+    if parts:
+        Catalog(silver_dir / CATALOG_FILE).unregister(parts)
+
+def publish(con: duckdb.DuckDBPyConnection, silver_dir: Path, token: str, key: str, mode: str):
+    """Після COMMIT: reload — видалити старі частини; нові — з _staging/ на місце і в каталог.
+    Повторний виклик (після збою посередині) безпечний: частини цього token не видаляються."""
+    if mode == "reload":
+        drop_parts(key, silver_dir, keep=token)
+    staged = staging_dir(silver_dir, token)
+    cat = Catalog(silver_dir / CATALOG_FILE)
+    # статистика нових частин (рядки, схема, min/max timestamp і user_id) — у каталог silver;
+    # date у файл не пишеться (PARTITION_BY), тож діапазон дат фільтрується по timestamp
+    for part in sorted(staged.glob("date=*/*.parquet")):
+        dest = silver_dir / part.parent.name / part.name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part, dest)
+        cat.register(dest, "events")
+    shutil.rmtree(staged, ignore_errors=True)
+    con.execute("DELETE FROM silver_publish WHERE token = ?;", [token])
+
+def recover_staging(con: duckdb.DuckDBPyConnection, silver_dir: Path):
+    """Закомічені, але не перенесені частини — доперенести; решта _staging/ — від відкоченого запуску."""
+    for token, key, mode in con.execute("SELECT token, source_file, mode FROM silver_publish ORDER BY token").fetchall():
+        publish(con, silver_dir, token, key, mode)
+    shutil.rmtree(silver_dir / "_staging", ignore_errors=True)
+
+def ingest(con: duckdb.DuckDBPyConnection, f: Path, mode: str, start: int, end: int,
+           silver_dir: Path, tmp_dir: Path, token: str, gap_minutes: int = SESSION_GAP_MINUTES) -> int:
+    """Один файл (або його хвіст) → _staging/<token>/date=*/ + append у fact_events, у транзакції
+    викликача (publish — після COMMIT); повертає кількість рядків."""
+    key = f.as_posix()
+    src = f
+    if start or (f.name.endswith(APPENDABLE) and end < f.stat().st_size):
+        src = tmp_dir / f"{source_id(key)}-{start}{''.join(f.suffixes)}"
+        copy_range(f, start, end, src)
+
+    if mode == "reload":
+        con.execute("DELETE FROM fact_events WHERE source_file = ?;", [key])
+    con.execute("INSERT INTO silver_publish VALUES (?, ?, ?);", [token, key, mode])
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE batch AS
+        SELECT user_id, event, timestamp, CAST(timestamp AS DATE) AS date
+        FROM read_json({_lit(src)}, columns={COLUMNS});
+    """)
+    n = con.execute("SELECT COUNT(*) FROM batch").fetchone()[0]
+    if n:
+        # ім'я частини: файл + offset + token завантаження — у silver видно, звідки кожна частина
+        staging_dir(silver_dir, token).parent.mkdir(parents=True, exist_ok=True)
+        con.execute(f"""
+            COPY batch TO {_lit(staging_dir(silver_dir, token))}
+            (FORMAT parquet, COMPRESSION zstd, PARTITION_BY (date), OVERWRITE_OR_IGNORE,
+             FILENAME_PATTERN 'part-{source_id(key)}-{token}-{{i}}');
+        """)
+        con.execute("INSERT INTO fact_events SELECT user_id, event, timestamp, ? FROM batch;", [key])
+    # похідні таблиці: лише нові події; після перезавантаження файлу старих рядків уже немає — з нуля
+    with stage("derived", rows_in=n, mode=mode):
+        if mode == "reload":
+            rebuild_derived(con, gap_minutes)
+        elif n:
+            apply_batch(con, "batch", gap_minutes)
+    con.execute("DROP TABLE batch;")
+    if src != f:
+        src.unlink()
+    return n
+
+@pipeline("05_json_logs_to_duckdb")
+def main(raw_dir: Path = RAW_DIR, silver_dir: Path = SILVER_DIR, db_path: str = DB_PATH,
+         gap_minutes: int = SESSION_GAP_MINUTES):
+    files = raw_files(raw_dir)
+    if not files:
+        print(f"❌ No raw files in: {raw_dir}")
+        return
+
+    silver_dir.mkdir(parents=True, exist_ok=True)
+    con = connect(db_path)  # чекає, поки читач (QueryService) відпустить файл
+    create_tables(con)
+    create_derived(con, gap_minutes)
+    recover_staging(con, silver_dir)
+    state = {r[0]: {"size": r[1], "mtime_ns": r[2], "offset": r[3], "tail_sha256": r[4], "rows": r[5]}
+             for r in con.execute('SELECT path, size, mtime_ns, "offset", tail_sha256, rows FROM ingest_state').fetchall()}
 
-    con.execute("DELETE FROM fact_events;")  # overwrite
-    con.execute(f"INSERT INTO fact_events SELECT * FROM read_parquet('{parquet_file}');")
+    loaded = 0
+    tmp_dir = Path(tempfile.mkdtemp(prefix="logs_tail_"))
+    try:
+        for f in files:
+            key = f.as_posix()
+            st = f.stat()
+            step = plan(f, state)
+            if step is None:
+                continue
+            mode, start, end = step
+            con.execute("BEGIN TRANSACTION;")
+            token = None if mode == "touch" else f"{start}-{uuid.uuid4().hex[:8]}"
+            try:
+                with stage("ingest", file=f.name, mode=mode, bytes=end - start) as ms:
+                    n = 0 if token is None else ingest(con, f, mode, start, end, silver_dir, tmp_dir, token, gap_minutes)
+                    ms.rows_out = n
+                rows = n + (state[key]["rows"] if mode in ("append", "touch") else 0)
+                con.execute("INSERT OR REPLACE INTO ingest_state VALUES (?, ?, ?, ?, ?, ?, now());",
+                            [key, st.st_size, st.st_mtime_ns, end, content_hash(f, end), rows])
+                con.execute("COMMIT;")
+            except Exception:
+                con.execute("ROLLBACK;")
+                if token:
+                    shutil.rmtree(staging_dir(silver_dir, token), ignore_errors=True)
+                raise
+            if token:
+                publish(con, silver_dir, token, key, mode)
+            loaded += n
+            if mode != "touch":
+                print(f"✅ {mode}: {f.name} [{start}:{end}] → {n} rows")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
     cnt = con.execute("SELECT COUNT(*) FROM fact_events;").fetchone()[0]
-    print(f"✅ Loaded into DuckDB: {cnt} rows")
+    print(f"✅ Loaded into DuckDB: +{loaded} rows, fact_events={cnt}")
     con.close()
 
 if __name__ == "__main__":
@@ -59,4 +59,35 @@ SELECT
   COUNT(*)                                       AS users_total,
   COUNT(*) FILTER (WHERE first_login IS NOT NULL) AS users_logged,
   COUNT(*) FILTER (WHERE first_login IS NOT NULL AND first_purchase IS NOT NULL
-                   AND DATE_TRUNC('day', first_login)=DATE_TRUNC('day', first_purchase)) AS users_purchased_same_day;
+                   AND DATE_TRUNC('day', first_login)=DATE_TRUNC('day', first_purchase)) AS users_purchased_same_day
+FROM per_user;
+
+-- ===== Ті самі звіти по похідних таблицях (ведуться лоадером інкрементально, flows/derived.py)
+
+-- DAU
+SELECT d, COUNT(*) AS dau
+FROM user_day
+GROUP BY d
+ORDER BY d DESC;
+
+-- Ретеншн: чи повертався користувач після першого дня
+SELECT CAST(last_ts AS DATE) > CAST(first_ts AS DATE) AS returned_later, COUNT(*) AS users
+FROM user_first_seen
+GROUP BY returned_later;
+
+-- Фанел login -> purchase в межах 1 дня
+SELECT
+  (SELECT COUNT(*) FROM user_first_seen) AS users_total,
+  COUNT(*)                               AS users_logged,
+  COUNT(*) FILTER (WHERE p.first_ts IS NOT NULL
+                   AND DATE_TRUNC('day', l.first_ts) = DATE_TRUNC('day', p.first_ts)) AS users_purchased_same_day
+FROM user_event_first l
+LEFT JOIN user_event_first p ON p.user_id = l.user_id AND p.event = 'purchase'
+WHERE l.event = 'login';
+
+-- Сесії (розрив > 30 хв): кількість і середня тривалість по днях
+SELECT CAST(session_start AS DATE) AS d, COUNT(*) AS sessions,
+       AVG(session_end - session_start) AS avg_duration, AVG(events) AS avg_events
+FROM user_sessions
+GROUP BY d
+ORDER BY d DESC;
@@ -0,0 +1,48 @@
+from pathlib import Path
+import random
+import sys
+
+import duckdb
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "flows"))
+from derived import DERIVED_TABLES, apply_batch, create_derived, rebuild_derived  # noqa: E402
+
+FACT_DDL = "CREATE TABLE fact_events (user_id INTEGER, event TEXT, timestamp TIMESTAMP);"
+
+def _events(n: int, seed: int = 7) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    start = pd.Timestamp("2024-01-01")
+    return pd.DataFrame({
+        "user_id": [rnd.randint(1, 15) for _ in range(n)],
+        "event": [rnd.choice(["view", "login", "cart", "buy"]) for _ in range(n)],
+        # хвилини впереміш: кожен батч несе і нові, і пізні (старші за вже завантажені) події
+        "timestamp": [start + pd.Timedelta(minutes=rnd.randint(0, 3 * 24 * 60)) for _ in range(n)],
+    })
+
+def _snapshot(con) -> dict[str, list[tuple]]:
+    return {t: sorted(con.execute(f"SELECT * FROM {t}").fetchall()) for t in DERIVED_TABLES}
+
+@pytest.mark.parametrize("gap_minutes", [30, 240])
+def test_incremental_batches_match_full_rebuild(gap_minutes: int):
+    events = _events(3000)
+    con = duckdb.connect()
+    con.execute(FACT_DDL)
+    create_derived(con, gap_minutes)
+    for batch in (events.iloc[:1000], events.iloc[1000:1900], events.iloc[1900:2950], events.iloc[2950:]):
+        con.register("batch", batch)
+        con.execute("INSERT INTO fact_events SELECT * FROM batch;")
+        apply_batch(con, "batch", gap_minutes)
+        con.unregister("batch")
+    incremental = _snapshot(con)
+    con.close()
+
+    full = duckdb.connect()
+    full.execute(FACT_DDL)
+    full.register("events", events)
+    full.execute("INSERT INTO fact_events SELECT * FROM events;")
+    rebuild_derived(full, gap_minutes)
+    assert incremental == _snapshot(full)
+    assert sum(r[-1] for r in incremental["user_sessions"]) == len(events)
+    full.close()
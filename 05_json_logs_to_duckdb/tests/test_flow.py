@@ -0,0 +1,39 @@
+from pathlib import Path
+import json
+import sys
+
+import duckdb
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "flows"))  # flow.py imports derived.py
+import flow  # noqa: E402
+
+def _write(path: Path, events: list[tuple[int, str, str]]):
+    path.write_text("".join(json.dumps({"user_id": u, "event": e, "timestamp": t}) + "\n" for u, e, t in events))
+
+def _run(tmp_path: Path):
+    flow.main(raw_dir=tmp_path / "raw", silver_dir=tmp_path / "silver", db_path=str(tmp_path / "wh.duckdb"))
+
+def test_failed_reload_keeps_silver_parts_and_catalog(tmp_path: Path, monkeypatch):
+    (tmp_path / "raw").mkdir()
+    log = tmp_path / "raw" / "a.json"
+    _write(log, [(1, "view", "2024-01-01 10:00:00"), (2, "buy", "2024-01-02 11:00:00")])
+    _run(tmp_path)
+    silver = tmp_path / "silver"
+    before = sorted(silver.glob("date=*/*.parquet"))
+    cat = flow.Catalog(silver / flow.CATALOG_FILE)
+    assert len(before) == 2 and cat.files("events") == before
+
+    _write(log, [(3, "view", "2024-01-03 09:00:00")])
+    monkeypatch.setattr(flow, "rebuild_derived", lambda *a, **k: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        _run(tmp_path)
+    assert sorted(silver.glob("date=*/*.parquet")) == before and cat.files("events") == before
+    assert not any((silver / "_staging").rglob("*.parquet"))
+    with duckdb.connect(str(tmp_path / "wh.duckdb")) as con:
+        assert con.execute("SELECT count(*) FROM fact_events").fetchone()[0] == 2
+
+    monkeypatch.undo()
+    _run(tmp_path)
+    after = sorted(silver.glob("date=*/*.parquet"))
+    assert [p.parent.name for p in after] == ["date=2024-01-03"] and cat.files("events") == after
@@ -0,0 +1,67 @@
+"""Порівняння двох шляхів 06: pandas (load_inputs → transform_to_eur → upsert_warehouse)
+проти merge_in_duckdb (усе в SQL).
+
+    python 06_merge_csv_api_duckdb/flows/benchmark.py --rows 5000000
+"""
+from pathlib import Path
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from flow import RATES_PATH, load_inputs, transform_to_eur, upsert_warehouse, merge_in_duckdb
+
+def make_transactions(path: Path, rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "user_id": rng.integers(1, 100_000, rows),
+        "amount": rng.integers(1, 1_000, rows),
+        "currency": rng.choice(["USD", "GBP", "UAH", "EUR"], rows),
+        "date": (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 200, rows), unit="D")).strftime("%Y-%m-%d"),
+    }).to_csv(path, index=False)
+
+def run_pandas(csv: Path, db: Path):
+    tx, rates = load_inputs(csv, RATES_PATH)
+    upsert_warehouse(transform_to_eur(tx, rates), rates, db)
+
+def run_duckdb(csv: Path, db: Path):
+    merge_in_duckdb(csv, RATES_PATH, db)
+
+def measure(fn, csv: Path, db: Path) -> tuple[float, float]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn(csv, db)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench06_"))
+    try:
+        csv = tmp / "transactions.csv"
+        make_transactions(csv, args.rows)
+        results = {}
+        for name, fn in (("pandas", run_pandas), ("duckdb", run_duckdb)):
+            db = tmp / f"{name}.duckdb"
+            results[name] = measure(fn, csv, db)
+            results[name] += (duckdb.connect(str(db)).execute(
+                "SELECT SUM(amount_eur) FROM fact_transactions").fetchone()[0],)
+
+        print(f"rows={args.rows:,}")
+        for name, (sec, peak, total) in results.items():
+            print(f"{name:>7}: {sec:7.2f}s  {args.rows / sec:12,.0f} rows/s  py-heap peak={peak:8.1f} MB  sum={total:,.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,42 @@
 from pathlib import Path
+import argparse
 import json
 import pandas as pd
+import pyarrow as pa
 import duckdb
 
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.fx import convert_to_eur  # noqa
+from utils.duck import connect, rates_view, tx_eur_query  # noqa
+from utils.warehouse import TX_SCHEMA, create_tables, load_batch, merge_facts, upsert_dim_currency, rollback_batch  # noqa
+from utils.metrics import pipeline, staged  # noqa
+from utils.dtypes import compact  # noqa
+from utils.schema import read_csv, to_pandas  # noqa
+
 CSV_PATH = Path("06_merge_csv_api_duckdb/data_raw/transactions.csv")
 RATES_PATH = Path("06_merge_csv_api_duckdb/data_raw/rates.json")
 DB_PATH = Path("06_merge_csv_api_duckdb/warehouse.duckdb")
+TX_DTYPES = {"currency": "category", "date": "date"}
+
+def check_inputs(csv_path: Path = CSV_PATH, rates_path: Path = RATES_PATH):
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Missing CSV: {csv_path}")
+    if not rates_path.exists():
+        raise FileNotFoundError(f"Missing JSON: {rates_path}")
 
-def load_inputs():
-    if not CSV_PATH.exists():
-        raise FileNotFoundError(f"Missing CSV: {CSV_PATH}")
-    if not RATES_PATH.exists():
-        raise FileNotFoundError(f"Missing JSON: {RATES_PATH}")
+@staged("extract", rows_out=lambda r: len(r[0]))
+def load_inputs(csv_path: Path = CSV_PATH, rates_path: Path = RATES_PATH):
+    check_inputs(csv_path, rates_path)
 
-    tx = pd.read_csv(CSV_PATH)
-    tx["date"] = pd.to_datetime(tx["date"]).dt.date
+    # типи задекларовані (TX_SCHEMA): pyarrow парсить date одразу в date32, без другого проходу
+    tx = to_pandas(read_csv(csv_path, TX_SCHEMA))
     tx["currency"] = tx["currency"].str.upper()
+    # currency — словникова, user_id/amount — найвужчий тип без втрат
+    tx = compact(tx, TX_DTYPES)
 
-    with open(RATES_PATH, "r", encoding="utf-8") as f:
+    with open(rates_path, "r", encoding="utf-8") as f:
         payload = json.load(f)
 
     base = payload.get("base", "EUR")
@@ -28,66 +47,102 @@ def load_inputs():
         raise ValueError("No rates found in rates.json")
     return tx, rates
 
-def transform_to_eur(tx: pd.DataFrame, rates: dict) -> pd.DataFrame:
-    # перевіримо, чи всі валюти покриті
-    missing = sorted(set(tx["currency"]) - set(rates.keys()))
-    if missing:
-        raise ValueError(f"Missing rates for currencies: {missing}")
-
+@staged("transform")
+def transform_to_eur(tx: pd.DataFrame, rates: dict | pd.DataFrame) -> pd.DataFrame:
     # amount_eur = amount / rate (бо base=EUR → rates[currency] = currency_per_EUR)
-    tx["amount_eur"] = tx.apply(lambda r: float(r["amount"]) / float(rates[r["currency"]]), axis=1)
-    out = tx[["user_id", "amount_eur", "date"]].copy()
-    out["amount_eur"] = out["amount_eur"].round(2)
-    return out
-
-def upsert_warehouse(fact_df: pd.DataFrame, rates: dict):
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(str(DB_PATH))
-
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS dim_currency (
-        symbol TEXT PRIMARY KEY,
-        rate_to_eur DOUBLE
-    );
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS fact_transactions (
-        user_id INTEGER,
-        amount_eur DOUBLE,
-        date DATE
-    );
-    """)
-
-    # оновимо dim_currency (rate_to_eur — множник для конвертації currency→EUR)
-    # тут rate_to_eur = 1 / rates[currency per EUR]  (для EUR → 1.0)
+    # rates: знімок {currency: rate} або таблиця (date, currency, rate) з as-of join;
+    # усі відсутні валюти/дати повертаються однією помилкою.
+    # Колонки джерела лишаються: з них рахується ключ рядка (tx_key) при завантаженні
+    return tx.assign(amount_eur=convert_to_eur(tx, rates).round(2))
+
+def dim_rows(rates: dict) -> pa.Table:
+    # rate_to_eur — множник для конвертації currency→EUR:
+    # rate_to_eur = 1 / rates[currency per EUR]  (для EUR → 1.0)
     rows = []
     for sym, rate in rates.items():
         if rate == 0:
             continue
         rate_to_eur = 1.0 / float(rate) if sym != "EUR" else 1.0
         rows.append((sym, rate_to_eur))
-    dim_df = pd.DataFrame(rows, columns=["symbol", "rate_to_eur"])
+    return pa.table({"symbol": [r[0] for r in rows], "rate_to_eur": [r[1] for r in rows]})
 
-    con.execute("DELETE FROM dim_currency;")
-    con.register("dim_df", dim_df)
-    con.execute("INSERT INTO dim_currency SELECT * FROM dim_df;")
-    con.unregister("dim_df")
+def report(con: duckdb.DuckDBPyConnection, b) -> int:
+    cnt = con.execute("SELECT COUNT(*) FROM fact_transactions;").fetchone()[0]
+    cur_cnt = con.execute("SELECT COUNT(*) FROM dim_currency;").fetchone()[0]
+    print(f"✅ Loaded batch {b.batch_id}: +{b.inserted} new, {b.updated} updated, {b.deleted} deleted, {b.unchanged} unchanged "
+          f"→ fact_transactions={cnt}, dim_currency={cur_cnt}")
+    return cnt
+
+@staged("load", rows_out=lambda n: n)
+def upsert_warehouse(fact_df: pd.DataFrame, rates: dict, db_path: Path = DB_PATH, source: str = str(CSV_PATH)):
+    """Ключований upsert (utils.warehouse): одна транзакція-батч, dim_currency оновлюється на місці,
+    факти зливаються через INSERT ... ON CONFLICT (tx_key) DO UPDATE — без DELETE всієї таблиці."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = connect(db_path)
+    create_tables(con)
 
-    # перезапис фактів для простоти
-    con.execute("DELETE FROM fact_transactions;")
+    con.register("dim_df", dim_rows(rates))
     con.register("facts", fact_df)
-    con.execute("INSERT INTO fact_transactions SELECT * FROM facts;")
+    with load_batch(con, source) as b:
+        upsert_dim_currency(con, "SELECT symbol, rate_to_eur FROM dim_df")
+        merge_facts(con, b, "SELECT * FROM facts")
     con.unregister("facts")
+    con.unregister("dim_df")
 
-    cnt = con.execute("SELECT COUNT(*) FROM fact_transactions;").fetchone()[0]
-    cur_cnt = con.execute("SELECT COUNT(*) FROM dim_currency;").fetchone()[0]
-    print(f"✅ Loaded: fact_transactions={cnt}, dim_currency={cur_cnt}")
+    cnt = report(con, b)
+    con.close()
+    return cnt
+
+@staged("merge_in_duckdb", rows_out=lambda n: n)
+def merge_in_duckdb(csv_path: Path = CSV_PATH, rates_path: Path = RATES_PATH, db_path: Path = DB_PATH):
+    """Те саме, що load_inputs → transform_to_eur → upsert_warehouse, але повністю в DuckDB:
+    CSV читається через read_csv_auto, rates.json — як relation, join + ROUND одразу в stage батча."""
+    check_inputs(csv_path, rates_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = connect(db_path)
+    create_tables(con)
+
+    rates_view(con, rates_path)
+    with load_batch(con, str(csv_path)) as b:
+        # dim_currency прямо з relation (rate_to_eur = 1 / rate, для EUR → 1.0)
+        upsert_dim_currency(con, """
+            SELECT currency, CASE WHEN currency = 'EUR' THEN 1.0 ELSE 1.0 / rate END
+            FROM v_rates WHERE rate <> 0
+        """)
+        merge_facts(con, b, tx_eur_query(con, csv_path, schema=TX_SCHEMA))
+
+    cnt = report(con, b)
     con.close()
+    return cnt
+
+def rollback(db_path: Path = DB_PATH, batch_id: int | None = None) -> int:
+    """Відкочує останній закомічений батч (вставлені рядки видаляються, оновлені — відновлюються)."""
+    con = connect(db_path)
+    try:
+        batch_id = rollback_batch(con, batch_id)
+        cnt = con.execute("SELECT COUNT(*) FROM fact_transactions;").fetchone()[0]
+    finally:
+        con.close()
+    print(f"↩️ Rolled back batch {batch_id}: fact_transactions={cnt}")
+    return batch_id
 
-def main():
+@pipeline("06_merge_csv_api_duckdb")
+def main(engine: str = "duckdb"):
+    # engine="duckdb" — все в SQL; engine="pandas" — попередній шлях через DataFrame
+    if engine == "duckdb":
+        merge_in_duckdb()
+        return
     tx, rates = load_inputs()
     fact_df = transform_to_eur(tx, rates)
     upsert_warehouse(fact_df, rates)
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", choices=["duckdb", "pandas"], default="duckdb")
+    ap.add_argument("--rollback", nargs="?", type=int, const=-1, default=None, metavar="BATCH_ID",
+                    help="відкотити останній батч (або вказаний, якщо він останній) замість завантаження")
+    args = ap.parse_args()
+    if args.rollback is not None:
+        rollback(batch_id=None if args.rollback == -1 else args.rollback)
+    else:
+        main(args.engine)
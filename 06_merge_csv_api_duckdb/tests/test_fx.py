@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.dtypes import compact
+from utils.fx import convert_to_eur, rates_frame
+
+def _tx(rows: list[tuple[str, str, float]]) -> pd.DataFrame:
+    # як у пайплайні: date — date32, currency — category
+    df = pd.DataFrame(rows, columns=["date", "currency", "amount"])
+    return compact(df, {"date": "date", "currency": "category"})
+
+RATES = pd.concat([
+    rates_frame({"base": "EUR", "date": "2025-01-01", "rates": {"usd": 1.25, "gbp": 0.8}}),
+    rates_frame({"base": "EUR", "date": "2025-01-03", "rates": {"usd": 2.0}}),
+], ignore_index=True)
+
+def test_asof_uses_latest_rate_on_or_before_each_row_date():
+    tx = _tx([("2025-01-05", "USD", 10.0), ("2025-01-02", "USD", 10.0),
+              ("2025-01-03", "USD", 10.0), ("2025-01-04", "GBP", 8.0)])
+    assert convert_to_eur(tx, RATES).tolist() == [5.0, 8.0, 5.0, 10.0]  # порядок рядків збережено
+
+def test_all_missing_currency_date_pairs_in_one_error():
+    tx = _tx([("2025-01-02", "USD", 1.0), ("2024-12-31", "USD", 1.0),
+              ("2025-01-02", "JPY", 1.0), ("2025-01-02", "JPY", 1.0)])
+    with pytest.raises(ValueError, match="Missing rates for 2 currency/date pairs") as err:
+        convert_to_eur(tx, RATES)
+    lines = str(err.value).splitlines()
+    assert any("USD" in l and "2024-12-31" in l and l.split()[-1] == "1" for l in lines)
+    assert any("JPY" in l and "2025-01-02" in l and l.split()[-1] == "2" for l in lines)
@@ -0,0 +1,96 @@
+import duckdb
+import pandas as pd
+import pytest
+
+import flows.flow  # noqa: F401  (puts 00_common on sys.path)
+from utils.warehouse import UNDO_BATCHES, create_tables, load_batch, merge_facts, rollback_batch
+
+A = (1, 10.0, "USD", "2025-01-01", 9.09)
+B = (2, 20.0, "GBP", "2025-01-02", 23.0)
+C = (3, 30.0, "EUR", "2025-01-03", 30.0)
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    create_tables(con)
+    yield con
+    con.close()
+
+def load(con, rows, key=None):
+    con.register("src", pd.DataFrame(rows, columns=["user_id", "amount", "currency", "date", "amount_eur"]))
+    with load_batch(con, "transactions.csv") as b:
+        merge_facts(con, b, "SELECT * FROM src", key=key)
+    return b
+
+def facts(con):
+    return con.execute("SELECT user_id, amount_eur, batch_id FROM fact_transactions ORDER BY user_id, tx_key").fetchall()
+
+def test_new_changed_unchanged_counts_and_rollback(con):
+    b1 = load(con, [A, A, B])  # два однакові рядки лишаються двома: ключ n-го = хеш + (n - 1)
+    assert (b1.staged, b1.inserted, b1.updated) == (3, 3, 0)
+    keys = [k for k, in con.execute("SELECT tx_key FROM fact_transactions WHERE user_id = 1 ORDER BY tx_key").fetchall()]
+    assert keys[1] - keys[0] == 1
+
+    b2 = load(con, [A, A, B[:4] + (25.0,), C])
+    assert (b2.staged, b2.inserted, b2.updated, b2.unchanged) == (4, 1, 1, 2)
+    assert facts(con) == [(1, 9.09, b1.batch_id), (1, 9.09, b1.batch_id), (2, 25.0, b2.batch_id), (3, 30.0, b2.batch_id)]
+
+    assert rollback_batch(con) == b2.batch_id
+    assert facts(con) == [(1, 9.09, b1.batch_id), (1, 9.09, b1.batch_id), (2, 23.0, b1.batch_id)]
+    assert con.execute("SELECT status FROM load_batches ORDER BY batch_id").fetchall() == [("committed",), ("rolled_back",)]
+
+def test_failed_batch_is_marked_and_changes_nothing(con):
+    load(con, [A])
+    with pytest.raises(ValueError, match="Duplicate natural keys"):
+        load(con, [B, B[:4] + (1.0,)], key=["user_id", "date"])
+    assert facts(con) == [(1, 9.09, 1)]
+    assert con.execute("SELECT status FROM load_batches ORDER BY batch_id").fetchall() == [("committed",), ("failed",)]
+    assert con.execute("SELECT COUNT(*) FROM fact_undo").fetchone()[0] == 0
+
+def test_undo_log_keeps_the_last_batches_only(con):
+    for i in range(UNDO_BATCHES + 2):
+        load(con, [B[:4] + (float(i),)])
+    assert con.execute("SELECT DISTINCT batch_id FROM fact_undo ORDER BY 1").fetchall() == [(i,) for i in range(3, UNDO_BATCHES + 3)]
+    for _ in range(UNDO_BATCHES):
+        rollback_batch(con)
+    assert facts(con) == [(2, 1.0, 2)]
+    with pytest.raises(ValueError, match="older than the undo log"):
+        rollback_batch(con)
+
+@pytest.fixture
+def files(tmp_path):
+    rates = tmp_path / "rates.json"
+    rates.write_text('{"base": "EUR", "rates": {"USD": 1.1, "EUR": 1.0}}')
+    return tmp_path / "tx.csv", rates, tmp_path / "wh.duckdb"
+
+def run(files, text, engine):
+    from flows.flow import load_inputs, merge_in_duckdb, transform_to_eur, upsert_warehouse
+    csv, rates, db = files
+    csv.write_text("user_id,amount,currency,date\n" + text)
+    if engine == "duckdb":
+        merge_in_duckdb(csv, rates, db)
+    else:
+        tx, r = load_inputs(csv, rates)
+        upsert_warehouse(transform_to_eur(tx, r), r, db, str(csv))
+    with duckdb.connect(str(db)) as c:
+        return (c.execute("SELECT user_id, amount_eur FROM fact_transactions ORDER BY ALL").fetchall(),
+                c.execute("SELECT inserted, updated, deleted FROM load_batches ORDER BY batch_id DESC LIMIT 1").fetchone())
+
+@pytest.mark.parametrize("engine", ["pandas", "duckdb"])
+def test_key_survives_amount_widening(files, engine):
+    run(files, "1,100,USD,2025-01-01\n2,50,EUR,2025-01-02\n", engine)
+    # дробовий рядок робить amount float: "100" → 100.0, ключі старих рядків не змінюються
+    facts_, counts = run(files, "1,100,USD,2025-01-01\n2,50,EUR,2025-01-02\n3,7.5,EUR,2025-01-03\n", engine)
+    assert counts == (1, 0, 0) and len(facts_) == 3
+
+def test_key_is_the_same_in_both_engines(files):
+    run(files, "1,100.0,USD,2025-01-01\n2,50.0,EUR,2025-01-02\n", "pandas")
+    assert run(files, "1,100.0,USD,2025-01-01\n2,50.0,EUR,2025-01-02\n", "duckdb") == ([(1, 90.91), (2, 50.0)], (0, 0, 0))
+
+def test_edited_row_replaces_the_old_one_and_rolls_back(files):
+    from flows.flow import rollback
+    run(files, "1,100,USD,2025-01-01\n2,50,EUR,2025-01-02\n", "duckdb")
+    assert run(files, "1,10,USD,2025-01-01\n2,50,EUR,2025-01-02\n", "duckdb") == ([(1, 9.09), (2, 50.0)], (1, 0, 1))
+    rollback(files[2])
+    with duckdb.connect(str(files[2])) as c:
+        assert c.execute("SELECT user_id, amount_eur FROM fact_transactions ORDER BY ALL").fetchall() == [(1, 90.91), (2, 50.0)]
@@ -2,26 +2,43 @@ from __future__ import annotations
 from pathlib import Path
 import json
 import pandas as pd
-import duckdb
+import pyarrow as pa
 from prefect import flow, task, get_run_logger
 
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.fx import convert_to_eur  # noqa
+from utils.duck import connect, rates_view, tx_eur_query  # noqa
+from utils.warehouse import TX_SCHEMA, create_tables, load_batch, merge_facts, upsert_dim_currency  # noqa
+from utils.metrics import pipeline, staged  # noqa
+from utils.dtypes import compact  # noqa
+from utils.schema import read_csv, to_pandas  # noqa
+from utils.arrow_results import ARROW_TASK, ARROW_SINK_TASK, prune_results  # noqa
+
 # ---------- ПАРАМЕТРИ ЗА ЗАМОВЧУВАННЯМ (можна змінювати під себе)
 CSV_PATH = Path("06_merge_csv_api_duckdb/data_raw/transactions.csv")
 RATES_PATH = Path("06_merge_csv_api_duckdb/data_raw/rates.json")
 DB_PATH = Path("07_orchestration_prefect/warehouse.duckdb")
+TX_DTYPES = {"currency": "category", "date": "date"}
 
 # ---------- TASKS
+# DataFrame-задачі: результат (лише якщо PREFECT_RESULTS_PERSIST_BY_DEFAULT) — Arrow IPC файл з memory-map, без pickle;
+# ключ кешу для DataFrame-аргументів — хеш буферів колонок; load ніколи не кешується (utils.arrow_results)
 
-@task(retries=2, retry_delay_seconds=5)
+@task(retries=2, retry_delay_seconds=5, **ARROW_TASK)
+@staged("extract", rows_out=lambda r: len(r[0]))
 def load_inputs(csv_path: Path, rates_path: Path) -> tuple[pd.DataFrame, dict]:
     if not csv_path.exists():
         raise FileNotFoundError(f"Missing CSV: {csv_path}")
     if not rates_path.exists():
         raise FileNotFoundError(f"Missing JSON: {rates_path}")
 
-    tx = pd.read_csv(csv_path)
-    tx["date"] = pd.to_datetime(tx["date"]).dt.date
+    # типи задекларовані (TX_SCHEMA): pyarrow парсить date одразу в date32, без другого проходу
+    tx = to_pandas(read_csv(csv_path, TX_SCHEMA))
     tx["currency"] = tx["currency"].str.upper()
+    # currency — словникова, user_id/amount — найвужчий тип без втрат
+    tx = compact(tx, TX_DTYPES)
 
     with open(rates_path, "r", encoding="utf-8") as f:
         payload = json.load(f)
@@ -35,86 +52,106 @@ def load_inputs(csv_path: Path, rates_path: Path) -> tuple[pd.DataFrame, dict]:
 
     return tx, rates
 
-@task
-def transform_to_eur(tx: pd.DataFrame, rates: dict) -> pd.DataFrame:
-    missing = sorted(set(tx["currency"]) - set(rates.keys()))
-    if missing:
-        raise ValueError(f"Missing rates for currencies: {missing}")
-
+@task(**ARROW_TASK)
+@staged("transform")
+def transform_to_eur(tx: pd.DataFrame, rates: dict | pd.DataFrame) -> pd.DataFrame:
     # base=EUR → rates[currency] = units of currency per EUR
-    # amount_eur = amount / rate
-    tx = tx.copy()
-    tx["amount_eur"] = tx.apply(
-        lambda r: float(r["amount"]) / float(rates[r["currency"]]),
-        axis=1
-    )
-    out = tx[["user_id", "amount_eur", "date"]].copy()
-    out["amount_eur"] = out["amount_eur"].round(2)
-    return out
-
-@task
-def load_to_duckdb(fact_df: pd.DataFrame, rates: dict, db_path: Path) -> tuple[int, int]:
+    # amount_eur = amount / rate, векторно для всієї колонки (utils.fx);
+    # rates може бути таблицею (date, currency, rate) — тоді as-of join по даті
+    # колонки джерела лишаються: з них рахується ключ рядка (tx_key) при завантаженні
+    return tx.assign(amount_eur=convert_to_eur(tx, rates).round(2))
+
+# завантаження — ключований upsert батчами (utils.warehouse): одна транзакція на батч,
+# INSERT ... ON CONFLICT (tx_key) DO UPDATE, dim_currency оновлюється на місці;
+# читачі не бачать порожньої таблиці, відкат батчу — utils.warehouse.rollback_batch
+
+@task(**ARROW_SINK_TASK)
+@staged("load", rows_out=lambda r: r[0])
+def load_to_duckdb(fact_df: pd.DataFrame, rates: dict, db_path: Path, source: str = str(CSV_PATH)) -> tuple[int, int]:
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(str(db_path))
-
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS dim_currency (
-        symbol TEXT PRIMARY KEY,
-        rate_to_eur DOUBLE
-    );
-    """)
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS fact_transactions (
-        user_id INTEGER,
-        amount_eur DOUBLE,
-        date DATE
-    );
-    """)
-
-    # оновлюємо довідник валют
+    con = connect(db_path)
+    create_tables(con)
+
+    # довідник валют
     rows = []
     for sym, rate in rates.items():
         if float(rate) == 0.0:
             continue
         rate_to_eur = 1.0 / float(rate) if sym != "EUR" else 1.0
         rows.append((sym, rate_to_eur))
-    dim_df = pd.DataFrame(rows, columns=["symbol", "rate_to_eur"])
+    dim_df = pa.table({"symbol": [r[0] for r in rows], "rate_to_eur": [r[1] for r in rows]})
 
-    con.execute("DELETE FROM dim_currency;")
     con.register("dim_df", dim_df)
-    con.execute("INSERT INTO dim_currency SELECT * FROM dim_df;")
-    con.unregister("dim_df")
-
-    # перезапис фактів для простоти
-    con.execute("DELETE FROM fact_transactions;")
     con.register("facts", fact_df)
-    con.execute("INSERT INTO fact_transactions SELECT * FROM facts;")
+    with load_batch(con, source) as b:
+        upsert_dim_currency(con, "SELECT symbol, rate_to_eur FROM dim_df")
+        merge_facts(con, b, "SELECT * FROM facts")
     con.unregister("facts")
+    con.unregister("dim_df")
+
+    fact_cnt = con.execute("SELECT COUNT(*) FROM fact_transactions;").fetchone()[0]
+    dim_cnt  = con.execute("SELECT COUNT(*) FROM dim_currency;").fetchone()[0]
+    con.close()
+    get_run_logger().info(f"Batch {b.batch_id}: +{b.inserted} new, {b.updated} updated, {b.deleted} deleted, {b.unchanged} unchanged")
+    return fact_cnt, dim_cnt
+
+@task(retries=2, retry_delay_seconds=5)
+@staged("merge_in_duckdb", rows_out=lambda r: r[0])
+def merge_in_duckdb(csv_path: Path, rates_path: Path, db_path: Path) -> tuple[int, int]:
+    """load_inputs → transform_to_eur → load_to_duckdb одним проходом у DuckDB:
+    read_csv_auto + rates.json як relation, join + ROUND одразу в stage батча, без pandas."""
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Missing CSV: {csv_path}")
+    if not rates_path.exists():
+        raise FileNotFoundError(f"Missing JSON: {rates_path}")
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = connect(db_path)
+    create_tables(con)
+
+    rates_view(con, rates_path)
+    with load_batch(con, str(csv_path)) as b:
+        upsert_dim_currency(con, """
+            SELECT currency, CASE WHEN currency = 'EUR' THEN 1.0 ELSE 1.0 / rate END
+            FROM v_rates WHERE rate <> 0
+        """)
+        merge_facts(con, b, tx_eur_query(con, csv_path, schema=TX_SCHEMA))
 
     fact_cnt = con.execute("SELECT COUNT(*) FROM fact_transactions;").fetchone()[0]
     dim_cnt  = con.execute("SELECT COUNT(*) FROM dim_currency;").fetchone()[0]
     con.close()
+    get_run_logger().info(f"Batch {b.batch_id}: +{b.inserted} new, {b.updated} updated, {b.deleted} deleted, {b.unchanged} unchanged")
     return fact_cnt, dim_cnt
 
 # ---------- FLOW
 
 @flow(name="orchestrate-csv-json-to-duckdb")
+@pipeline("07_orchestration_prefect")
 def orchestrate_tx_to_duckdb(
     csv_path: str = str(CSV_PATH),
     rates_path: str = str(RATES_PATH),
     db_path: str = str(DB_PATH),
+    engine: str = "duckdb",
 ):
     logger = get_run_logger()
     logger.info("Starting Project 07 flow…")
 
+    if engine == "duckdb":
+        # усе всередині DuckDB — жодного DataFrame на гарячому шляху
+        fact_cnt, dim_cnt = merge_in_duckdb(Path(csv_path), Path(rates_path), Path(db_path))
+        logger.info(f"Loaded to DuckDB: facts={fact_cnt}, dim={dim_cnt} → {db_path}")
+        logger.info("Flow finished successfully.")
+        return
+
     tx, rates = load_inputs(Path(csv_path), Path(rates_path))
     logger.info(f"Loaded inputs: rows={len(tx)}, rates={len(rates)}")
 
     fact_df = transform_to_eur(tx, rates)
     logger.info(f"Transformed records: {len(fact_df)}")
 
-    fact_cnt, dim_cnt = load_to_duckdb(fact_df, rates, Path(db_path))
+    fact_cnt, dim_cnt = load_to_duckdb(fact_df, rates, Path(db_path), csv_path)
     logger.info(f"Loaded to DuckDB: facts={fact_cnt}, dim={dim_cnt} → {db_path}")
+    prune_results()  # persisted Arrow-результати старших за тиждень / понад 1 ГБ
     logger.info("Flow finished successfully.")
 
 if __name__ == "__main__":
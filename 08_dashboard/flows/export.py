@@ -1,38 +1,164 @@
+"""Експорт warehouse для дашборду (Power BI / Tableau).
+
+    python 08_dashboard/flows/export.py                   # CSV
+    python 08_dashboard/flows/export.py --format parquet
+    python 08_dashboard/flows/export.py --full-refresh    # перерахувати агрегати з нуля
+
+Агрегати (agg_daily_revenue, agg_user_revenue) живуть у самому warehouse і оновлюються
+інкрементально: перераховуються лише ключі з рядками, завантаженими після high-water mark
+(fact_transactions.loaded_at). Файли пишуться через COPY ... TO без pandas і пропускаються,
+якщо відбиток їхнього вмісту не змінився.
+"""
 from pathlib import Path
+import argparse
+import os
+
 import duckdb
-import pandas as pd
+
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.manifest import load_manifest, save_manifest  # noqa
+from utils.metrics import pipeline, stage  # noqa
+from utils.duck import connect  # noqa
 
 # Джерело: вибери те, що актуальніше
-DB_PATH_06 = r"06_merge_csv_api_duckdb\warehouse.duckdb"
-DB_PATH_07 = r"07_orchestration_prefect\warehouse.duckdb"
+DB_PATH_06 = Path("06_merge_csv_api_duckdb") / "warehouse.duckdb"
+DB_PATH_07 = Path("07_orchestration_prefect") / "warehouse.duckdb"
 
 # якщо 07 існує — беремо його; інакше 06
-DB_PATH = DB_PATH_07 if Path(DB_PATH_07).exists() else DB_PATH_06
+DB_PATH = DB_PATH_07 if DB_PATH_07.exists() else DB_PATH_06
 
 OUT_DIR = Path("08_dashboard/data_export")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-con = duckdb.connect(DB_PATH)
-
-# 1) Факти + валюта (на випадок, якщо схему змінювали)
-fact = con.execute("SELECT user_id, amount_eur, date FROM fact_transactions").fetchdf()
-dim  = con.execute("SELECT symbol, rate_to_eur FROM dim_currency").fetchdf()
-
-# 2) Daily revenue (агрегат)
-daily = con.execute("""
-    SELECT date, SUM(amount_eur) AS revenue_eur
-    FROM fact_transactions
-    GROUP BY date
-    ORDER BY date
-""").fetchdf()
-
-# 3) Збереження в CSV (можна додати .parquet, якщо хочеш)
-fact.to_csv(OUT_DIR / "fact_transactions.csv", index=False)
-dim.to_csv(OUT_DIR / "dim_currency.csv", index=False)
-daily.to_csv(OUT_DIR / "daily_revenue.csv", index=False)
-
-print("✅ Exported:",
-      OUT_DIR / "fact_transactions.csv",
-      OUT_DIR / "dim_currency.csv",
-      OUT_DIR / "daily_revenue.csv", sep="\n")
-con.close()
+MANIFEST = ".export_manifest.json"
+
+# rollup -> ключ групування + агрегати (tx_count потрібен для перевірки повноти)
+ROLLUPS = {
+    "agg_daily_revenue": {
+        "key": "date",
+        "ddl": "date DATE PRIMARY KEY, revenue_eur DOUBLE, tx_count BIGINT, users BIGINT",
+        "aggs": "SUM(amount_eur) AS revenue_eur, COUNT(*) AS tx_count, COUNT(DISTINCT user_id) AS users",
+    },
+    "agg_user_revenue": {
+        "key": "user_id",
+        "ddl": "user_id INTEGER PRIMARY KEY, revenue_eur DOUBLE, tx_count BIGINT",
+        "aggs": "SUM(amount_eur) AS revenue_eur, COUNT(*) AS tx_count",
+    },
+}
+
+# файл -> (запит, дешевий відбиток вмісту)
+EXPORTS = {
+    "fact_transactions": (
+        "SELECT user_id, amount_eur, date FROM fact_transactions",
+        # повний хеш факту коштував би стільки ж, скільки експорт: беремо розмір + high-water mark
+        "SELECT COUNT(*), MAX(loaded_at) FROM fact_transactions",
+    ),
+    "dim_currency": ("SELECT symbol, rate_to_eur FROM dim_currency ORDER BY symbol", None),
+    "daily_revenue": ("SELECT date, revenue_eur FROM agg_daily_revenue ORDER BY date", None),
+    "user_revenue": ("SELECT user_id, revenue_eur, tx_count FROM agg_user_revenue ORDER BY user_id", None),
+}
+
+def _lit(path: Path) -> str:
+    return "'" + Path(path).as_posix().replace("'", "''") + "'"
+
+def prepare(con: duckdb.DuckDBPyConnection):
+    # warehouse, завантажений до появи loaded_at: усі наявні рядки отримають час ALTER
+    con.execute("ALTER TABLE fact_transactions ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP DEFAULT current_timestamp;")
+    con.execute("CREATE TABLE IF NOT EXISTS agg_state (name TEXT PRIMARY KEY, high_water TIMESTAMP);")
+    for name, r in ROLLUPS.items():
+        con.execute(f"CREATE TABLE IF NOT EXISTS {name} ({r['ddl']});")
+
+def _rebuild(con: duckdb.DuckDBPyConnection, name: str) -> int:
+    r = ROLLUPS[name]
+    con.execute(f"DELETE FROM {name};")
+    con.execute(f"INSERT INTO {name} SELECT {r['key']}, {r['aggs']} FROM fact_transactions GROUP BY {r['key']};")
+    return con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+def refresh_rollup(con: duckdb.DuckDBPyConnection, name: str, full_refresh: bool = False) -> int:
+    """Перераховує лише ключі, зачеплені новими рядками; повертає кількість перерахованих ключів."""
+    r = ROLLUPS[name]
+    key = r["key"]
+    hw = con.execute("SELECT high_water FROM agg_state WHERE name = ?", [name]).fetchone()
+    new_hw = con.execute("SELECT MAX(loaded_at) FROM fact_transactions").fetchone()[0]
+
+    con.execute("BEGIN TRANSACTION;")
+    try:
+        if full_refresh or hw is None or hw[0] is None:
+            recomputed = _rebuild(con, name)
+        else:
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE touched AS
+                SELECT DISTINCT {key} FROM fact_transactions WHERE loaded_at > ?;
+            """, [hw[0]])
+            con.execute(f"DELETE FROM {name} WHERE {key} IN (SELECT {key} FROM touched);")
+            con.execute(f"""
+                INSERT INTO {name}
+                SELECT {key}, {r['aggs']} FROM fact_transactions
+                WHERE {key} IN (SELECT {key} FROM touched)
+                GROUP BY {key};
+            """)
+            recomputed = con.execute("SELECT COUNT(*) FROM touched").fetchone()[0]
+            # видалення без перезавантаження не видно через loaded_at: тоді розійдуться лічильники
+            agg_rows, fact_rows = con.execute(
+                f"SELECT (SELECT COALESCE(SUM(tx_count), 0) FROM {name}), (SELECT COUNT(*) FROM fact_transactions)"
+            ).fetchone()
+            if agg_rows != fact_rows:
+                recomputed = _rebuild(con, name)
+        con.execute("INSERT OR REPLACE INTO agg_state VALUES (?, ?);", [name, new_hw])
+        con.execute("COMMIT;")
+    except Exception:
+        con.execute("ROLLBACK;")
+        raise
+    return recomputed
+
+def fingerprint(con: duckdb.DuckDBPyConnection, query: str, cheap: str | None, fmt: str) -> str:
+    # невеликі таблиці хешуємо повністю (порядок рядків не важливий)
+    sql = cheap or f"SELECT COUNT(*), bit_xor(hash(q)) FROM ({query}) q"
+    return f"{fmt}|{query}|{con.execute(sql).fetchone()}"
+
+def export(con: duckdb.DuckDBPyConnection, out_dir: Path = OUT_DIR, fmt: str = "csv") -> dict[str, str]:
+    """COPY кожного запиту в out_dir; повертає {назва: 'written' | 'unchanged'}."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    manifest = load_manifest(manifest_path)
+    opts = "FORMAT parquet, COMPRESSION zstd" if fmt == "parquet" else "FORMAT csv, HEADER"
+    status = {}
+    for name, (query, cheap) in EXPORTS.items():
+        out = out_dir / f"{name}.{fmt}"
+        fp = fingerprint(con, query, cheap, fmt)
+        if manifest.get(out.name) == fp and out.exists():
+            status[name] = "unchanged"
+            continue
+        tmp = out.with_name(f".{out.name}.tmp")
+        with stage("export", file=out.name) as st:
+            st.rows_out = con.execute(f"COPY ({query}) TO {_lit(tmp)} ({opts});").fetchone()[0]
+        os.replace(tmp, out)
+        manifest[out.name] = fp
+        save_manifest(manifest, manifest_path)
+        status[name] = "written"
+    return status
+
+@pipeline("08_dashboard")
+def main(db_path: Path = DB_PATH, out_dir: Path = OUT_DIR, fmt: str = "csv", full_refresh: bool = False):
+    con = connect(db_path)
+    try:
+        prepare(con)
+        recomputed = {}
+        for name in ROLLUPS:
+            with stage("rollup", table=name) as st:
+                recomputed[name] = st.rows_out = refresh_rollup(con, name, full_refresh)
+        status = export(con, out_dir, fmt)
+    finally:
+        con.close()
+
+    print("✅ Rollups refreshed:", ", ".join(f"{n}={k} keys" for n, k in recomputed.items()))
+    print("✅ Exported:")
+    for name, st in status.items():
+        print(f"{out_dir / f'{name}.{fmt}'}  ({st})")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    ap.add_argument("--full-refresh", action="store_true")
+    args = ap.parse_args()
+    main(DB_PATH, OUT_DIR, args.format, args.full_refresh)
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import duckdb
+import pytest
+
+from flows.export import prepare, refresh_rollup
+
+T1, T2 = datetime(2025, 1, 1, 10), datetime(2025, 1, 2, 10)
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE fact_transactions (user_id INTEGER, amount_eur DOUBLE, date DATE, loaded_at TIMESTAMP);")
+    prepare(con)
+    yield con
+    con.close()
+
+def add(con, rows, loaded_at):
+    con.executemany("INSERT INTO fact_transactions VALUES (?, ?, ?, ?)", [r + (loaded_at,) for r in rows])
+
+def daily(con):
+    return con.execute("SELECT CAST(date AS VARCHAR), revenue_eur, tx_count, users FROM agg_daily_revenue ORDER BY date").fetchall()
+
+def test_incremental_refresh_recomputes_only_keys_after_high_water(con):
+    add(con, [(1, 10.0, "2025-01-01"), (2, 5.0, "2025-01-01"), (1, 7.0, "2025-01-02")], T1)
+    assert refresh_rollup(con, "agg_daily_revenue") == 2  # перший запуск — повна побудова
+
+    # підмінене значення для дня, якого нові рядки не торкаються: інкремент його не перераховує
+    con.execute("UPDATE agg_daily_revenue SET revenue_eur = -1 WHERE date = '2025-01-01'")
+    add(con, [(3, 3.0, "2025-01-02"), (3, 4.0, "2025-01-03")], T2)
+    assert refresh_rollup(con, "agg_daily_revenue") == 2
+    assert daily(con) == [("2025-01-01", -1.0, 2, 2), ("2025-01-02", 10.0, 2, 2), ("2025-01-03", 4.0, 1, 1)]
+    assert con.execute("SELECT high_water FROM agg_state WHERE name = 'agg_daily_revenue'").fetchone()[0] == T2
+
+    assert refresh_rollup(con, "agg_daily_revenue") == 0  # нових рядків немає
+    assert refresh_rollup(con, "agg_daily_revenue", full_refresh=True) == 3
+    assert daily(con)[0] == ("2025-01-01", 15.0, 2, 2)
+
+def test_row_count_mismatch_triggers_full_rebuild(con):
+    add(con, [(1, 10.0, "2025-01-01"), (2, 5.0, "2025-01-01"), (1, 7.0, "2025-01-02")], T1)
+    refresh_rollup(con, "agg_user_revenue")
+
+    # видалення не залишає слідів у loaded_at — розбіжність SUM(tx_count) з COUNT(*) фактів
+    con.execute("DELETE FROM fact_transactions WHERE user_id = 2")
+    assert refresh_rollup(con, "agg_user_revenue") == 1
+    assert con.execute("SELECT * FROM agg_user_revenue ORDER BY user_id").fetchall() == [(1, 17.0, 2)]
+
+    # те саме разом із новими рядками: інкремент торкнувся б лише user 3, але лічильники розійшлися
+    con.execute("DELETE FROM fact_transactions WHERE date = '2025-01-02'")
+    add(con, [(3, 1.5, "2025-01-03")], T2)
+    assert refresh_rollup(con, "agg_user_revenue") == 2
+    assert con.execute("SELECT * FROM agg_user_revenue ORDER BY user_id").fetchall() == [(1, 10.0, 1), (3, 1.5, 1)]
@@ -1,27 +1,109 @@
+"""Перевірка якості warehouse (fact_transactions, dim_currency).
+
+    python 09_data_quality_gx/flows/validate.py                  # агрегатний SQL усередині DuckDB
+    python 09_data_quality_gx/flows/validate.py --sample 5       # дорогі перевірки (unique) на 5% вибірці
+    python 09_data_quality_gx/flows/validate.py --parallel       # таблиці паралельно
+    python 09_data_quality_gx/flows/validate.py --engine gx      # старий шлях через Great Expectations
+"""
 from pathlib import Path
-import pandas as pd
-import duckdb
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import datetime as dt
 
-import great_expectations as ge
-from great_expectations.core.batch import RuntimeBatchRequest
-from great_expectations.checkpoint import SimpleCheckpoint
+import pandas as pd
+
+import sys
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+sys.path.append(str(ROOT / "00_common"))
+from utils.validate import between, in_set, non_null, not_future, unique, validate_duckdb  # noqa
+from utils.duck import connect  # noqa
 
 # Джерело warehouse (візьми 07, якщо є, інакше 06)
-DB_07 = Path(r"07_orchestration_prefect\warehouse.duckdb")
-DB_06 = Path(r"06_merge_csv_api_duckdb\warehouse.duckdb")
+DB_07 = Path("07_orchestration_prefect") / "warehouse.duckdb"
+DB_06 = Path("06_merge_csv_api_duckdb") / "warehouse.duckdb"
 DB_PATH = str(DB_07 if DB_07.exists() else DB_06)
 
 GX_ROOT = Path("09_data_quality_gx/gx")
 
+ALLOWED_SYMBOLS = ["EUR", "USD", "GBP", "UAH", "JPY", "PLN", "CHF", "BRL"]
+INT_TYPES = {"BIGINT", "INTEGER", "HUGEINT", "SMALLINT", "TINYINT"}
+
+# ті самі правила, що й у GX-наборах нижче
+SUITES = {
+    "fact_transactions": {
+        "columns": ["user_id", "amount_eur", "date"],
+        "types": {"user_id": INT_TYPES},
+        "expectations": [
+            non_null("user_id"),
+            non_null("amount_eur"),
+            non_null("date"),
+            between("amount_eur", min=0),
+            not_future("date"),
+        ],
+    },
+    "dim_currency": {
+        "columns": ["symbol", "rate_to_eur"],
+        "types": {},
+        "expectations": [
+            non_null("symbol"),
+            non_null("rate_to_eur"),
+            between("rate_to_eur", min=0, strict=True),
+            in_set("symbol", ALLOWED_SYMBOLS),
+            unique("symbol"),
+        ],
+    },
+}
+
+EXPENSIVE = {"unique"}  # hash-агрегат по всій таблиці; решта — фільтри в одному скані
+
+# ---- DuckDB: у Python повертаються лише лічильники (і кілька прикладів порушень)
+
+def check_types(con, table: str, types: dict) -> list[dict]:
+    actual = dict(con.execute(f"SELECT column_name, data_type FROM information_schema.columns "
+                              f"WHERE table_name = '{table}'").fetchall())
+    return [{"expectation": f"type({col})", "failed": int(actual.get(col) not in allowed), "sample": [actual.get(col)]}
+            for col, allowed in types.items()]
+
+def validate_table(con, table: str, sample_pct: float | None = None) -> dict:
+    """Один агрегатний запит на таблицю; з sample_pct дорогі перевірки йдуть по вибірці."""
+    suite = SUITES[table]
+    full = [e for e in suite["expectations"] if not (sample_pct and e.kind in EXPENSIVE)]
+    sampled = [e for e in suite["expectations"] if sample_pct and e.kind in EXPENSIVE]
+
+    rep = validate_duckdb(con, table, full)
+    by_name = {r["expectation"]: r for r in rep["results"]}
+    if sampled:
+        rel = f"(SELECT * FROM {table} USING SAMPLE {float(sample_pct)} PERCENT (bernoulli)) AS s"
+        srep = validate_duckdb(con, rel, sampled)
+        for r in srep["results"]:
+            by_name[r["expectation"]] = {**r, "sampled_rows": srep["rows"]}
+    results = check_types(con, table, suite["types"]) + [by_name[e.name] for e in suite["expectations"]]
+    return {"success": not any(r["failed"] for r in results), "rows": rep["rows"], "results": results}
+
+def validate_warehouse(db_path: str = DB_PATH, sample_pct: float | None = None,
+                       parallel: bool = False) -> dict[str, dict]:
+    con = connect(db_path, read_only=True)
+    try:
+        if not parallel:
+            return {t: validate_table(con, t, sample_pct) for t in SUITES}
+        # окремий cursor на потік; DuckDB відпускає GIL під час виконання запиту
+        with ThreadPoolExecutor(max_workers=len(SUITES)) as pool:
+            futs = {t: pool.submit(validate_table, con.cursor(), t, sample_pct) for t in SUITES}
+            return {t: f.result() for t, f in futs.items()}
+    finally:
+        con.close()
+
+# ---- Great Expectations (опціонально: тягне таблиці в pandas)
+
 def load_tables():
-    con = duckdb.connect(DB_PATH)
+    con = connect(DB_PATH, read_only=True)
     fact = con.execute("SELECT user_id, amount_eur, date FROM fact_transactions").fetchdf()
     dim  = con.execute("SELECT symbol, rate_to_eur FROM dim_currency").fetchdf()
     con.close()
     return fact, dim
 
-def build_expectations_for_fact(df: pd.DataFrame) -> ge.dataset.PandasDataset:
+def build_expectations_for_fact(df: pd.DataFrame):
+    import great_expectations as ge
     gdf = ge.from_pandas(df.copy())
     # not nulls
     gdf.expect_column_values_to_not_be_null("user_id")
@@ -35,19 +117,23 @@ def build_expectations_for_fact(df: pd.DataFrame) -> ge.dataset.PandasDataset:
     gdf.expect_column_values_to_be_between("date", max_value=str(today), parse_strings_as_datetimes=True)
     return gdf
 
-def build_expectations_for_dim(df: pd.DataFrame) -> ge.dataset.PandasDataset:
+def build_expectations_for_dim(df: pd.DataFrame):
+    import great_expectations as ge
     gdf = ge.from_pandas(df.copy())
     gdf.expect_column_values_to_not_be_null("symbol")
     gdf.expect_column_values_to_not_be_null("rate_to_eur")
     gdf.expect_column_values_to_be_between("rate_to_eur", min_value=0, strictly=True)
     # whitelist (за потреби розширюй)
-    allowed = ["EUR", "USD", "GBP", "UAH", "JPY", "PLN", "CHF", "BRL"]
-    gdf.expect_column_values_to_be_in_set("symbol", allowed)
+    gdf.expect_column_values_to_be_in_set("symbol", ALLOWED_SYMBOLS)
     # унікальність символів
     gdf.expect_column_values_to_be_unique("symbol")
     return gdf
 
-def run_validation(name: str, gdf: ge.dataset.PandasDataset) -> dict:
+def run_validation(name: str, gdf) -> dict:
+    import great_expectations as ge
+    from great_expectations.core.batch import RuntimeBatchRequest
+    from great_expectations.checkpoint import SimpleCheckpoint
+
     context = ge.get_context(context_root_dir=str(GX_ROOT))
     # Runtime suite (без запису yaml, просто одноразово)
     suite_name = f"{name}_suite"
@@ -78,20 +164,32 @@ def run_validation(name: str, gdf: ge.dataset.PandasDataset) -> dict:
     result = checkpoint.run()
     return result.to_json_dict()
 
-def main():
+def validate_with_gx() -> dict[str, dict]:
     fact_df, dim_df = load_tables()
-    fact_ge = build_expectations_for_fact(fact_df)
-    dim_ge  = build_expectations_for_dim(dim_df)
+    return {
+        "fact_transactions": run_validation("fact_transactions", build_expectations_for_fact(fact_df)),
+        "dim_currency": run_validation("dim_currency", build_expectations_for_dim(dim_df)),
+    }
 
-    fact_res = run_validation("fact_transactions", fact_ge)
-    dim_res  = run_validation("dim_currency", dim_ge)
+def main(engine: str = "duckdb", sample_pct: float | None = None, parallel: bool = False):
+    if engine == "gx":
+        results = validate_with_gx()
+    else:
+        results = validate_warehouse(DB_PATH, sample_pct, parallel)
 
     # Коротке зведення
-    def ok(res): 
-        return res["success"]
-
-    print("✅ fact_transactions:", "PASS" if ok(fact_res) else "FAIL")
-    print("✅ dim_currency:", "PASS" if ok(dim_res) else "FAIL")
+    for name, res in results.items():
+        print(f"✅ {name}:", "PASS" if res["success"] else "FAIL")
+        if engine == "gx":
+            continue
+        for r in res["results"]:
+            if r["failed"]:
+                print(f"   - {r['expectation']}: {r['failed']} failed, e.g. {r['sample'][:3]}")
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", choices=["duckdb", "gx"], default="duckdb")
+    ap.add_argument("--sample", type=float, metavar="PCT", help="run expensive checks on a PCT%% sample")
+    ap.add_argument("--parallel", action="store_true", help="validate tables concurrently")
+    args = ap.parse_args()
+    main(args.engine, args.sample, args.parallel)
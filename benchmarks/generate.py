@@ -0,0 +1,192 @@
+"""Deterministic, scale-parameterized synthetic inputs for every pipeline.
+
+    python benchmarks/generate.py events /tmp/logs --rows 1000000
+    python benchmarks/generate.py sales /tmp/sales --rows 1e6 --files 12
+
+Text formats (CSV / NDJSON) are written by DuckDB COPY, so 1e7 rows take seconds, not minutes.
+The same (rows, seed) always produces byte-identical files.
+"""
+from datetime import date, timedelta
+from pathlib import Path
+import argparse
+import json
+import math
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REAL_SYMBOLS = ["USD", "GBP", "PLN", "UAH", "BRL", "JPY"]
+TX_CURRENCIES = ["USD", "GBP", "UAH", "EUR"]
+EVENTS = ["login", "view", "view", "add_to_cart", "purchase"]
+PRODUCTS = ["Laptop", "Phone", "Tablet", "Monitor", "Keyboard", "Mouse", "Headset", "Dock"]
+CUSTOMERS = ["Alice", "Bob", "Charlie", "Diana", "Eve", "Frank", "Grace", "Heidi"]
+EXCEL_MAX_ROWS = 1_048_575  # per sheet, minus the header row
+START = date(2015, 1, 1)
+
+def _lit(path: Path | str) -> str:
+    return "'" + Path(path).as_posix().replace("'", "''") + "'"
+
+def _copy(sql: str, out: Path, options: str):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect()
+    con.execute("SET preserve_insertion_order = true;")
+    con.execute(f"COPY ({sql}) TO {_lit(out)} ({options});")
+    con.close()
+
+def _splits(rows: int, parts: int) -> list[tuple[int, int]]:
+    """(offset, count) of `parts` nearly equal slices of range(rows)."""
+    parts = max(1, min(parts, rows))
+    edges = [rows * i // parts for i in range(parts + 1)]
+    return [(a, b - a) for a, b in zip(edges, edges[1:])]
+
+def symbols(n: int) -> list[str]:
+    """The real symbols first, then synthetic three-letter codes (AAA, AAB, ...)."""
+    out = REAL_SYMBOLS[:n]
+    i = 0
+    while len(out) < n:
+        code = "".join(chr(65 + (i // 26 ** k) % 26) for k in (2, 1, 0))
+        if code not in REAL_SYMBOLS and code != "EUR":
+            out.append(code)
+        i += 1
+    return out
+
+def rates_shape(rows: int, max_days: int = 3650) -> tuple[int, int]:
+    """(days, symbols) with days * symbols >= rows: grow the history first, then the symbol list."""
+    days = max(1, min(max_days, math.ceil(rows / len(REAL_SYMBOLS))))
+    return days, max(1, math.ceil(rows / days))
+
+def _rate(day_no: int, sym_no: int) -> float:
+    # a smooth, positive, deterministic curve per symbol
+    return round((1 + sym_no % 97) * (1 + 0.1 * math.sin((day_no + 7 * sym_no) / 30)), 6)
+
+# ---------- 01: sales CSV folder
+
+def sales_csv_folder(out_dir: Path, rows: int, files: int = 12, seed: int = 1) -> list[Path]:
+    """sales_NNN.csv with order_id,product_id,order_date,quantity,price; (order_id, product_id, order_date) unique."""
+    paths = []
+    for no, (offset, n) in enumerate(_splits(rows, files)):
+        out = out_dir / f"sales_{no:03d}.csv"
+        _copy(f"""
+            SELECT {offset} + i + 1 AS order_id,
+                   100 + hash(i, {seed}, {no}) % 500 AS product_id,
+                   DATE '2024-01-01' + ((({offset} + i) * 365) // {max(rows, 1)})::INTEGER AS order_date,
+                   1 + hash(i, {seed} + 1, {no}) % 10 AS quantity,
+                   ROUND(1 + (hash(i, {seed} + 2, {no}) % 50000) / 100.0, 2) AS price
+            FROM range({n}) t(i)""", out, "FORMAT csv, HEADER")
+        paths.append(out)
+    return paths
+
+# ---------- 02 / 04: rates history (raw API payloads) and silver partitions
+
+def rates_history(out_dir: Path, rows: int, max_days: int = 3650) -> list[Path]:
+    """One API payload per day (YYYY-MM-DD.json, base EUR), as served by /{date}: rows ≈ days × symbols."""
+    days, n_sym = rates_shape(rows, max_days)
+    syms = symbols(n_sym)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for d in range(days):
+        day = (START + timedelta(days=d)).isoformat()
+        payload = {"base": "EUR", "date": day, "rates": {s: _rate(d, k) for k, s in enumerate(syms)}}
+        out = out_dir / f"{day}.json"
+        out.write_text(json.dumps(payload), encoding="utf-8")
+        paths.append(out)
+    return paths
+
+def rates_silver(silver_dir: Path, rows: int, max_days: int = 3650) -> list[Path]:
+    """date=YYYY-MM-DD/rates.parquet in the layout Project 02 writes (date, base, symbol, rate)."""
+    days, n_sym = rates_shape(rows, max_days)
+    syms = symbols(n_sym)
+    paths = []
+    for d in range(days):
+        day = (START + timedelta(days=d)).isoformat()
+        table = pa.table({
+            "date": [day] * n_sym,
+            "base": ["EUR"] * n_sym,
+            "symbol": syms,
+            "rate": [_rate(d, k) for k in range(n_sym)],
+        })
+        out = silver_dir / f"date={day}" / "rates.parquet"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, out)
+        paths.append(out)
+    return paths
+
+# ---------- 06 / 07 / 08: transactions + one rates snapshot
+
+def rates_json(path: Path, currencies: list[str] = TX_CURRENCIES, day: str = "2025-08-16") -> Path:
+    rates = {c: 1.0 if c == "EUR" else _rate(0, k + 1) for k, c in enumerate(currencies)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"base": "EUR", "date": day, "rates": rates}, indent=2), encoding="utf-8")
+    return path
+
+def transactions_csv(path: Path, rows: int, users: int = 100_000, seed: int = 42) -> Path:
+    """user_id,amount,currency,date over 200 days from 2025-01-01."""
+    _copy(f"""
+        SELECT 1 + hash(i, {seed}) % {users} AS user_id,
+               1 + hash(i, {seed} + 1) % 999 AS amount,
+               {TX_CURRENCIES}[1 + (hash(i, {seed} + 2) % {len(TX_CURRENCIES)})::INTEGER] AS currency,
+               strftime(DATE '2025-01-01' + (hash(i, {seed} + 3) % 200)::INTEGER, '%Y-%m-%d') AS date
+        FROM range({rows}) t(i)""", path, "FORMAT csv, HEADER")
+    return path
+
+# ---------- 05: JSON event logs
+
+def event_logs(out_dir: Path, rows: int, files: int = 1, users: int = 200_000, days: int = 90,
+               gzip: bool = False, seed: int = 7) -> list[Path]:
+    """NDJSON {"user_id", "event", "timestamp"}, time-ordered across files (events_NNN.ndjson[.gz])."""
+    span = days * 86400
+    paths = []
+    for no, (offset, n) in enumerate(_splits(rows, files)):
+        out = out_dir / f"events_{no:03d}.ndjson{'.gz' if gzip else ''}"
+        _copy(f"""
+            SELECT (hash(i, {seed}) % {users})::INTEGER AS user_id,
+                   {EVENTS}[1 + (hash(i, {seed} + 1) % {len(EVENTS)})::INTEGER] AS event,
+                   strftime(TIMESTAMP '2025-01-01' + to_seconds((({offset} + i) * {span} // {max(rows, 1)})::BIGINT),
+                            '%Y-%m-%dT%H:%M:%S') AS timestamp
+            FROM range({n}) t(i)""", out, "FORMAT json" + (", COMPRESSION gzip" if gzip else ""))
+        paths.append(out)
+    return paths
+
+# ---------- 03: Excel workbooks
+
+def excel_workbook(path: Path, rows: int, sheet_rows: int = EXCEL_MAX_ROWS, seed: int = 3) -> Path:
+    """OrderID, Customer, Product, Quantity, Price (like data/sample.xlsx); more rows than fit go to further sheets."""
+    from openpyxl import Workbook  # write_only streams rows, memory stays flat
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb = Workbook(write_only=True)
+    for no, (offset, n) in enumerate(_splits(rows, math.ceil(rows / sheet_rows) or 1)):
+        ws = wb.create_sheet(f"orders_{no + 1}" if no else "orders")
+        ws.append(["OrderID", "Customer", "Product", "Quantity", "Price"])
+        for i in range(offset, offset + n):
+            h = hash((i, seed)) & 0xFFFFFFFF
+            ws.append([i + 1, CUSTOMERS[h % len(CUSTOMERS)], PRODUCTS[(h >> 8) % len(PRODUCTS)],
+                       1 + (h >> 16) % 5, 50 * (1 + (h >> 20) % 40)])
+    wb.save(path)
+    return path
+
+def excel_workbooks(out_dir: Path, rows: int, files: int = 1, sheet_rows: int = EXCEL_MAX_ROWS) -> list[Path]:
+    return [excel_workbook(out_dir / f"orders_{no:03d}.xlsx", n, sheet_rows, seed=3 + no)
+            for no, (_, n) in enumerate(_splits(rows, files))]
+
+GENERATORS = {
+    "sales": lambda out, a: sales_csv_folder(out, a.rows, a.files),
+    "rates-history": lambda out, a: rates_history(out, a.rows),
+    "rates-silver": lambda out, a: rates_silver(out, a.rows),
+    "transactions": lambda out, a: [transactions_csv(out / "transactions.csv", a.rows), rates_json(out / "rates.json")],
+    "events": lambda out, a: event_logs(out, a.rows, a.files, gzip=a.gzip),
+    "excel": lambda out, a: excel_workbooks(out, a.rows, a.files),
+}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("kind", choices=sorted(GENERATORS))
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--rows", type=float, default=1e4)
+    ap.add_argument("--files", type=int, default=1)
+    ap.add_argument("--gzip", action="store_true")
+    args = ap.parse_args()
+    args.rows = int(args.rows)
+    written = GENERATORS[args.kind](args.out, args)
+    print(f"✅ {args.kind}: {len(written)} file(s) in {args.out}")
@@ -0,0 +1,313 @@
+"""End-to-end benchmark of pipelines 01–08 on synthetic data, with a baseline regression gate.
+
+    python benchmarks/run.py                                  # all pipelines, 1e4 rows, 3 repeats
+    python benchmarks/run.py --scale 1e4 1e6 --only 05 06
+    python benchmarks/run.py --scale 1e6 --save-baseline      # store benchmarks/baseline.json
+    python benchmarks/run.py --scale 1e6 --baseline benchmarks/baseline.json --threshold 0.2
+
+Every repeat runs in a fresh subprocess with its working directory laid out like the repo
+(inputs generated once per pipeline/scale and symlinked in, outputs empty), so each pipeline
+runs with its own default paths, cold. Recorded per pipeline and scale:
+  - wall time p50 / p95 / max over repeats and throughput (rows / p50); pipeline_p50_s is the
+    same without imports and Prefect engine startup (the "total" stage of utils.metrics)
+  - peak RSS of the run (ru_maxrss of the subprocess)
+  - per-stage latency p50 / p95 from utils.metrics records (per chunk / per file / per date)
+Results go to benchmarks/results/latest.json and are appended to benchmarks/results/history.jsonl.
+With --baseline the run exits with status 1 when p50 wall time or peak memory regressed by more
+than --threshold (relative) and more than --min-delta-s / --min-delta-mb (absolute, to absorb noise).
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parents[1]  # repo root
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.append(str(ROOT / "00_common"))
+sys.path.append(str(BENCH_DIR))
+import generate as gen  # noqa
+
+RESULTS_DIR = BENCH_DIR / "results"
+BASELINE = BENCH_DIR / "baseline.json"
+SCALES = [10_000, 1_000_000, 10_000_000]
+
+@dataclass
+class Spec:
+    project: str                            # directory of the pipeline
+    generate: Callable[[Path, int], None]   # writes inputs under the given root, repo layout
+    links: list[str]                        # input paths (relative to the root) to link into each run
+    max_rows: int | None = None             # larger scales are skipped (reason in `note`)
+    note: str = ""
+    setup: list[str] = field(default_factory=list)  # pipelines run (untimed) before this one
+    dirs: list[str] = field(default_factory=list)   # output directories the flow expects to exist
+
+# ---------- inputs per pipeline (repo-relative paths, as the flows expect them)
+
+def _gen_01(root: Path, rows: int):
+    gen.sales_csv_folder(root / "01_csv_folder_to_sqlite/data_raw", rows, files=12)
+
+def _gen_02(root: Path, rows: int):
+    gen.rates_history(root / "history", rows)
+
+def _gen_03(root: Path, rows: int):
+    gen.excel_workbooks(root / "03_excel_to_postgres/data", rows, files=max(1, rows // 1_000_000))
+
+def _gen_04(root: Path, rows: int):
+    gen.rates_silver(root / "02_api_to_parquet_daily/data_lake/silver", rows)
+
+def _gen_05(root: Path, rows: int):
+    gen.event_logs(root / "05_json_logs_to_duckdb/data_raw", rows, files=max(1, rows // 1_000_000))
+
+def _gen_tx(root: Path, rows: int):
+    raw = root / "06_merge_csv_api_duckdb/data_raw"
+    gen.transactions_csv(raw / "transactions.csv", rows)
+    gen.rates_json(raw / "rates.json")
+
+PIPELINES: dict[str, Spec] = {
+    "01": Spec("01_csv_folder_to_sqlite", _gen_01, ["01_csv_folder_to_sqlite/data_raw"],
+               dirs=["01_csv_folder_to_sqlite/db"]),
+    "02": Spec("02_api_to_parquet_daily", _gen_02, ["history"]),
+    "03": Spec("03_excel_to_postgres", _gen_03, ["03_excel_to_postgres/data"]),
+    "04": Spec("04_parquet_to_duckdb", _gen_04, ["02_api_to_parquet_daily/data_lake/silver"]),
+    "05": Spec("05_json_logs_to_duckdb", _gen_05, ["05_json_logs_to_duckdb/data_raw"]),
+    "06": Spec("06_merge_csv_api_duckdb", _gen_tx, ["06_merge_csv_api_duckdb/data_raw"]),
+    "07": Spec("07_orchestration_prefect", _gen_tx, ["06_merge_csv_api_duckdb/data_raw"]),
+    "08": Spec("08_dashboard", _gen_tx, ["06_merge_csv_api_duckdb/data_raw"], setup=["06"]),
+}
+
+# ---------- worker side: one pipeline run inside the prepared working directory
+
+def _load_flow(key: str, filename: str = "flow.py"):
+    flows = ROOT / PIPELINES[key].project / "flows"
+    sys.path.insert(0, str(flows))  # siblings like 05's derived.py
+    spec = importlib.util.spec_from_file_location(f"bench_flow_{key}", flows / filename)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+class _HistoryAPI(BaseHTTPRequestHandler):
+    """Serves history/YYYY-MM-DD.json as GET /YYYY-MM-DD (the exchangerate.host shape)."""
+
+    def do_GET(self):
+        f = Path("history") / f"{self.path.split('?')[0].strip('/')}.json"
+        if not f.is_file():
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = f.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _run_02():
+    days = sorted(p.stem for p in Path("history").glob("*.json"))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _HistoryAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        _load_flow("02").backfill_api_to_parquet(days[0], days[-1], rate_per_sec=1e6,
+                                                 base_url=f"http://127.0.0.1:{server.server_port}")
+    finally:
+        server.shutdown()
+
+RUNNERS: dict[str, Callable[[], object]] = {
+    "01": lambda: _load_flow("01").etl_csv_to_sqlite(),
+    "02": _run_02,
+    "03": lambda: _load_flow("03").main(),
+    "04": lambda: _load_flow("04").main(),
+    "05": lambda: _load_flow("05").main(),
+    "06": lambda: _load_flow("06").main(),
+    "07": lambda: _load_flow("07").orchestrate_tx_to_duckdb(),
+    "08": lambda: _load_flow("08", "export.py").main(),
+}
+
+def worker(key: str, result_path: Path):
+    import resource
+
+    t0 = time.perf_counter()
+    RUNNERS[key]()
+    wall = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 1024
+    result_path.write_text(json.dumps({"wall_s": wall, "peak_rss_mb": peak_mb}), encoding="utf-8")
+
+# ---------- driver side
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def _spawn(key: str, workdir: Path, result: Path, env: dict, log):
+    proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--worker", key, str(result)],
+                          cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode:
+        raise RuntimeError(f"pipeline {key} failed (exit {proc.returncode}), see {log.name}")
+
+def _prepare_run(spec: Spec, inputs: Path, workdir: Path):
+    if workdir.exists():
+        shutil.rmtree(workdir)
+    workdir.mkdir(parents=True)
+    for rel in spec.links:
+        src, dst = inputs / rel, workdir / rel
+        # directories are recreated and their entries symlinked, so outputs written next to the
+        # inputs (03's orders.sqlite and cache) never land in the shared inputs
+        for item in sorted(src.iterdir()) if src.is_dir() else [src]:
+            target = dst / item.name if src.is_dir() else dst
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.symlink_to(item, target_is_directory=item.is_dir())
+    for rel in [spec.project, *spec.dirs]:
+        (workdir / rel).mkdir(parents=True, exist_ok=True)
+
+def bench_one(key: str, rows: int, repeat: int, scratch: Path, keep_logs: Path) -> dict:
+    spec = PIPELINES[key]
+    inputs = scratch / f"inputs-{key}-{rows}"
+    t0 = time.perf_counter()
+    if not inputs.exists():
+        spec.generate(inputs, rows)
+    gen_s = time.perf_counter() - t0
+
+    runs, stages, totals = [], {}, []
+    log_path = keep_logs / f"{key}-{rows}.log"
+    with log_path.open("w", encoding="utf-8") as log:
+        for _ in range(repeat):
+            workdir = scratch / f"run-{key}-{rows}"
+            _prepare_run(spec, inputs, workdir)
+            metrics = workdir / "metrics.jsonl"
+            env = {**os.environ, "ETL_METRICS_PATH": str(metrics), "PYTHONUNBUFFERED": "1"}
+            for dep in spec.setup:  # e.g. 08 exports the warehouse 06 builds from the same inputs
+                _spawn(dep, workdir, workdir / f"setup-{dep}.json", {**env, "ETL_METRICS_PATH": os.devnull}, log)
+            _spawn(key, workdir, workdir / "result.json", env, log)
+            runs.append(json.loads((workdir / "result.json").read_text(encoding="utf-8")))
+            for line in metrics.read_text(encoding="utf-8").splitlines() if metrics.exists() else []:
+                rec = json.loads(line)
+                if rec["stage"] == "total":
+                    totals.append(rec["wall_s"])
+                else:
+                    stages.setdefault(rec["stage"], []).append(rec["wall_s"])
+            shutil.rmtree(workdir)
+
+    walls = [r["wall_s"] for r in runs]
+    p50 = percentile(walls, 50)
+    return {
+        "pipeline": key,
+        "rows": rows,
+        "repeat": repeat,
+        "generate_s": round(gen_s, 3),
+        "wall_p50_s": round(p50, 4),
+        "wall_p95_s": round(percentile(walls, 95), 4),
+        "wall_max_s": round(max(walls), 4),
+        "rows_per_s": round(rows / p50) if p50 else None,
+        # inside @pipeline: without interpreter start, imports and the Prefect engine/server startup
+        "pipeline_p50_s": round(percentile(totals, 50), 4) if totals else None,
+        "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+        "stages": {name: {"calls": len(v) // repeat, "p50_s": round(percentile(v, 50), 4),
+                          "p95_s": round(percentile(v, 95), 4)} for name, v in stages.items()},
+    }
+
+def compare(results: list[dict], baseline: list[dict], threshold: float,
+            min_delta_s: float, min_delta_mb: float) -> list[str]:
+    """Regressions vs baseline (same pipeline and rows); missing baseline entries are not failures."""
+    base = {(b["pipeline"], b["rows"]): b for b in baseline}
+    failures = []
+    for r in results:
+        b = base.get((r["pipeline"], r["rows"]))
+        if b is None or "skipped" in r or "skipped" in b:
+            continue
+        checks = [("wall_p50_s", min_delta_s, "s"), ("peak_rss_mb", min_delta_mb, "MB")]
+        for metric, min_delta, unit in checks:
+            new, old = r[metric], b[metric]
+            if new > old * (1 + threshold) and new - old > min_delta:
+                failures.append(f"{r['pipeline']} @ {r['rows']:,} rows: {metric} {old}{unit} → {new}{unit} "
+                                f"(+{(new / old - 1) * 100:.0f}%)")
+    return failures
+
+def _table(results: list[dict]):
+    print(f"{'pipe':4} {'rows':>12} {'p50 s':>9} {'p95 s':>9} {'flow s':>9} {'rows/s':>13} {'peak MB':>9}")
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['pipeline']:4} {r['rows']:>12,} skipped: {r['skipped']}")
+            continue
+        print(f"{r['pipeline']:4} {r['rows']:>12,} {r['wall_p50_s']:9.3f} {r['wall_p95_s']:9.3f} "
+              f"{r['pipeline_p50_s'] or 0:9.3f} {r['rows_per_s'] or 0:13,} {r['peak_rss_mb']:9.1f}")
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, nargs="+", default=[SCALES[0]])
+    ap.add_argument("--only", nargs="+", choices=sorted(PIPELINES), default=sorted(PIPELINES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", type=Path, default=RESULTS_DIR / "latest.json")
+    ap.add_argument("--baseline", type=Path, help="compare with this results file; exit 1 on regression")
+    ap.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE}")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    ap.add_argument("--min-delta-s", type=float, default=0.25)
+    ap.add_argument("--min-delta-mb", type=float, default=32)
+    ap.add_argument("--scratch", type=Path, help="where inputs and runs live (default: a temp dir, removed)")
+    ap.add_argument("--worker", nargs=2, metavar=("PIPELINE", "RESULT"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker[0], Path(args.worker[1]))
+        return 0
+
+    scratch = args.scratch or Path(tempfile.mkdtemp(prefix="etl_bench_"))
+    scratch.mkdir(parents=True, exist_ok=True)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    results = []
+    try:
+        for rows in (int(s) for s in args.scale):
+            for key in args.only:
+                spec = PIPELINES[key]
+                if spec.max_rows is not None and rows > spec.max_rows:
+                    results.append({"pipeline": key, "rows": rows, "skipped": spec.note})
+                    continue
+                print(f"… {key} @ {rows:,} rows", flush=True)
+                results.append(bench_one(key, rows, args.repeat, scratch, args.out.parent))
+    finally:
+        if args.scratch is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    with (args.out.parent / "history.jsonl").open("a", encoding="utf-8") as f:
+        f.write(json.dumps(report) + "\n")
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    _table(results)
+    print(f"Results: {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        failures = compare(results, baseline, args.threshold, args.min_delta_s, args.min_delta_mb)
+        for f in failures:
+            print(f"❌ regression: {f}")
+        if failures:
+            return 1
+        print(f"✅ no regression vs {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())